@@ -22,9 +22,15 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import heapq
 import json
+import re
+import sys
+from collections.abc import Generator, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Optional, TextIO
 import time
 from ccl_chromium_reader import (
     ccl_chromium_indexeddb,
@@ -32,37 +38,110 @@ from ccl_chromium_reader import (
     ccl_chromium_sessionstorage,
 )
 
+from forensicsim.blobs import BlobResolver, BlobStore
+from forensicsim.compression import (
+    codec_for,
+    compressed_path,
+    open_text,
+    read_text,
+    text_writer,
+)
+from forensicsim.diagnostics import FailureReservoir
+from forensicsim.progress import ProgressReporter
+from forensicsim.recovery import RecoveredDatabase
+
 TEAMS_DB_OBJECT_STORES = ["replychains", "conversations", "people", "buddylist"]
 
 ENCODING = "iso-8859-1"
 
-def parse_db(
+# Every JSON document starts with one of these characters (after whitespace).
+# Checking it first avoids running the decoder over the large non-JSON
+# caches that Teams keeps in LocalStorage.
+JSON_FIRST_CHARS = frozenset('{["-0123456789tfn')
+FIRST_CHAR_PATTERN = re.compile(r"\s*(\S)")
+
+
+def setup_logs(output_dir: Path, compress: Optional[str] = None) -> dict[str, Path]:
+    # The large logs are compressed with compress, if given
+    output_dir.mkdir(parents=True, exist_ok=True)
+    return {
+        "debug_log": output_dir / "debug.log",
+        "raw_log": compressed_path(output_dir / "raw_data.json", compress),
+        "failures_log": compressed_path(output_dir / "failures.jsonl", compress),
+        "recovery_log": output_dir / "recovery.json",
+        "unrecognized_log": compressed_path(output_dir / "unrecognized.json", compress),
+    }
+
+
+def iter_db(
     filepath: Path,
     blobpath: Optional[Path] = None,
-    filter_db_results: Optional[bool] = True,
     raw_dump: bool = False,
-    log_paths: Optional[dict] = None  # Pass log paths
-) -> list[dict[str, Any]]:
-    
+    log_paths: Optional[dict] = None,  # Pass log paths
+    progress: Optional[ProgressReporter] = None,
+    dump_failures: bool = False,
+    resilient: bool = False,
+    blob_store: Optional[BlobStore] = None,
+) -> Iterator[dict[str, Any]]:
+    # In resilient mode, damaged blocks are cut out of a scratch copy of the
+    # database before ccl gets to see it
+    recovery = RecoveredDatabase(filepath) if resilient else None
+    if recovery and log_paths:
+        with open(log_paths["recovery_log"], "w", encoding="utf-8") as f:
+            json.dump(recovery.to_dict(), f, indent=4)
+
     # Open raw access to a LevelDB and deserialize the records.
-    wrapper = ccl_chromium_indexeddb.WrappedIndexDB(filepath, blobpath)
-    extracted_values = []
-    failed_records = []  # <-- new structure to hold records that fail
-    
+    try:
+        wrapper = ccl_chromium_indexeddb.WrappedIndexDB(
+            recovery.path if recovery else filepath, blobpath
+        )
+    except Exception:
+        if recovery:
+            recovery.close()
+        raise
+
     # Initialize counters
     record_count = 0
     skipped_records = 0
     errors = 0
 
     # Open debug log (always required)
-    debug_log = open(log_paths['debug_log'], "w", encoding="utf-8") if log_paths else None
+    debug_log = (
+        open(log_paths["debug_log"], "w", encoding="utf-8") if log_paths else None
+    )
 
     # Open raw_log **only if raw_dump=True**
     raw_log = None
     if raw_dump and log_paths:
-        raw_log = open(log_paths['raw_log'], "w", encoding="utf-8")
-        
-    try:        
+        raw_log = open_text(log_paths["raw_log"], codec_for(log_paths["raw_log"]))
+
+    # Every failing record is only written to failures.jsonl if asked for,
+    # unrecognized.json gets counts and a fixed size sample
+    failures_log = None
+    if dump_failures and log_paths:
+        failures_log = open_text(
+            log_paths["failures_log"], codec_for(log_paths["failures_log"])
+        )
+    failures = FailureReservoir(stream=failures_log)
+
+    # Blobs referenced by the values are copied to the blob store in the
+    # background, the values keep a reference to them
+    blobs = None
+    if blob_store is not None and blobpath is not None:
+        blobs = BlobResolver(blob_store)
+
+    if recovery and debug_log:
+        for file_report in recovery.files:
+            if file_report.error:
+                debug_log.write(
+                    f"[WARNING] Skipped {file_report.name}: {file_report.error}\n"
+                )
+            for skipped in file_report.skipped:
+                debug_log.write(
+                    f"[WARNING] Skipped {file_report.name} bytes {skipped.start}-{skipped.end}: {skipped.reason}\n"
+                )
+
+    try:
         for db_info in wrapper.database_ids:
             if db_info.dbid_no is None:
                 continue
@@ -74,118 +153,364 @@ def parse_db(
                     continue
 
                 # Log object stores dynamically
-                debug_log.write(f"Processing object store: {obj_store_name}")
+                if debug_log:
+                    debug_log.write(f"Processing object store: {obj_store_name}\n")
 
                 # Allow all object stores, even unknown ones
-                if obj_store_name not in TEAMS_DB_OBJECT_STORES:
-                    debug_log.write(f"Unknown object store encountered: {obj_store_name}")
+                if debug_log and obj_store_name not in TEAMS_DB_OBJECT_STORES:
+                    debug_log.write(
+                        f"Unknown object store encountered: {obj_store_name}\n"
+                    )
 
                 obj_store = db[obj_store_name]
                 records_per_object_store = 0
+                if progress:
+                    progress.set_stage("read", obj_store_name)
 
                 for record in obj_store.iterate_records():
                     try:
                         record_count += 1
                         if debug_log:
-                            debug_log.write(f"[DEBUG] Processing record {record_count}: Key={record.key.raw_key}\n")
+                            debug_log.write(
+                                f"[DEBUG] Processing record {record_count}: Key={record.key.raw_key}\n"
+                            )
 
                         # Handle empty values
                         if not hasattr(record, "value") or record.value is None:
                             skipped_records += 1
                             if debug_log:
-                                debug_log.write(f"[WARNING] Skipped empty record {record_count}\n")
+                                debug_log.write(
+                                    f"[WARNING] Skipped empty record {record_count}\n"
+                                )
                             continue
-                        if not hasattr(record, "origin_file") or record.origin_file is None:
+                        if (
+                            not hasattr(record, "origin_file")
+                            or record.origin_file is None
+                        ):
                             continue
 
                         records_per_object_store += 1
+                        origin_file = (
+                            recovery.origin(record.origin_file)
+                            if recovery
+                            else record.origin_file
+                        )
+                        if progress:
+                            progress.record(
+                                obj_store_name,
+                                origin_file,
+                                getattr(record, "offset", None),
+                            )
 
                         # Collect raw records for JSON output
                         data_dict = {
                             "key": record.key.raw_key,
                             "value": record.value,
-                            "origin_file": record.origin_file,
+                            "origin_file": origin_file,
                             "store": obj_store_name,
                             "state": None,
                             "seq": None,
                         }
-                        extracted_values.append(data_dict)
+                        # Records waiting for their blobs are handed on later
+                        ready = blobs.add(data_dict, record) if blobs else (data_dict,)
+                        for item in ready:
+                            yield item
+
+                            # Write to raw_log only if raw_dump is enabled
+                            if raw_dump and raw_log:
+                                json.dump(
+                                    item["value"],
+                                    raw_log,
+                                    indent=4,
+                                    default=str,
+                                    ensure_ascii=False,
+                                )
 
                         if debug_log:
-                            debug_log.write(f"[DEBUG] Record {record_count} processed successfully.\n")
-                        
-                        # Write to raw_log only if raw_dump is enabled
-                        if raw_dump and raw_log:
-                            json.dump(record.value, raw_log, indent=4, default=str, ensure_ascii=False)
-                            
+                            debug_log.write(
+                                f"[DEBUG] Record {record_count} processed successfully.\n"
+                            )
+
                     except Exception as e:
                         errors += 1
-                        failed_data_dict = {
-                            "key": record.key.raw_key,
-                            "origin_file": getattr(record, "origin_file", "N/A"),
-                            "store": obj_store_name,
-                            "error": str(e),
-                            "value_fragment": repr(record.value)[:500],  # partial snippet
-                        }
-                        failed_records.append(failed_data_dict)
+                        failures.add(
+                            e,
+                            getattr(record, "value", None),
+                            key=record.key.raw_key,
+                            origin_file=getattr(record, "origin_file", "N/A"),
+                            store=obj_store_name,
+                        )
+        if blobs:
+            for item in blobs.flush():
+                yield item
+                if raw_dump and raw_log:
+                    json.dump(
+                        item["value"],
+                        raw_log,
+                        indent=4,
+                        default=str,
+                        ensure_ascii=False,
+                    )
     finally:
         # Final log summary
-        if log_paths:
+        if debug_log:
             debug_log.write(f"[INFO] parse_db finished:\n")
             debug_log.write(f"[INFO] Total records processed: {record_count}\n")
             debug_log.write(f"[INFO] Skipped records: {skipped_records}\n")
             debug_log.write(f"[INFO] Errors encountered: {errors}\n")
+            if blobs:
+                debug_log.write(f"[INFO] Blobs stored: {blobs.stored}\n")
+                debug_log.write(
+                    f"[INFO] Blobs that could not be read: {blobs.failed}\n"
+                )
+            for error_class, count in failures.error_classes.items():
+                debug_log.write(f"[INFO]   {error_class}: {count}\n")
             debug_log.close()
-        
+
         # Close raw_log if it was opened
         if raw_log:
-            raw_log.close()        
-
-    # **Optional**: Dump failed_records to a separate JSON file for analysis
-    if failed_records and log_paths and 'debug_log' in log_paths:
-        unrecognized_path = Path(log_paths['debug_log']).parent / "unrecognized.json"
-        with open(unrecognized_path, "w", encoding="utf-8") as f:
-            json.dump(failed_records, f, indent=4, default=str, ensure_ascii=False)
-            
-    return extracted_values
+            raw_log.close()
+        if failures_log:
+            failures_log.close()
+        if blobs:
+            blobs.close()
+        if recovery:
+            recovery.close()
 
+    # **Optional**: Summarise the failed records in a separate JSON file for analysis
+    if failures.total and log_paths and "debug_log" in log_paths:
+        unrecognized_path = log_paths.get(
+            "unrecognized_log",
+            Path(log_paths["debug_log"]).parent / "unrecognized.json",
+        )
+        failures.write_summary(unrecognized_path)
 
-def parse_localstorage(filepath: Path) -> list[dict[str, Any]]:
+
+def parse_db(
+    filepath: Path,
+    blobpath: Optional[Path] = None,
+    filter_db_results: Optional[bool] = True,
+    raw_dump: bool = False,
+    log_paths: Optional[dict] = None,  # Pass log paths
+    dump_failures: bool = False,
+    resilient: bool = False,
+) -> list[dict[str, Any]]:
+    return list(
+        iter_db(
+            filepath,
+            blobpath,
+            raw_dump,
+            log_paths,
+            dump_failures=dump_failures,
+            resilient=resilient,
+        )
+    )
+
+
+def _match_storage_key(
+    storage_key: str,
+    storage_keys: Optional[Iterable[str]],
+    host_prefixes: Optional[Iterable[str]],
+) -> bool:
+    if storage_keys is not None and storage_key in storage_keys:
+        return True
+    if host_prefixes is not None:
+        host = storage_key.split("://", 1)[-1]
+        return any(
+            host.startswith(prefix) or storage_key.startswith(prefix)
+            for prefix in host_prefixes
+        )
+    return False
+
+
+def _looks_like_json(value: str) -> bool:
+    first_char = FIRST_CHAR_PATTERN.match(value)
+    return first_char is not None and first_char.group(1) in JSON_FIRST_CHARS
+
+
+def iter_localstorage(
+    filepath: Path,
+    storage_keys: Optional[Iterable[str]] = None,
+    host_prefixes: Optional[Iterable[str]] = None,
+    max_value_size: Optional[int] = None,
+) -> Iterator[Any]:
     local_store = ccl_chromium_localstorage.LocalStoreDb(filepath)
-    extracted_values = []
-    for record in local_store.iter_all_records():
+
+    # Only read the records of matching storage keys, if a filter is given
+    if storage_keys is None and host_prefixes is None:
+        records = local_store.iter_all_records()
+    else:
+        storage_keys = set(storage_keys) if storage_keys is not None else None
+        host_prefixes = tuple(host_prefixes) if host_prefixes is not None else None
+        records = (
+            record
+            for storage_key in local_store.iter_storage_keys()
+            if _match_storage_key(storage_key, storage_keys, host_prefixes)
+            for record in local_store.iter_records_for_storage_key(storage_key)
+        )
+
+    for record in records:
+        value = record.value
+        if not value or not isinstance(value, str):
+            continue
+        if max_value_size is not None and len(value) > max_value_size:
+            continue
+        if not _looks_like_json(value):
+            continue
         try:
-            extracted_values.append(json.loads(record.value, strict=False))
+            yield json.loads(value, strict=False)
         except json.decoder.JSONDecodeError:
             continue
-    return extracted_values
 
 
-def parse_sessionstorage(filepath: Path) -> list[dict[str, Any]]:
-    session_storage = ccl_chromium_sessionstorage.SessionStoreDb(filepath)
+def parse_localstorage(filepath: Path) -> list[dict[str, Any]]:
+    return list(iter_localstorage(filepath))
+
+
+def _sequence_number(entry: dict[str, Any]) -> int:
+    sequence_number = entry["leveldb_sequence_number"]
+    return -1 if sequence_number is None else sequence_number
+
+
+def _get_sessionstorage_host(
+    session_storage: ccl_chromium_sessionstorage.SessionStoreDb, host: str
+) -> list[dict[str, Any]]:
     extracted_values = []
-    for host in session_storage:
-        print(host)
-        # Hosts can have multiple sessions associated with them
-        for session_store_values in session_storage.get_all_for_host(host).values():
-            for session_store_value in session_store_values:
-                # response is of type SessionStoreValue
-
-                # Make a nice dictionary out of it
-                entry = {
-                    "key": host,
-                    "value": session_store_value.value,
-                    "guid": session_store_value.guid,
-                    "leveldb_sequence_number": session_store_value.leveldb_sequence_number,
-                }
-                extracted_values.append(entry)
+    # Hosts can have multiple sessions associated with them
+    for session_store_values in session_storage.get_all_for_host(host).values():
+        for session_store_value in session_store_values:
+            # response is of type SessionStoreValue
+
+            # Make a nice dictionary out of it
+            entry = {
+                "key": host,
+                "value": session_store_value.value,
+                "guid": session_store_value.guid,
+                "leveldb_sequence_number": session_store_value.leveldb_sequence_number,
+            }
+            extracted_values.append(entry)
+    extracted_values.sort(key=_sequence_number)
     return extracted_values
 
 
-def write_results_to_json(data: list[dict[str, Any]], outputpath: Path) -> None:
+def _iter_result(future: Future) -> Iterator[dict[str, Any]]:
+    # The future is only referenced here, so a host's values are freed as
+    # soon as they have been merged
+    yield from future.result()
+
+
+def iter_sessionstorage(
+    filepath: Path,
+    host_prefixes: Optional[Iterable[str]] = None,
+    workers: Optional[int] = None,
+) -> Iterator[dict[str, Any]]:
+    session_storage = ccl_chromium_sessionstorage.SessionStoreDb(filepath)
+    if host_prefixes is not None:
+        host_prefixes = tuple(host_prefixes)
+    hosts = [
+        host
+        for host in session_storage
+        if host_prefixes is None or _match_storage_key(host, None, host_prefixes)
+    ]
+
+    # Hosts are independent of each other, the per host results are merged
+    # back into the order they were written to the LevelDB as they come in.
+    executor = ThreadPoolExecutor(max_workers=workers)
     try:
-        with open(outputpath, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4, default=str, ensure_ascii=False)
-    except Exception as e:
-        error_log.write(f"Failed to write results.json: {str(e)}")
+        per_host = (
+            _iter_result(
+                executor.submit(_get_sessionstorage_host, session_storage, host)
+            )
+            for host in hosts
+        )
+        yield from heapq.merge(*per_host, key=_sequence_number)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
 
+def parse_sessionstorage(filepath: Path) -> list[dict[str, Any]]:
+    return list(iter_sessionstorage(filepath))
+
+
+@contextmanager
+def open_output(
+    outputpath: Path, compress: Optional[str] = None, threads: int = 0
+) -> Generator[TextIO, None, None]:
+    # "-" writes to stdout, so that the output can be piped. compress and
+    # threads are passed on to forensicsim.compression.BlockWriter.
+    if str(outputpath) == "-":
+        if compress is None:
+            try:
+                yield sys.stdout
+            finally:
+                sys.stdout.flush()
+            return
+        with text_writer(sys.stdout.buffer, compress, threads, close_raw=False) as f:
+            yield f
+        return
+    with open_text(outputpath, compress, threads) as f:
+        yield f
+
+
+def write_results_to_json(
+    data: Iterable[Any],
+    outputpath: Path,
+    compress: Optional[str] = None,
+    threads: int = 0,
+) -> int:
+    # Write the records one by one, so that generators are never materialised.
+    # The result is identical to json.dump(list(data), f, indent=4).
+    count = 0
+    with open_output(outputpath, compress, threads) as f:
+        f.write("[")
+        separator = "\n    "
+        for record in data:
+            f.write(separator)
+            f.write(
+                json.dumps(record, indent=4, default=str, ensure_ascii=False).replace(
+                    "\n", "\n    "
+                )
+            )
+            separator = ",\n    "
+            count += 1
+        f.write("]" if separator == "\n    " else "\n]")
+    return count
+
+
+def read_results_from_json(inputpath: Path, chunk_size: int = 2**20) -> Iterator[Any]:
+    # Counterpart of write_results_to_json that yields the records of the
+    # array one by one instead of loading the whole file
+    decoder = json.JSONDecoder(strict=False)
+    with read_text(inputpath) as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"Expected a JSON array. Path: {inputpath}")
+        pos = 1
+        while True:
+            # Skip whitespace and the separating comma
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buffer):
+                    break
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise ValueError(f"Unterminated JSON array. Path: {inputpath}")
+                buffer, pos = chunk, 0
+            if buffer[pos] == "]":
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+                # A number at the end of the buffer may continue as well
+                complete = end < len(buffer)
+            except json.JSONDecodeError:
+                complete = False
+            if not complete:
+                # The record continues in the next chunk
+                chunk = f.read(chunk_size)
+                if chunk:
+                    buffer, pos = buffer[pos:] + chunk, 0
+                    continue
+                record, end = decoder.raw_decode(buffer, pos)
+            yield record
+            pos = end
@@ -0,0 +1,174 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import hashlib
+import os
+import tempfile
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from types import TracebackType
+from typing import Any, BinaryIO, Optional
+
+# Blob files are copied in chunks of this size, never read as a whole
+READ_SIZE = 2**20
+# Records that may wait for their blobs before the oldest one is awaited
+WINDOW = 64
+
+
+class BlobStore:
+    # Content addressed copies of the blob files. A payload is stored once
+    # under its SHA-256, however many records refer to it.
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, digest: str) -> Path:
+        return self.directory / digest[:2] / digest
+
+    def put(self, stream: BinaryIO) -> tuple[str, int]:
+        # Hashes the stream while it is copied to a temporary file, which is
+        # then moved into place or dropped if the payload is known already
+        sha256 = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(
+            dir=self.directory, prefix=".tmp_", delete=False
+        ) as tmp:
+            try:
+                while chunk := stream.read(READ_SIZE):
+                    sha256.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+            except BaseException:
+                tmp.close()
+                os.unlink(tmp.name)
+                raise
+        digest = sha256.hexdigest()
+        target = self.path_for(digest)
+        if target.exists():
+            os.unlink(tmp.name)
+        else:
+            target.parent.mkdir(exist_ok=True)
+            os.replace(tmp.name, target)
+        return digest, size
+
+    def open(self, reference: dict[str, Any]) -> BinaryIO:
+        # Loads the payload of a reference written by BlobResolver
+        return self.path_for(reference["blob"]).open("rb")
+
+
+def _is_blob_index(value: Any) -> bool:
+    # ccl deserializes Blob and File objects of a value as BlobIndex, which
+    # only holds the position of the blob in the record's blob entry
+    return type(value).__name__ == "BlobIndex" and hasattr(value, "index_id")
+
+
+class BlobResolver:
+    # Replaces the BlobIndex objects in record values by references into a
+    # BlobStore. The blob files are copied on a thread pool while ccl decodes
+    # the next records; records are handed on in their order as soon as all
+    # of their blobs are stored.
+    def __init__(
+        self, store: BlobStore, workers: Optional[int] = None, window: int = WINDOW
+    ) -> None:
+        self.store = store
+        self.window = window
+        self.stored = 0
+        self.failed = 0
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="blob")
+        self._pending: deque[tuple[dict, list[Future]]] = deque()
+
+    def _copy(self, stream: BinaryIO, reference: dict[str, Any]) -> bool:
+        try:
+            with stream:
+                reference["blob"], reference["size"] = self.store.put(stream)
+        except Exception as e:
+            reference["error"] = str(e)
+            return False
+        return True
+
+    def _reference(self, blob_index: Any, record: Any, futures: list[Future]) -> dict:
+        reference: dict[str, Any] = {"blob": None, "size": None}
+        try:
+            info = record.resolve_blob_index(blob_index)
+            reference["mime_type"] = getattr(info, "mime_type", None)
+            reference["file_name"] = getattr(info, "file_name", None)
+            stream = record.get_blob_stream(blob_index)
+        except Exception as e:
+            reference["error"] = str(e)
+            self.failed += 1
+            return reference
+        futures.append(self._executor.submit(self._copy, stream, reference))
+        return reference
+
+    def _replace(self, value: Any, record: Any, futures: list[Future]) -> Any:
+        if _is_blob_index(value):
+            return self._reference(value, record, futures)
+        if isinstance(value, dict):
+            for key, item in value.items():
+                value[key] = self._replace(item, record, futures)
+        elif isinstance(value, list):
+            for i, item in enumerate(value):
+                value[i] = self._replace(item, record, futures)
+        return value
+
+    def add(self, data: dict[str, Any], record: Any) -> Iterator[dict[str, Any]]:
+        # Yields the records, this one or earlier ones, that are complete
+        futures: list[Future] = []
+        data["value"] = self._replace(data["value"], record, futures)
+        self._pending.append((data, futures))
+        while self._pending and (
+            len(self._pending) > self.window
+            or all(future.done() for future in self._pending[0][1])
+        ):
+            yield self._finish()
+
+    def flush(self) -> Iterator[dict[str, Any]]:
+        while self._pending:
+            yield self._finish()
+
+    def _finish(self) -> dict[str, Any]:
+        data, futures = self._pending.popleft()
+        for future in futures:
+            if future.result():
+                self.stored += 1
+            else:
+                self.failed += 1
+        return data
+
+    def close(self) -> None:
+        self._pending.clear()
+        self._executor.shutdown(cancel_futures=True)
+
+    def __enter__(self) -> "BlobResolver":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
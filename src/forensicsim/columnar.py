@@ -0,0 +1,261 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import sys
+from array import array
+from collections.abc import Iterable
+from dataclasses import fields
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Optional, get_args
+
+from forensicsim.parser import Contact, Meeting, Message
+
+try:
+    # Optional, for Parquet and Arrow IPC files
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None
+    pq = None
+
+FORMATS = ("parquet", "arrow", "columns")
+
+# Rows per Parquet row group, Arrow record batch or append to the column files
+ROW_GROUP_SIZE = 65536
+
+
+def _column_type(annotation: Any) -> str:
+    args = get_args(annotation) or (annotation,)
+    if bool in args:
+        return "bool"
+    if float in args:
+        return "float"
+    # Timestamps are encoded as strings, nested values as JSON
+    return "string"
+
+
+def _schema(cls: type) -> list[tuple[str, str]]:
+    # Column names as in the JSON output, in the order of the dataclass
+    names = cls().to_dict().keys()
+    return [(name, _column_type(f.type)) for name, f in zip(names, fields(cls))]
+
+
+# One stable schema per record type, whether or not a value is present
+SCHEMAS = {
+    "message": _schema(Message),
+    "call": _schema(Message),
+    "reaction": _schema(Message),
+    "contact": _schema(Contact),
+    "meeting": _schema(Meeting),
+}
+
+
+def _text(value: str) -> str:
+    # Lone surrogates from V8 strings can not be stored as UTF-8
+    try:
+        value.encode("utf-8")
+    except UnicodeEncodeError:
+        return value.encode("utf-8", "replace").decode("utf-8")
+    return value
+
+
+def _cell(value: Any, kind: str) -> Any:
+    if value is None:
+        return None
+    if kind == "bool":
+        return bool(value)
+    if kind == "float":
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    if isinstance(value, str):
+        return _text(value)
+    if isinstance(value, (dict, list)):
+        return _text(json.dumps(value, ensure_ascii=False, default=str))
+    return _text(str(value))
+
+
+class _ArrowTable:
+    # One Parquet or Arrow IPC file per record type
+    def __init__(self, path: Path, schema: list[tuple[str, str]], fmt: str) -> None:
+        types = {"string": pa.string(), "bool": pa.bool_(), "float": pa.float64()}
+        self._schema = pa.schema([(name, types[kind]) for name, kind in schema])
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(
+                str(path.with_suffix(".parquet")), self._schema
+            )
+        else:
+            self._writer = pa.ipc.new_file(
+                str(path.with_suffix(".arrow")), self._schema
+            )
+
+    def write(self, columns: dict[str, list]) -> None:
+        self._writer.write_batch(
+            pa.RecordBatch.from_pydict(columns, schema=self._schema)
+        )
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+class _ColumnFiles:
+    # Stdlib fallback: a folder per record type with a raw file per column,
+    # which can be memory-mapped, e.g. with numpy.memmap. Every column has a
+    # .valid file with one byte per row, 0 for null. Booleans are int8 and
+    # floats float64 in .values; strings are UTF-8 in .data, delimited by the
+    # int64 offsets in .offsets, which start with 0. schema.json lists the
+    # columns, the number of rows and the byte order.
+    def __init__(self, path: Path, schema: list[tuple[str, str]], fmt: str) -> None:
+        self._path = path
+        self._schema = schema
+        self._rows = 0
+        self._offsets = {name: 0 for name, kind in schema if kind == "string"}
+        path.mkdir(parents=True, exist_ok=True)
+        for name, kind in schema:
+            self._file(name, "valid").write_bytes(b"")
+            if kind == "string":
+                self._file(name, "offsets").write_bytes(array("q", [0]).tobytes())
+                self._file(name, "data").write_bytes(b"")
+            else:
+                self._file(name, "values").write_bytes(b"")
+        self._write_schema()
+
+    def _file(self, name: str, part: str) -> Path:
+        return self._path / f"{name}.{part}"
+
+    def _append(self, name: str, part: str, data: bytes) -> None:
+        with self._file(name, part).open("ab") as f:
+            f.write(data)
+
+    def _write_schema(self) -> None:
+        with (self._path / "schema.json").open("w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "rows": self._rows,
+                    "byteorder": sys.byteorder,
+                    "columns": [{"name": n, "type": k} for n, k in self._schema],
+                },
+                f,
+                indent=4,
+            )
+
+    def write(self, columns: dict[str, list]) -> None:
+        for name, kind in self._schema:
+            values = columns[name]
+            self._append(name, "valid", bytes(v is not None for v in values))
+            if kind == "string":
+                encoded = [b"" if v is None else v.encode("utf-8") for v in values]
+                offsets = array("q")
+                offset = self._offsets[name]
+                for data in encoded:
+                    offset += len(data)
+                    offsets.append(offset)
+                self._offsets[name] = offset
+                self._append(name, "offsets", offsets.tobytes())
+                self._append(name, "data", b"".join(encoded))
+            elif kind == "bool":
+                self._append(name, "values", bytes(bool(v) for v in values))
+            else:
+                floats = array("d", (float("nan") if v is None else v for v in values))
+                self._append(name, "values", floats.tobytes())
+        self._rows += len(columns[self._schema[0][0]])
+        self._write_schema()
+
+    def close(self) -> None:
+        pass
+
+
+class ColumnarWriter:
+    # Buffers records per record type and writes them in row groups
+    def __init__(self, directory: Path, fmt: Optional[str] = None) -> None:
+        if fmt is None:
+            fmt = "parquet" if pa is not None else "columns"
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown columnar format: {fmt}")
+        if fmt != "columns" and pa is None:
+            raise ValueError(f"The {fmt} format requires pyarrow.")
+        self.directory = directory
+        self.format = fmt
+        self.count = 0
+        self._tables: dict[str, Any] = {}
+        self._buffers: dict[str, dict[str, list]] = {}
+        directory.mkdir(parents=True, exist_ok=True)
+
+    def add(self, record: dict[str, Any]) -> None:
+        record_type = record.get("record_type")
+        if not isinstance(record_type, str) or record_type not in SCHEMAS:
+            raise ValueError(f"Unknown record type: {record_type}")
+        schema = SCHEMAS[record_type]
+        buffer = self._buffers.get(record_type)
+        if buffer is None:
+            buffer = self._buffers[record_type] = {name: [] for name, _ in schema}
+        for name, kind in schema:
+            buffer[name].append(_cell(record.get(name), kind))
+        self.count += 1
+        if len(buffer[schema[0][0]]) >= ROW_GROUP_SIZE:
+            self._flush(record_type)
+
+    def _flush(self, record_type: str) -> None:
+        buffer = self._buffers.pop(record_type, None)
+        if not buffer:
+            return
+        table = self._tables.get(record_type)
+        if table is None:
+            table_class = _ColumnFiles if self.format == "columns" else _ArrowTable
+            table = self._tables[record_type] = table_class(
+                self.directory / record_type, SCHEMAS[record_type], self.format
+            )
+        table.write(buffer)
+
+    def close(self) -> None:
+        for record_type in list(self._buffers):
+            self._flush(record_type)
+        for table in self._tables.values():
+            table.close()
+        self._tables = {}
+
+    def __enter__(self) -> "ColumnarWriter":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+def write_results_to_columns(
+    data: Iterable[dict], outputpath: Path, fmt: Optional[str] = None
+) -> int:
+    # Counterpart of write_results_to_json that writes a file (or for the
+    # columns format a folder) per record type into the folder outputpath
+    with ColumnarWriter(outputpath, fmt) as writer:
+        for record in data:
+            writer.add(record)
+    return writer.count
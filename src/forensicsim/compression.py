@@ -0,0 +1,258 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import gzip
+import io
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, BinaryIO, Optional, TextIO, cast
+
+import click
+
+zstandard: Any
+try:
+    # Optional, compresses faster and smaller than gzip
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+CODECS = ("gzip", "zstd")
+SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+# Every block becomes a gzip member or zstd frame of its own
+BLOCK_SIZE = 2**22
+
+
+def available_codec(codec: str) -> str:
+    # zstd falls back to gzip without the zstandard package
+    if codec == "zstd" and zstandard is None:
+        return "gzip"
+    return codec
+
+
+def parse_codec(
+    ctx: click.Context, param: click.Parameter, value: Optional[str]
+) -> Optional[str]:
+    # click callback of the --compress options of the tools
+    if value is None:
+        return None
+    codec = available_codec(value)
+    if codec != value:
+        click.echo(f"zstandard is not installed, using {codec}.", err=True)
+    return codec
+
+
+def codec_for(path: Path) -> Optional[str]:
+    for codec, suffix in SUFFIXES.items():
+        if path.name.endswith(suffix):
+            return codec
+    return None
+
+
+def compressed_path(path: Path, codec: Optional[str]) -> Path:
+    if codec is None or codec_for(path) == codec:
+        return path
+    return path.with_name(path.name + SUFFIXES[codec])
+
+
+def compress_block(codec: str, block: bytes) -> bytes:
+    if codec == "zstd":
+        # Compressor objects must not be shared between threads
+        return zstandard.ZstdCompressor().compress(block)
+    return gzip.compress(block, mtime=0)
+
+
+class BlockWriter(io.RawIOBase):
+    # Compresses what is written in blocks of BLOCK_SIZE. Gzip members and
+    # zstd frames can be concatenated, so the output is a valid stream after
+    # every block and can be read while it is written. With threads, the
+    # blocks are compressed in parallel and written in their order. See
+    # text_writer for a text file on top of it.
+    def __init__(
+        self,
+        raw: BinaryIO,
+        codec: str,
+        threads: int = 0,
+        block_size: int = BLOCK_SIZE,
+        close_raw: bool = True,
+    ) -> None:
+        super().__init__()
+        if codec not in CODECS:
+            raise ValueError(f"Unknown compression: {codec}")
+        if codec == "zstd" and zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        self.raw = raw
+        self.codec = codec
+        self.block_size = block_size
+        self.close_raw = close_raw
+        self._threads = threads
+        self._executor = ThreadPoolExecutor(threads) if threads > 0 else None
+        self._buffer = bytearray()
+        self._pending: deque[Future[bytes]] = deque()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            block = bytes(self._buffer[: self.block_size])
+            del self._buffer[: self.block_size]
+            self._submit(block)
+        return len(data)
+
+    def _submit(self, block: bytes) -> None:
+        if self._executor is None:
+            self.raw.write(compress_block(self.codec, block))
+            return
+        self._pending.append(self._executor.submit(compress_block, self.codec, block))
+        # Bounds the memory held by blocks waiting to be written
+        while len(self._pending) > 2 * self._threads:
+            self.raw.write(self._pending.popleft().result())
+
+    def flush(self) -> None:
+        # Ends the current block early, e.g. for a reader that follows the
+        # output
+        if self.closed:
+            return
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self.raw.write(self._pending.popleft().result())
+        self.raw.flush()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            super().close()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+            if self.close_raw:
+                self.raw.close()
+
+
+class _BufferedBlockWriter(io.BufferedWriter):
+    # BufferedWriter does not pass flush on to the raw stream, where it ends
+    # the current block
+    def flush(self) -> None:
+        super().flush()
+        self.raw.flush()
+
+
+def text_writer(
+    raw: BinaryIO, codec: str, threads: int = 0, close_raw: bool = True
+) -> TextIO:
+    return io.TextIOWrapper(
+        _BufferedBlockWriter(BlockWriter(raw, codec, threads, close_raw=close_raw)),
+        encoding="utf-8",
+    )
+
+
+def binary_writer(
+    raw: BinaryIO, codec: str, threads: int = 0, close_raw: bool = True
+) -> BinaryIO:
+    return _BufferedBlockWriter(BlockWriter(raw, codec, threads, close_raw=close_raw))
+
+
+def open_text(path: Path, codec: Optional[str] = None, threads: int = 0) -> TextIO:
+    # Text file for writing, compressed if a codec is given
+    if codec is None:
+        return open(path, "w", encoding="utf-8")
+    return text_writer(open(path, "wb"), codec, threads)
+
+
+def read_text(path: Path) -> TextIO:
+    # Text file for reading, decompressed by its suffix. Every frame of a
+    # zstd stream is read, not only the first one.
+    codec = codec_for(path)
+    if codec == "gzip":
+        return gzip.open(path, "rt", encoding="utf-8")
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            path.open("rb"), read_across_frames=True, closefd=True
+        )
+        return io.TextIOWrapper(reader, encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+class _ZstdReader(io.RawIOBase):
+    # Seekable reader of a zstd file. Seeking backwards reads the file again
+    # from the start, as gzip.GzipFile does.
+    def __init__(self, path: Path) -> None:
+        super().__init__()
+        self.path = path
+        self._reader = self._open()
+
+    def _open(self) -> Any:
+        return zstandard.ZstdDecompressor().stream_reader(
+            self.path.open("rb"), read_across_frames=True, closefd=True
+        )
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        return self._reader.readinto(buffer)
+
+    def tell(self) -> int:
+        return self._reader.tell()
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.tell()
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("seek relative to the end")
+        if offset < self.tell():
+            self._reader.close()
+            self._reader = self._open()
+        self._reader.seek(offset)
+        return offset
+
+    def close(self) -> None:
+        if not self.closed:
+            self._reader.close()
+        super().close()
+
+
+def read_binary(path: Path) -> BinaryIO:
+    # Binary file for reading, decompressed by its suffix. Offsets refer to
+    # the decompressed data.
+    codec = codec_for(path)
+    if codec == "gzip":
+        return cast(BinaryIO, gzip.open(path, "rb"))
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        return io.BufferedReader(_ZstdReader(path))
+    return path.open("rb")
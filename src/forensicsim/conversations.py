@@ -0,0 +1,161 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import hashlib
+import json
+import re
+import tempfile
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+from forensicsim.backend import read_results_from_json, write_results_to_json
+from forensicsim.parser import encode_timestamp, message_time
+
+MANIFEST_NAME = "manifest.json"
+# Records without a conversation, e.g. contacts
+OTHER_NAME = "other.json"
+
+# Records are held back per conversation up to this many bytes in total,
+# then appended to the bucket files of their conversations
+BUCKET_BUFFER = 64 * 2**20
+
+FILE_NAME_PATTERN = re.compile(r"[^A-Za-z0-9._@-]+")
+
+
+def conversation_file_name(conversation_id: str) -> str:
+    # Conversation ids contain characters that are not allowed in file names
+    # on Windows, the hash keeps the shortened names apart
+    digest = hashlib.blake2b(conversation_id.encode("utf-8"), digest_size=4)
+    name = FILE_NAME_PATTERN.sub("_", conversation_id)[:80].strip("._")
+    return f"{name}_{digest.hexdigest()}.json"
+
+
+def record_time(record: dict[str, Any]) -> str:
+    # createdTime is set for both Teams versions, in a format that sorts as
+    # text; the arrival times are converted to the same format
+    created = record.get("createdTime")
+    if created:
+        return str(created)
+    return encode_timestamp(message_time(record)) or ""
+
+
+@dataclass()
+class _Conversation:
+    conversation_id: Optional[str]
+    bucket: Path
+    lines: list[str] = field(default_factory=list)
+
+
+class _Buckets:
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self.conversations: dict[Optional[str], _Conversation] = {}
+        self._buffered = 0
+
+    def add(self, conversation_id: Optional[str], record: dict[str, Any]) -> None:
+        conversation = self.conversations.get(conversation_id)
+        if conversation is None:
+            bucket = self.directory / f"{len(self.conversations)}.jsonl"
+            conversation = _Conversation(conversation_id, bucket)
+            self.conversations[conversation_id] = conversation
+        line = json.dumps(record, default=str) + "\n"
+        conversation.lines.append(line)
+        self._buffered += len(line)
+        if self._buffered > BUCKET_BUFFER:
+            self.flush()
+
+    def flush(self) -> None:
+        for conversation in self.conversations.values():
+            if conversation.lines:
+                with conversation.bucket.open("a", encoding="utf-8") as f:
+                    f.writelines(conversation.lines)
+                conversation.lines = []
+        self._buffered = 0
+
+    def read(self, conversation: _Conversation) -> list[dict[str, Any]]:
+        if not conversation.bucket.exists():
+            return []
+        with conversation.bucket.open(encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+
+def _manifest_entry(
+    conversation_id: str, file_name: str, records: list[dict[str, Any]]
+) -> dict[str, Any]:
+    times = [t for t in (record_time(r) for r in records) if t]
+    participants = {r["creator"] for r in records if r.get("creator")}
+    return {
+        "conversation_id": conversation_id,
+        "file": file_name,
+        "message_count": sum(1 for r in records if r.get("record_type") == "message"),
+        "record_count": len(records),
+        "first_timestamp": min(times, default=None),
+        "last_timestamp": max(times, default=None),
+        "participants": sorted(participants),
+    }
+
+
+def write_results_to_conversations(data: Iterable[dict], outputpath: Path) -> int:
+    # Writes the messages, calls and reactions of every conversation to a
+    # file of their own in the folder outputpath, in the order they were
+    # sent. The records are first split into a bucket per conversation, so
+    # that only one conversation at a time is sorted in memory.
+    outputpath.mkdir(parents=True, exist_ok=True)
+    count = 0
+    manifest = []
+    with tempfile.TemporaryDirectory(dir=outputpath, prefix=".buckets_") as tmp:
+        buckets = _Buckets(Path(tmp))
+        for record in data:
+            buckets.add(record.get("conversationId") or None, record)
+            count += 1
+        buckets.flush()
+
+        for conversation_id in sorted(
+            c for c in buckets.conversations if c is not None
+        ):
+            conversation = buckets.conversations[conversation_id]
+            records = buckets.read(conversation)
+            records.sort(
+                key=lambda r: (record_time(r), str(r.get("cachedDeduplicationKey")))
+            )
+            file_name = conversation_file_name(conversation_id)
+            write_results_to_json(records, outputpath / file_name)
+            manifest.append(_manifest_entry(conversation_id, file_name, records))
+
+        other = buckets.conversations.get(None)
+        write_results_to_json(
+            buckets.read(other) if other else [], outputpath / OTHER_NAME
+        )
+    write_results_to_json(manifest, outputpath / MANIFEST_NAME)
+    return count
+
+
+def read_conversation(outputpath: Path, conversation_id: str) -> list[dict[str, Any]]:
+    # Reads a single conversation of write_results_to_conversations
+    path = outputpath / conversation_file_name(conversation_id)
+    if not path.exists():
+        raise ValueError(f"Unknown conversation: {conversation_id}")
+    return list(read_results_from_json(path))
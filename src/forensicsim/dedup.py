@@ -0,0 +1,165 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import hashlib
+import json
+import sqlite3
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Optional
+
+# Fields that identify a record across acquisitions, per record type. Both the
+# camelCase names of the output and the field names of the dataclasses work.
+KEY_FIELDS = {
+    "contact": ("mri",),
+    "meeting": ("id", "cachedDeduplicationKey", "cached_deduplication_key"),
+}
+DEFAULT_KEY_FIELDS = ("cachedDeduplicationKey", "cached_deduplication_key")
+
+# Differ between acquisitions without the content having changed
+IGNORED_FIELDS = frozenset(("origin_file",))
+
+
+def record_digest(record: dict[str, Any]) -> str:
+    content = {k: v for k, v in record.items() if k not in IGNORED_FIELDS}
+    data = json.dumps(content, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.blake2b(
+        data.encode("utf-8", "surrogatepass"), digest_size=16
+    ).hexdigest()
+
+
+def record_key(record: dict[str, Any], digest: str) -> str:
+    record_type = record.get("record_type") or "record"
+    for name in KEY_FIELDS.get(record_type, DEFAULT_KEY_FIELDS):
+        if record.get(name) is not None:
+            return f"{record_type}:{record[name]}"
+    # Without a key, a record can only be added or removed
+    return f"{record_type}#{digest}"
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    digest TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    source TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sightings (
+    digest TEXT NOT NULL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (digest, source)
+) WITHOUT ROWID;
+"""
+
+# Records are decided and committed in batches of this size, so that
+# parallel runs sharing the index take turns
+BATCH_SIZE = 1000
+
+# Seconds to wait for another run to release the index
+BUSY_TIMEOUT = 300
+
+
+class DedupIndex:
+    # Digests of every record emitted for a case, shared by all runs. A record
+    # is emitted by the first source it is found in; later sources only add
+    # themselves to its sightings. Processing a source again emits the same
+    # records as before.
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.emitted = 0
+        self.skipped = 0
+        self._connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.executescript(SCHEMA)
+
+    def _is_new(self, record: dict[str, Any], source: str) -> bool:
+        digest = record_digest(record)
+        connection = self._connection
+        inserted = connection.execute(
+            "INSERT OR IGNORE INTO records (digest, key, source) VALUES (?, ?, ?)",
+            (digest, record_key(record, digest), source),
+        ).rowcount
+        connection.execute(
+            "INSERT OR IGNORE INTO sightings (digest, source) VALUES (?, ?)",
+            (digest, source),
+        )
+        if inserted:
+            return True
+        (first_source,) = connection.execute(
+            "SELECT source FROM records WHERE digest = ?", (digest,)
+        ).fetchone()
+        return first_source == source
+
+    def _decide(self, batch: list[dict], source: str) -> list[dict]:
+        new = [record for record in batch if self._is_new(record, source)]
+        self.commit()
+        self.emitted += len(new)
+        self.skipped += len(batch) - len(new)
+        return new
+
+    def unseen(self, records: Iterable[dict], source: str) -> Iterator[dict]:
+        # A batch is committed before its records are yielded, so that the
+        # index is not locked while the caller writes them
+        batch: list[dict] = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= BATCH_SIZE:
+                yield from self._decide(batch, source)
+                batch = []
+        yield from self._decide(batch, source)
+
+    def sightings(self) -> Iterator[dict[str, Any]]:
+        # Every record with the sources it was found in, first source first
+        rows = self._connection.execute(
+            "SELECT r.digest, r.key, r.source, s.source FROM records r "
+            "JOIN sightings s ON s.digest = r.digest ORDER BY r.key, r.digest"
+        )
+        entry: Optional[dict[str, Any]] = None
+        for digest, key, first_source, source in rows:
+            if entry is None or entry["digest"] != digest:
+                if entry is not None:
+                    yield entry
+                entry = {"digest": digest, "key": key, "sources": [first_source]}
+            if source != first_source:
+                entry["sources"].append(source)
+        if entry is not None:
+            yield entry
+
+    def commit(self) -> None:
+        self._connection.commit()
+
+    def close(self) -> None:
+        self.commit()
+        self._connection.close()
+
+    def __enter__(self) -> "DedupIndex":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
@@ -0,0 +1,131 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import random
+import reprlib
+from pathlib import Path
+from typing import Any, Optional, TextIO, Union
+
+from forensicsim.compression import codec_for, open_text
+
+# Failures kept as a sample in unrecognized.json
+RESERVOIR_SIZE = 100
+
+
+class SnapshotRepr(reprlib.Repr):
+    # reprlib has no handler for bytes, which would otherwise get the full
+    # repr of the value before it is cut. Like strings, they are cut first.
+    def repr_bytes(self, x: Union[bytes, bytearray], level: int) -> str:
+        s = repr(x[: self.maxstring])
+        if len(s) > self.maxstring or len(x) > self.maxstring:
+            i = max(0, (self.maxstring - 3) // 2)
+            j = max(0, self.maxstring - 3 - i)
+            s = s[:i] + "..." + s[len(s) - j :]
+        return s
+
+    def repr_bytearray(self, x: bytearray, level: int) -> str:
+        return self.repr_bytes(x, level)
+
+
+# Snapshots of failing values are built by reprlib, which stops descending
+# into a value once these limits are reached instead of building the full repr
+SNAPSHOT_REPR = SnapshotRepr()
+SNAPSHOT_REPR.maxlevel = 3
+SNAPSHOT_REPR.maxdict = 10
+SNAPSHOT_REPR.maxlist = 10
+SNAPSHOT_REPR.maxtuple = 10
+SNAPSHOT_REPR.maxset = 10
+SNAPSHOT_REPR.maxstring = 200
+SNAPSHOT_REPR.maxother = 200
+SNAPSHOT_REPR.maxlong = 100
+SNAPSHOT_LENGTH = 500
+
+
+def snapshot(value: Any) -> str:
+    try:
+        return SNAPSHOT_REPR.repr(value)[:SNAPSHOT_LENGTH]
+    except Exception as e:
+        return f"<unrepresentable {type(value).__name__}: {type(e).__name__}>"
+
+
+class FailureReservoir:
+    # Counts failures per error class and keeps a uniform random sample of
+    # them (Algorithm R), so memory stays constant no matter how many records
+    # fail. Every failure can additionally be streamed to a JSON lines file.
+    def __init__(
+        self,
+        size: int = RESERVOIR_SIZE,
+        stream: Optional[TextIO] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.size = size
+        self.total = 0
+        self.error_classes: dict[str, int] = {}
+        self.sample: list[dict[str, Any]] = []
+        self._random = random.Random(seed)
+        self._stream = stream
+
+    def add(self, error: BaseException, value: Any = None, **context: Any) -> None:
+        self.total += 1
+        error_class = type(error).__name__
+        self.error_classes[error_class] = self.error_classes.get(error_class, 0) + 1
+
+        # Only build the failure if it is kept or streamed
+        if self.total <= self.size:
+            slot: Optional[int] = len(self.sample)
+        else:
+            slot = self._random.randrange(self.total)
+            if slot >= self.size:
+                slot = None
+        if slot is None and self._stream is None:
+            return
+
+        failure = {
+            **context,
+            "error_class": error_class,
+            "error": str(error)[:SNAPSHOT_LENGTH],
+            "value_fragment": snapshot(value),
+        }
+        if slot == len(self.sample):
+            self.sample.append(failure)
+        elif slot is not None:
+            self.sample[slot] = failure
+        if self._stream is not None:
+            self._stream.write(json.dumps(failure, default=str, ensure_ascii=False))
+            self._stream.write("\n")
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "total_failures": self.total,
+            "error_classes": dict(
+                sorted(self.error_classes.items(), key=lambda item: -item[1])
+            ),
+            "sample_size": len(self.sample),
+            "sample": self.sample,
+        }
+
+    def write_summary(self, path: Path) -> None:
+        with open_text(path, codec_for(path)) as f:
+            json.dump(self.summary(), f, indent=4, default=str, ensure_ascii=False)
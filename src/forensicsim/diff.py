@@ -0,0 +1,96 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import tempfile
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Any, Optional
+
+from forensicsim.backend import iter_db, read_results_from_json
+from forensicsim.dedup import record_digest, record_key
+from forensicsim.parser import iter_parsed_records
+from forensicsim.profile import blob_dir_for
+
+
+def _keyed(records: Iterable[dict]) -> Iterator[tuple[str, str, dict]]:
+    # Records sharing a key within one acquisition are told apart by their
+    # position, so that none of them is lost
+    seen: dict[str, int] = {}
+    for record in records:
+        digest = record_digest(record)
+        key = record_key(record, digest)
+        n = seen.get(key, 0)
+        seen[key] = n + 1
+        yield (f"{key}#{n}" if n else key), digest, record
+
+
+def iter_snapshot(
+    path: Path, max_memory: Optional[int] = None, spill_dir: Optional[Path] = None
+) -> Iterator[dict]:
+    # A .leveldb folder is parsed, anything else is read as a previous output
+    if path.is_dir():
+        if not path.name.endswith(".leveldb"):
+            raise ValueError(f"Expected a leveldb folder or a JSON file. Path: {path}")
+        yield from iter_parsed_records(
+            iter_db(path, blob_dir_for(path)), max_memory, spill_dir
+        )
+    else:
+        yield from read_results_from_json(path)
+
+
+def diff_records(
+    old: Iterable[dict], new: Iterable[dict], spool_dir: Optional[Path] = None
+) -> Iterator[dict]:
+    # One pass per side. Only the keys and digests of the old records stay in
+    # memory; the records themselves are spooled to a temporary file, from
+    # which the removed ones are read back at the end.
+    index: dict[str, tuple[str, int, int]] = {}
+    with tempfile.TemporaryFile(dir=spool_dir) as spool:
+        for key, digest, record in _keyed(old):
+            data = json.dumps(record, default=str).encode("utf-8") + b"\n"
+            index[key] = (digest, spool.tell(), len(data))
+            spool.write(data)
+
+        def read(offset: int, length: int) -> dict[str, Any]:
+            spool.seek(offset)
+            return json.loads(spool.read(length))
+
+        for key, digest, record in _keyed(new):
+            previous = index.pop(key, None)
+            if previous is None:
+                yield {"change": "added", "key": key, "record": record}
+            elif previous[0] != digest:
+                yield {
+                    "change": "modified",
+                    "key": key,
+                    "record": record,
+                    "previous": read(*previous[1:]),
+                }
+
+        # Removed records in the order of the old acquisition
+        for key, (_, offset, length) in sorted(
+            index.items(), key=lambda item: item[1][1]
+        ):
+            yield {"change": "removed", "key": key, "record": read(offset, length)}
@@ -0,0 +1,220 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import csv
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Optional
+
+from forensicsim.backend import write_results_to_json
+from forensicsim.conversations import record_time
+from forensicsim.parser import decode_timestamp, encode_timestamp
+
+# Person to person edges are only derived for conversations with at most
+# this many participants, large channels only have edges to the conversation
+MAX_PARTICIPANTS = 100
+
+COLUMNS = (
+    "source",
+    "target",
+    "target_type",
+    "conversation",
+    "messages",
+    "calls",
+    "reactions",
+    "first_time",
+    "last_time",
+)
+
+
+@dataclass()
+class EdgeStats:
+    messages: int = 0
+    calls: int = 0
+    reactions: int = 0
+    first_time: Optional[str] = None
+    last_time: Optional[str] = None
+
+    def count(self, kind: str, time: Optional[str]) -> None:
+        setattr(self, kind, getattr(self, kind) + 1)
+        if time:
+            self.count_time(time)
+
+    def merge(self, other: "EdgeStats") -> None:
+        self.messages += other.messages
+        self.calls += other.calls
+        self.reactions += other.reactions
+        for time in (other.first_time, other.last_time):
+            if time:
+                self.count_time(time)
+
+    def count_time(self, time: str) -> None:
+        if self.first_time is None or time < self.first_time:
+            self.first_time = time
+        if self.last_time is None or time > self.last_time:
+            self.last_time = time
+
+
+def _member_mri(member: Any) -> Optional[str]:
+    if isinstance(member, dict):
+        return member.get("mri") or member.get("id")
+    return member if isinstance(member, str) else None
+
+
+def _reaction_time(user: dict[str, Any]) -> Optional[str]:
+    try:
+        return encode_timestamp(decode_timestamp(str(int(user["time"]))))
+    except (KeyError, TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+class CommunicationGraph:
+    # Who talks to whom, aggregated from the records as they are written.
+    # Memory grows with the number of edges, not of records.
+    def __init__(self) -> None:
+        # (sender, conversation) -> counts of the sender's records
+        self.senders: dict[tuple[str, str], EdgeStats] = defaultdict(EdgeStats)
+        # (user, creator of the message, conversation) -> reactions
+        self.reactions: dict[tuple[str, str, str], EdgeStats] = defaultdict(EdgeStats)
+        # conversation -> members listed in its meeting
+        self.members: dict[str, set[str]] = defaultdict(set)
+
+    def add(self, record: dict[str, Any]) -> None:
+        record_type = record.get("record_type")
+        if record_type == "meeting":
+            conversation = record.get("id")
+            if conversation:
+                for member in record.get("members") or ():
+                    mri = _member_mri(member)
+                    if mri:
+                        self.members[conversation].add(mri)
+            return
+        if record_type not in ("message", "call", "reaction"):
+            return
+        conversation = record.get("conversationId")
+        creator = record.get("creator")
+        if not conversation or not creator:
+            return
+        kind = {"message": "messages", "call": "calls"}.get(record_type, "reactions")
+        self.senders[creator, conversation].count(kind, record_time(record) or None)
+        properties = record.get("properties")
+        if not isinstance(properties, dict):
+            return
+        for emotion in properties.get("emotions") or ():
+            if not isinstance(emotion, dict):
+                continue
+            for user in emotion.get("users") or ():
+                if isinstance(user, dict) and user.get("mri"):
+                    self.reactions[user["mri"], creator, conversation].count(
+                        "reactions", _reaction_time(user)
+                    )
+
+    def track(self, records: Iterable[dict]) -> Iterator[dict]:
+        for record in records:
+            self.add(record)
+            yield record
+
+    def edges(self) -> Iterator[dict[str, Any]]:
+        participants: dict[str, set[str]] = defaultdict(set)
+        for conversation, members in self.members.items():
+            participants[conversation] |= members
+        for sender, conversation in self.senders:
+            participants[conversation].add(sender)
+
+        # Person to conversation
+        for (sender, conversation), stats in sorted(self.senders.items()):
+            yield self._row(sender, conversation, "conversation", conversation, stats)
+        for conversation, members in sorted(self.members.items()):
+            for member in sorted(members):
+                if (member, conversation) not in self.senders:
+                    yield self._row(
+                        member, conversation, "conversation", conversation, EdgeStats()
+                    )
+
+        # Person to person: every sender reaches the other participants, and
+        # reactions point at the author of the message
+        person: dict[tuple[str, str, str], EdgeStats] = defaultdict(EdgeStats)
+        for (sender, conversation), stats in self.senders.items():
+            others = participants[conversation]
+            if len(others) > MAX_PARTICIPANTS:
+                continue
+            for other in others:
+                if other != sender:
+                    # Reactions of the sender are counted per author below
+                    person[sender, other, conversation].merge(
+                        replace(stats, reactions=0)
+                    )
+        for key, stats in self.reactions.items():
+            person[key].merge(stats)
+        for (source, target, conversation), stats in sorted(person.items()):
+            yield self._row(source, target, "person", conversation, stats)
+
+    @staticmethod
+    def _row(
+        source: str,
+        target: str,
+        target_type: str,
+        conversation: str,
+        stats: EdgeStats,
+    ) -> dict[str, Any]:
+        return {
+            "source": source,
+            "target": target,
+            "target_type": target_type,
+            "conversation": conversation,
+            "messages": stats.messages,
+            "calls": stats.calls,
+            "reactions": stats.reactions,
+            "first_time": stats.first_time,
+            "last_time": stats.last_time,
+        }
+
+    def write(self, path: Path) -> int:
+        # CSV for a .csv path, JSON otherwise
+        if path.suffix.lower() != ".csv":
+            return write_results_to_json(self.edges(), path)
+        count = 0
+        with path.open("w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, COLUMNS)
+            writer.writeheader()
+            for row in self.edges():
+                writer.writerow(row)
+                count += 1
+        return count
+
+
+def with_graph(
+    write_results: Callable[[Iterable[dict], Path], int], graph_path: Path
+) -> Callable[[Iterable[dict], Path], int]:
+    # Wraps a writer of process_db, so that the graph is collected from the
+    # records while they are written
+    def write(data: Iterable[dict], outputpath: Path) -> int:
+        graph = CommunicationGraph()
+        count = write_results(graph.track(data), outputpath)
+        graph.write(graph_path)
+        return count
+
+    return write
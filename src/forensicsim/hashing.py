@@ -0,0 +1,286 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from collections.abc import Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Optional, Union
+
+from forensicsim.index import CONTROL_FILE_PATTERN, DATA_FILE_PATTERN
+
+# Files are read in chunks of this size, never as a whole
+READ_SIZE = 2**20
+# hashlib releases the GIL for large chunks, so threads hash in parallel
+WORKERS = 4
+# Seconds to wait for another run to release the cache
+BUSY_TIMEOUT = 300
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    md5 TEXT,
+    PRIMARY KEY (path, size, mtime_ns)
+) WITHOUT ROWID;
+"""
+
+
+def evidence_files(leveldb: Path, blobpath: Optional[Path] = None) -> list[Path]:
+    # The table, log and control files of the LevelDB and every blob file
+    files = [
+        p
+        for p in sorted(leveldb.iterdir())
+        if p.is_file()
+        and (DATA_FILE_PATTERN.match(p.name) or CONTROL_FILE_PATTERN.match(p.name))
+    ]
+    if blobpath is not None:
+        for root, dirs, names in os.walk(blobpath):
+            dirs.sort()
+            files += [Path(root) / name for name in sorted(names)]
+    return files
+
+
+def hash_file(path: Path, md5: bool = False) -> tuple[str, Optional[str]]:
+    sha256 = hashlib.sha256()
+    md5_hash = hashlib.md5(usedforsecurity=False) if md5 else None
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_SIZE):
+            sha256.update(chunk)
+            if md5_hash is not None:
+                md5_hash.update(chunk)
+    return sha256.hexdigest(), md5_hash.hexdigest() if md5_hash else None
+
+
+@dataclass()
+class FileHash:
+    path: str
+    size: Optional[int] = None
+    mtime: Optional[str] = None
+    sha256: Optional[str] = None
+    md5: Optional[str] = None
+    # Taken from the cache instead of reading the file
+    cached: bool = False
+    # Size or modification time differed after hashing, e.g. a log that is
+    # still written to. Such hashes are not cached.
+    modified: bool = False
+    error: Optional[str] = None
+    # For sources read from a tar stream or from slices of an image, the
+    # name of the file in the manifest and the start of the slice in path
+    name: Optional[str] = None
+    offset: Optional[int] = None
+
+
+class StreamHash:
+    # Hashes of data that is read only once, e.g. a tar stream on stdin or a
+    # slice of an image, updated while it is copied
+    def __init__(self, md5: bool = False) -> None:
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._md5 = hashlib.md5(usedforsecurity=False) if md5 else None
+
+    def update(self, data: bytes) -> None:
+        self.size += len(data)
+        self._sha256.update(data)
+        if self._md5 is not None:
+            self._md5.update(data)
+
+    def result(self, path: str, **kwargs: Any) -> FileHash:
+        return FileHash(
+            path,
+            self.size,
+            sha256=self._sha256.hexdigest(),
+            md5=self._md5.hexdigest() if self._md5 is not None else None,
+            **kwargs,
+        )
+
+
+class HashCache:
+    # Hashes of earlier runs by (path, size, modification time)
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.executescript(CACHE_SCHEMA)
+
+    def get(
+        self, path: str, size: int, mtime_ns: int
+    ) -> Optional[tuple[str, Optional[str]]]:
+        return self._connection.execute(
+            "SELECT sha256, md5 FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (path, size, mtime_ns),
+        ).fetchone()
+
+    def put(
+        self, path: str, size: int, mtime_ns: int, sha256: str, md5: Optional[str]
+    ) -> None:
+        self._connection.execute(
+            "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, sha256, md5) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (path, size, mtime_ns, sha256, md5),
+        )
+
+    def commit(self) -> None:
+        self._connection.commit()
+
+    def close(self) -> None:
+        self.commit()
+        self._connection.close()
+
+    def __enter__(self) -> "HashCache":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+def file_mtime(stat: os.stat_result) -> str:
+    return datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc).isoformat()
+
+
+def _hash(path: Path, stat: os.stat_result, md5: bool) -> FileHash:
+    result = FileHash(str(path), stat.st_size, file_mtime(stat))
+    try:
+        result.sha256, result.md5 = hash_file(path, md5)
+        after = path.stat()
+    except OSError as e:
+        result.error = str(e)
+        return result
+    result.modified = (after.st_size, after.st_mtime_ns) != (
+        stat.st_size,
+        stat.st_mtime_ns,
+    )
+    return result
+
+
+class EvidenceHasher:
+    # Hashes the input files on a thread pool from the moment it is created,
+    # so that hashing overlaps with decoding the same files. The cache is
+    # only used from the creating thread. known holds hashes computed
+    # elsewhere, e.g. of the tar stream the files were extracted from.
+    def __init__(
+        self,
+        files: list[Path],
+        md5: bool = False,
+        cache_path: Optional[Path] = None,
+        workers: int = WORKERS,
+        known: Iterable[FileHash] = (),
+    ) -> None:
+        self.md5 = md5
+        self._cache = HashCache(cache_path) if cache_path is not None else None
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="hash")
+        self._stats: dict[str, os.stat_result] = {}
+        self._results: list[Union[FileHash, Future[FileHash]]] = list(known)
+        for path in files:
+            path = path.resolve()
+            try:
+                stat = path.stat()
+            except OSError as e:
+                self._results.append(FileHash(str(path), error=str(e)))
+                continue
+            self._stats[str(path)] = stat
+            cached = (
+                self._cache.get(str(path), stat.st_size, stat.st_mtime_ns)
+                if self._cache is not None
+                else None
+            )
+            if cached is not None and (cached[1] is not None or not md5):
+                self._results.append(
+                    FileHash(
+                        str(path),
+                        stat.st_size,
+                        file_mtime(stat),
+                        cached[0],
+                        cached[1] if md5 else None,
+                        cached=True,
+                    )
+                )
+            else:
+                self._results.append(self._executor.submit(_hash, path, stat, md5))
+
+    def results(self) -> list[FileHash]:
+        # Waits for the files still being hashed
+        results = []
+        for item in self._results:
+            result = item.result() if isinstance(item, Future) else item
+            results.append(result)
+            if (
+                self._cache is not None
+                and result.path in self._stats
+                and not result.cached
+                and not result.modified
+                and result.sha256 is not None
+            ):
+                stat = self._stats[result.path]
+                self._cache.put(
+                    result.path,
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    result.sha256,
+                    result.md5,
+                )
+        self._results = list(results)
+        if self._cache is not None:
+            self._cache.commit()
+        return results
+
+    def manifest(self) -> dict[str, Any]:
+        return {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "algorithms": ["sha256", "md5"] if self.md5 else ["sha256"],
+            "files": [asdict(result) for result in self.results()],
+        }
+
+    def write(self, path: Path) -> None:
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(self.manifest(), f, indent=4, ensure_ascii=False)
+
+    def close(self) -> None:
+        self._executor.shutdown(cancel_futures=True)
+        if self._cache is not None:
+            self._cache.close()
+
+    def __enter__(self) -> "EvidenceHasher":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
@@ -0,0 +1,142 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Decoding of the LevelDB keys that Chromium's IndexedDB backend writes, see
+# https://source.chromium.org/chromium/chromium/src/+/main:content/browser/indexed_db/docs/leveldb_coding_scheme.md
+# Only the keys are decoded here, values are left to ccl_chromium_reader.
+
+import json
+import struct
+from dataclasses import dataclass
+from typing import Any
+
+from forensicsim.leveldb import Buffer, CorruptionError, read_varint
+
+# index_id of the records of an object store and of their blob entries
+OBJECT_STORE_DATA_INDEX_ID = 1
+BLOB_ENTRY_INDEX_ID = 3
+
+OBJECT_STORE_META_DATA_TYPE_BYTE = 50
+OBJECT_STORE_NAME_META_DATA = 0
+
+KEY_NULL, KEY_STRING, KEY_DATE, KEY_NUMBER, KEY_ARRAY, KEY_MIN, KEY_BINARY = range(7)
+
+
+@dataclass(frozen=True)
+class KeyPrefix:
+    database_id: int
+    object_store_id: int
+    index_id: int
+    # Length of the encoded prefix
+    size: int
+
+    @property
+    def is_metadata(self) -> bool:
+        return self.object_store_id == 0
+
+
+def decode_key_prefix(key: Buffer) -> KeyPrefix:
+    if not key:
+        raise CorruptionError("Empty key")
+    first = key[0]
+    database_id_size = (first >> 5) + 1
+    object_store_id_size = ((first >> 2) & 7) + 1
+    index_id_size = (first & 3) + 1
+    size = 1 + database_id_size + object_store_id_size + index_id_size
+    if len(key) < size:
+        raise CorruptionError("Truncated key prefix")
+    pos = 1
+    values = []
+    for field_size in (database_id_size, object_store_id_size, index_id_size):
+        values.append(int.from_bytes(key[pos : pos + field_size], "little"))
+        pos += field_size
+    return KeyPrefix(values[0], values[1], values[2], size)
+
+
+def _decode_string(data: Buffer, pos: int, chars: int) -> tuple[str, int]:
+    end = pos + 2 * chars
+    if end > len(data):
+        raise CorruptionError("Truncated string")
+    return bytes(data[pos:end]).decode("utf-16-be", "surrogatepass"), end
+
+
+def decode_idb_key(data: Buffer, pos: int = 0) -> tuple[Any, int]:
+    # Returns the key as str, float, bytes or list and the end of the key
+    if pos >= len(data):
+        raise CorruptionError("Truncated key")
+    key_type = data[pos]
+    pos += 1
+    if key_type in (KEY_NULL, KEY_MIN):
+        return None, pos
+    if key_type == KEY_STRING:
+        chars, pos = read_varint(data, pos)
+        return _decode_string(data, pos, chars)
+    if key_type in (KEY_DATE, KEY_NUMBER):
+        if pos + 8 > len(data):
+            raise CorruptionError("Truncated number")
+        (number,) = struct.unpack_from("<d", data, pos)
+        return number, pos + 8
+    if key_type == KEY_ARRAY:
+        length, pos = read_varint(data, pos)
+        items = []
+        for _ in range(length):
+            item, pos = decode_idb_key(data, pos)
+            items.append(item)
+        return items, pos
+    if key_type == KEY_BINARY:
+        length, pos = read_varint(data, pos)
+        return bytes(data[pos : pos + length]), pos + length
+    raise CorruptionError(f"Unknown key type {key_type}")
+
+
+def key_text(key: Any) -> str:
+    # Text that lookups match against, strings stay as they are
+    if isinstance(key, str):
+        return key
+    if isinstance(key, float) and key.is_integer():
+        return str(int(key))
+    if isinstance(key, bytes):
+        return key.hex()
+    if isinstance(key, list):
+        return json.dumps([key_text(k) for k in key], ensure_ascii=False)
+    return str(key)
+
+
+def decode_object_store_name(key: Buffer, value: Buffer) -> tuple[int, int, str]:
+    # Returns (database id, object store id, name) if the record holds the
+    # name of an object store, raises ValueError otherwise
+    prefix = decode_key_prefix(key)
+    pos = prefix.size
+    if (
+        not prefix.is_metadata
+        or prefix.database_id == 0
+        or len(key) <= pos
+        or key[pos] != OBJECT_STORE_META_DATA_TYPE_BYTE
+    ):
+        raise ValueError("Not an object store name")
+    object_store_id, pos = read_varint(key, pos + 1)
+    if pos != len(key) - 1 or key[pos] != OBJECT_STORE_NAME_META_DATA:
+        raise ValueError("Not an object store name")
+    name, _ = _decode_string(value, 0, len(value) // 2)
+    return prefix.database_id, object_store_id, name
@@ -0,0 +1,627 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import re
+import shutil
+import sqlite3
+import tempfile
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import ExitStack, suppress
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Optional
+
+from forensicsim.backend import iter_db
+from forensicsim.idb import (
+    BLOB_ENTRY_INDEX_ID,
+    OBJECT_STORE_DATA_INDEX_ID,
+    KeyPrefix,
+    decode_idb_key,
+    decode_key_prefix,
+    decode_object_store_name,
+    key_text,
+)
+from forensicsim.leveldb import (
+    TYPE_VALUE,
+    BlockHandle,
+    Buffer,
+    CorruptionError,
+    LogRecord,
+    LogWriter,
+    encode_batch,
+    iter_batch,
+    iter_block_entries,
+    iter_log,
+    iter_table_blocks,
+    iter_table_index,
+    map_file,
+    read_block,
+    split_internal_key,
+)
+
+INDEX_VERSION = 2
+DATA_FILE_PATTERN = re.compile(r"^(\d{6})\.(ldb|sst|log)$")
+# Copied into the database that lookups hand to ccl
+CONTROL_FILE_PATTERN = re.compile(r"^(CURRENT|MANIFEST-\d+)$")
+
+SCHEMA = """
+CREATE TABLE info (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE files (
+    file_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE stores (
+    database_id INTEGER,
+    object_store_id INTEGER,
+    name TEXT,
+    PRIMARY KEY (database_id, object_store_id)
+);
+-- key and raw_key are NULL for metadata records (object_store_id 0). raw_key
+-- is the encoded IndexedDB key. For tables, offset and size are the block
+-- handle, for logs offset is the start of the batch.
+CREATE TABLE entries (
+    database_id INTEGER NOT NULL,
+    object_store_id INTEGER NOT NULL,
+    index_id INTEGER NOT NULL,
+    key TEXT,
+    raw_key BLOB,
+    file_id INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+"""
+
+INDEXES = """
+CREATE INDEX entries_by_key ON entries (key, object_store_id);
+CREATE INDEX entries_by_store ON entries (object_store_id);
+"""
+
+BATCH_SIZE = 10000
+
+
+def data_files(leveldb: Path) -> list[Path]:
+    return sorted(
+        p for p in leveldb.iterdir() if p.is_file() and DATA_FILE_PATTERN.match(p.name)
+    )
+
+
+def is_table_file(path: Path) -> bool:
+    return not path.name.endswith(".log")
+
+
+def iter_file_records(
+    data: Buffer, table: bool, verify: bool = True
+) -> Iterator[tuple[int, int, int, int, bytes, Optional[bytes]]]:
+    # (offset, size, sequence number, value type, key, value) of every record.
+    # verify is passed on to iter_table_blocks.
+    value: Optional[bytes]
+    if table:
+        for block in iter_table_blocks(data, verify):
+            if block.contents is None:
+                continue
+            for internal_key, value in iter_block_entries(block.contents):
+                key, sequence, value_type = split_internal_key(internal_key)
+                yield (
+                    block.handle.offset,
+                    block.handle.size,
+                    sequence,
+                    value_type,
+                    key,
+                    value,
+                )
+    else:
+        for item in iter_log(data):
+            if not isinstance(item, LogRecord):
+                continue
+            for sequence, value_type, key, value in iter_batch(item.payload):
+                yield item.offset, 0, sequence, value_type, key, value
+
+
+def _may_hold_metadata(lower: Optional[bytes], upper: bytes) -> bool:
+    # Keys are sorted by database and object store id. The keys of a block
+    # lie between the separators of the blocks before and of the block, so a
+    # block whose separators are both in the same database and not in its
+    # metadata (object store 0) holds no metadata.
+    if lower is None:
+        return True
+    try:
+        low = decode_key_prefix(split_internal_key(lower)[0])
+        high = decode_key_prefix(split_internal_key(upper)[0])
+    except CorruptionError:
+        return True
+    return low.database_id != high.database_id or low.is_metadata
+
+
+def iter_metadata_records(
+    data: Buffer, table: bool
+) -> Iterator[tuple[int, bytes, Optional[bytes]]]:
+    # (value type, key, value) of every metadata record. Of a table, only the
+    # blocks that can hold metadata are read. Checksums are not verified.
+    value: Optional[bytes]
+    if table:
+        lower = None
+        for separator, handle in iter_table_index(data, verify=False):
+            if _may_hold_metadata(lower, separator):
+                for internal_key, value in iter_block_entries(
+                    read_block(data, handle, verify=False)
+                ):
+                    key, _, value_type = split_internal_key(internal_key)
+                    if _is_metadata_key(key):
+                        yield value_type, key, value
+            lower = separator
+    else:
+        for *_, value_type, key, value in iter_file_records(data, False):
+            if _is_metadata_key(key):
+                yield value_type, key, value
+
+
+def _is_metadata_key(key: bytes) -> bool:
+    try:
+        return decode_key_prefix(key).is_metadata
+    except CorruptionError:
+        return False
+
+
+def index_row(
+    key: bytes, value: Optional[bytes]
+) -> Optional[tuple[int, int, int, Optional[str]]]:
+    try:
+        prefix = decode_key_prefix(key)
+    except CorruptionError:
+        return None
+    if prefix.is_metadata:
+        return prefix.database_id, 0, prefix.index_id, None
+    if prefix.index_id not in (OBJECT_STORE_DATA_INDEX_ID, BLOB_ENTRY_INDEX_ID):
+        return None
+    try:
+        idb_key, _ = decode_idb_key(key, prefix.size)
+    except CorruptionError:
+        return None
+    return (
+        prefix.database_id,
+        prefix.object_store_id,
+        prefix.index_id,
+        key_text(idb_key),
+    )
+
+
+def _raw_idb_key(key: bytes) -> bytes:
+    return bytes(key[decode_key_prefix(key).size :])
+
+
+def build_index(leveldb: Path, index_path: Path) -> int:
+    # Reads every record once and writes where it is to a SQLite file. The
+    # checksums are not verified, lookups read the blocks again anyway.
+    if index_path.exists():
+        index_path.unlink()
+    connection = sqlite3.connect(index_path)
+    try:
+        connection.executescript(SCHEMA)
+        connection.executemany(
+            "INSERT INTO info (name, value) VALUES (?, ?)",
+            [("version", str(INDEX_VERSION)), ("leveldb", str(leveldb.resolve()))],
+        )
+        count = 0
+        for file_id, path in enumerate(data_files(leveldb)):
+            stat = path.stat()
+            connection.execute(
+                "INSERT INTO files VALUES (?, ?, ?, ?)",
+                (file_id, path.name, stat.st_size, stat.st_mtime_ns),
+            )
+            rows = []
+            with map_file(path) as data:
+                try:
+                    for offset, size, _, value_type, key, value in iter_file_records(
+                        data, is_table_file(path), verify=False
+                    ):
+                        row = index_row(key, value)
+                        if row is None:
+                            continue
+                        raw_key = None if row[1] == 0 else _raw_idb_key(key)
+                        rows.append((*row, raw_key, file_id, offset, size))
+                        if row[1] == 0 and value_type == TYPE_VALUE and value:
+                            with suppress(ValueError):
+                                connection.execute(
+                                    "INSERT OR REPLACE INTO stores VALUES (?, ?, ?)",
+                                    decode_object_store_name(key, value),
+                                )
+                        if len(rows) >= BATCH_SIZE:
+                            count += len(rows)
+                            connection.executemany(
+                                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                rows,
+                            )
+                            rows = []
+                except CorruptionError:
+                    # Damaged files are indexed up to the damage
+                    pass
+            count += len(rows)
+            connection.executemany(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+        connection.executescript(INDEXES)
+        connection.commit()
+    finally:
+        connection.close()
+    return count
+
+
+def _check_index(connection: sqlite3.Connection, leveldb: Path) -> dict[int, Path]:
+    version = connection.execute(
+        "SELECT value FROM info WHERE name = 'version'"
+    ).fetchone()
+    if version is None or int(version[0]) != INDEX_VERSION:
+        raise ValueError("Index was built by another version, rebuild it.")
+    files = {}
+    for file_id, name, size, mtime_ns in connection.execute(
+        "SELECT file_id, name, size, mtime_ns FROM files"
+    ):
+        path = leveldb / name
+        try:
+            stat = path.stat()
+        except OSError:
+            stat = None
+        if stat is None or stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+            raise ValueError(f"Index is out of date, {name} has changed.")
+        files[file_id] = path
+    if {p.name for p in files.values()} != {p.name for p in data_files(leveldb)}:
+        raise ValueError("Index is out of date, files were added or removed.")
+    return files
+
+
+def _escape_like(prefix: str) -> str:
+    return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _create_lookup_tables(
+    connection: sqlite3.Connection,
+    keys: Iterable[str],
+    prefixes: Iterable[str],
+    stores: Optional[Iterable[str]],
+) -> None:
+    # The keys, prefixes and stores of a lookup go to temporary tables, so
+    # that any number of them can be matched without bound variables
+    connection.executescript(
+        """
+        CREATE TEMP TABLE lookup_keys (key TEXT PRIMARY KEY);
+        CREATE TEMP TABLE lookup_patterns (pattern TEXT PRIMARY KEY);
+        CREATE TEMP TABLE lookup_stores (name TEXT PRIMARY KEY);
+        """
+    )
+    connection.executemany(
+        "INSERT OR IGNORE INTO lookup_keys VALUES (?)", ((k,) for k in keys)
+    )
+    connection.executemany(
+        "INSERT OR IGNORE INTO lookup_patterns VALUES (?)",
+        ((_escape_like(p) + "%",) for p in prefixes),
+    )
+    if stores is not None:
+        connection.executemany(
+            "INSERT OR IGNORE INTO lookup_stores VALUES (?)", ((s,) for s in stores)
+        )
+
+
+def _matching_locations(
+    connection: sqlite3.Connection, keys: bool, prefixes: bool, stores: bool
+) -> dict[int, set[tuple[int, int]]]:
+    # The arguments tell which of the lookup tables are used
+    conditions = []
+    if keys:
+        conditions.append("key IN (SELECT key FROM lookup_keys)")
+    if prefixes:
+        conditions.append(
+            "EXISTS (SELECT 1 FROM lookup_patterns"
+            " WHERE entries.key LIKE pattern ESCAPE '\\')"
+        )
+    query = "SELECT file_id, offset, size FROM entries WHERE object_store_id != 0"
+    if conditions:
+        query += f" AND ({' OR '.join(conditions)})"
+    if stores:
+        query += (
+            " AND (database_id, object_store_id) IN (SELECT database_id,"
+            " object_store_id FROM stores WHERE name IN (SELECT name FROM"
+            " lookup_stores))"
+        )
+    query += (
+        " UNION SELECT file_id, offset, size FROM entries WHERE object_store_id = 0"
+    )
+
+    locations: dict[int, set[tuple[int, int]]] = defaultdict(set)
+    for file_id, offset, size in connection.execute(query):
+        locations[file_id].add((offset, size))
+    return locations
+
+
+def _wanted(
+    key: bytes,
+    keys: set[str],
+    prefixes: tuple[str, ...],
+    store_ids: Optional[set[tuple[int, int]]],
+) -> bool:
+    row = index_row(key, None)
+    if row is None:
+        return False
+    database_id, object_store_id, _, text = row
+    if object_store_id == 0:
+        return True
+    if store_ids is not None and (database_id, object_store_id) not in store_ids:
+        return False
+    if not keys and not prefixes:
+        return True
+    assert text is not None
+    return text in keys or text.startswith(prefixes)
+
+
+def _read_records(
+    path: Path, locations: Iterable[tuple[int, int]], wanted: Any
+) -> Iterator[tuple[int, int, bytes, Optional[bytes]]]:
+    value: Optional[bytes]
+    with map_file(path) as data:
+        for offset, size in sorted(locations):
+            if is_table_file(path):
+                block = read_block(data, BlockHandle(offset, size))
+                for internal_key, value in iter_block_entries(block):
+                    key, sequence, value_type = split_internal_key(internal_key)
+                    if wanted(key):
+                        yield sequence, value_type, key, value
+            else:
+                for item in iter_log(data, offset):
+                    if isinstance(item, LogRecord):
+                        for sequence, value_type, key, value in iter_batch(
+                            item.payload
+                        ):
+                            if wanted(key):
+                                yield sequence, value_type, key, value
+                    break
+
+
+class SubsetDatabase:
+    # Scratch LevelDB with a selection of the records of another one. The
+    # records of every original file go to a log file with the same file
+    # number, so that origin_file can be mapped back.
+    def __init__(self, leveldb: Path) -> None:
+        self.original = leveldb
+        self._tempdir = tempfile.TemporaryDirectory(prefix="forensicsim_subset_")
+        self.path = Path(self._tempdir.name) / leveldb.name
+        self.path.mkdir()
+        for control_file in leveldb.iterdir():
+            if CONTROL_FILE_PATTERN.match(control_file.name):
+                shutil.copy2(control_file, self.path / control_file.name)
+        self._origins: dict[str, Path] = {}
+        self._files = ExitStack()
+        self._writers: dict[Path, LogWriter] = {}
+
+    def add(
+        self,
+        source: Path,
+        sequence: int,
+        value_type: int,
+        key: bytes,
+        value: Optional[bytes],
+    ) -> None:
+        if source not in self._writers:
+            target = self.path / (source.name.split(".")[0] + ".log")
+            self._writers[source] = LogWriter(
+                self._files.enter_context(target.open("wb"))
+            )
+            self._origins[target.name] = source
+        self._writers[source].add(encode_batch(sequence, [(value_type, key, value)]))
+
+    def finish(self) -> None:
+        self._files.close()
+        self._writers.clear()
+
+    def records(
+        self, blobpath: Optional[Path] = None, *args: Any, **kwargs: Any
+    ) -> Iterator[dict[str, Any]]:
+        # Arguments after blobpath are passed on to iter_db
+        self.finish()
+        for record in iter_db(self.path, blobpath, *args, **kwargs):
+            origin = Path(str(record["origin_file"])).name
+            record["origin_file"] = self._origins.get(origin, record["origin_file"])
+            yield record
+
+    def close(self) -> None:
+        self.finish()
+        self._tempdir.cleanup()
+
+    def __enter__(self) -> "SubsetDatabase":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+def filtered_copy(leveldb: Path, keep: Callable[[str, Any], bool]) -> SubsetDatabase:
+    # Copies the records for which keep(object store name, IndexedDB key) is
+    # true, without decoding any value. The object store names are read from
+    # the metadata first. Checksums are not verified, the copy is parsed
+    # again anyway.
+    names = _store_names(leveldb)
+    subset = SubsetDatabase(leveldb)
+    try:
+        for path in data_files(leveldb):
+            with map_file(path) as data:
+                try:
+                    for _, _, sequence, value_type, key, value in iter_file_records(
+                        data, is_table_file(path), verify=False
+                    ):
+                        try:
+                            prefix = decode_key_prefix(key)
+                        except CorruptionError:
+                            continue
+                        if prefix.is_metadata:
+                            subset.add(path, sequence, value_type, key, value)
+                            continue
+                        name = names.get(
+                            (prefix.database_id, prefix.object_store_id), ""
+                        )
+                        if _keep(key, prefix, name, keep):
+                            subset.add(path, sequence, value_type, key, value)
+                except CorruptionError:
+                    continue
+    except BaseException:
+        subset.close()
+        raise
+    subset.finish()
+    return subset
+
+
+def _store_names(leveldb: Path) -> dict[tuple[int, int], str]:
+    names: dict[tuple[int, int], str] = {}
+    for path in data_files(leveldb):
+        with map_file(path) as data:
+            try:
+                for value_type, key, value in iter_metadata_records(
+                    data, is_table_file(path)
+                ):
+                    if value_type == TYPE_VALUE and value:
+                        with suppress(ValueError):
+                            database_id, store_id, name = decode_object_store_name(
+                                key, value
+                            )
+                            names[database_id, store_id] = name
+            except CorruptionError:
+                continue
+    return names
+
+
+def _keep(
+    key: bytes,
+    prefix: KeyPrefix,
+    store_name: str,
+    keep: Callable[[str, Any], bool],
+) -> bool:
+    if prefix.index_id not in (OBJECT_STORE_DATA_INDEX_ID, BLOB_ENTRY_INDEX_ID):
+        return False
+    try:
+        idb_key, _ = decode_idb_key(key, prefix.size)
+    except CorruptionError:
+        return False
+    return keep(store_name, idb_key)
+
+
+def indexed_copy(
+    leveldb: Path, index_path: Path, keep: Callable[[str, Any], bool]
+) -> SubsetDatabase:
+    # Same as filtered_copy, but keep is applied to the keys in the index
+    # first. Only the blocks that hold metadata or a kept record are read.
+    connection = sqlite3.connect(index_path)
+    try:
+        files = _check_index(connection, leveldb)
+        names: dict[tuple[int, int], str] = {
+            (database_id, store_id): name
+            for database_id, store_id, name in connection.execute(
+                "SELECT database_id, object_store_id, name FROM stores"
+            )
+        }
+        locations: dict[int, set[tuple[int, int]]] = defaultdict(set)
+        for file_id, offset, size, database_id, store_id, raw_key in connection.execute(
+            "SELECT file_id, offset, size, database_id, object_store_id, raw_key"
+            " FROM entries ORDER BY file_id, offset"
+        ):
+            blocks = locations[file_id]
+            if (offset, size) in blocks:
+                continue
+            if raw_key is None:
+                blocks.add((offset, size))
+                continue
+            try:
+                idb_key, _ = decode_idb_key(raw_key)
+            except CorruptionError:
+                continue
+            if keep(names.get((database_id, store_id), ""), idb_key):
+                blocks.add((offset, size))
+    finally:
+        connection.close()
+
+    def wanted(key: bytes) -> bool:
+        try:
+            prefix = decode_key_prefix(key)
+        except CorruptionError:
+            return False
+        if prefix.is_metadata:
+            return True
+        name = names.get((prefix.database_id, prefix.object_store_id), "")
+        return _keep(key, prefix, name, keep)
+
+    subset = SubsetDatabase(leveldb)
+    try:
+        for file_id, blocks in locations.items():
+            path = files[file_id]
+            for record in _read_records(path, blocks, wanted):
+                subset.add(path, *record)
+    except BaseException:
+        subset.close()
+        raise
+    subset.finish()
+    return subset
+
+
+def lookup(
+    leveldb: Path,
+    index_path: Path,
+    keys: Iterable[str] = (),
+    prefixes: Iterable[str] = (),
+    stores: Optional[Iterable[str]] = None,
+    blobpath: Optional[Path] = None,
+) -> Iterator[dict[str, Any]]:
+    # Copies the matching records and the metadata of the databases into a
+    # small LevelDB of their own, which is then read by ccl as usual
+    keys, prefixes = set(keys), tuple(prefixes)
+    connection = sqlite3.connect(index_path)
+    try:
+        files = _check_index(connection, leveldb)
+        _create_lookup_tables(connection, keys, prefixes, stores)
+        store_ids = None
+        if stores is not None:
+            store_ids = set(
+                connection.execute(
+                    "SELECT database_id, object_store_id FROM stores"
+                    " WHERE name IN (SELECT name FROM lookup_stores)"
+                ).fetchall()
+            )
+        locations = _matching_locations(
+            connection, bool(keys), bool(prefixes), stores is not None
+        )
+    finally:
+        connection.close()
+
+    def wanted(key: bytes) -> bool:
+        return _wanted(key, keys, prefixes, store_ids)
+
+    with SubsetDatabase(leveldb) as subset:
+        for file_id, file_locations in locations.items():
+            path = files[file_id]
+            for record in _read_records(path, file_locations, wanted):
+                subset.add(path, *record)
+        yield from subset.records(blobpath)
@@ -0,0 +1,318 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import contextlib
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection
+from multiprocessing.connection import wait as wait_for
+from pathlib import Path
+from typing import Any, Optional
+
+from forensicsim.backend import (
+    iter_localstorage,
+    iter_sessionstorage,
+    open_output,
+    write_results_to_json,
+)
+from forensicsim.parser import process_db
+from forensicsim.progress import database_size, open_progress, read_last_event
+
+
+@dataclass()
+class Job:
+    # kind is one of forensicsim.profile.STORE_KINDS
+    kind: str
+    input: Path
+    output: Path
+    blob: Optional[Path] = None
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "kind": self.kind,
+                "input": str(self.input),
+                "output": str(self.output),
+                "blob": str(self.blob) if self.blob is not None else None,
+            },
+            ensure_ascii=False,
+        )
+
+    @classmethod
+    def from_json(cls, line: str) -> "Job":
+        entry = json.loads(line)
+        return cls(
+            entry.get("kind", "indexeddb"),
+            Path(entry["input"]),
+            Path(entry["output"]),
+            Path(entry["blob"]) if entry.get("blob") else None,
+        )
+
+
+def read_jobs(jobfile: Path) -> Iterator[Job]:
+    # One job per line, either as JSON or as a tab separated input/output pair
+    with open(jobfile, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                yield Job.from_json(line)
+            else:
+                input_path, output_path = line.split("\t")
+                yield Job("indexeddb", Path(input_path), Path(output_path))
+
+
+def write_jobs(jobs: Iterable[Job], jobfile: Path) -> int:
+    count = 0
+    with open_output(jobfile) as f:
+        for job in jobs:
+            f.write(job.to_json() + "\n")
+            count += 1
+    return count
+
+
+@dataclass()
+class JobResult:
+    job: Job
+    # One of "done", "failed" or "timeout"
+    status: str
+    records: int = 0
+    input_bytes: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "input": str(self.job.input),
+                "output": str(self.job.output),
+                "status": self.status,
+                "records": self.records,
+                "input_bytes": self.input_bytes,
+                "seconds": round(self.seconds, 3),
+                "error": self.error,
+            },
+            ensure_ascii=False,
+        )
+
+
+@dataclass()
+class BatchSummary:
+    results: list[JobResult] = field(default_factory=list)
+    skipped: int = 0
+    seconds: float = 0.0
+
+    def count(self, status: str) -> int:
+        return sum(1 for r in self.results if r.status == status)
+
+    @property
+    def records(self) -> int:
+        return sum(r.records for r in self.results)
+
+    @property
+    def input_bytes(self) -> int:
+        return sum(r.input_bytes for r in self.results if r.status == "done")
+
+
+def _input_size(job: Job) -> int:
+    size = 0
+    for folder in (job.input, job.blob):
+        if folder is None:
+            continue
+        for root, _, files in os.walk(folder):
+            for name in files:
+                try:
+                    size += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    continue
+    return size
+
+
+def run_job(
+    job: Job, progresspath: Optional[Path] = None, dedup_index: Optional[Path] = None
+) -> int:
+    with open_progress(progresspath) as progress:
+        if job.kind == "indexeddb":
+            return process_db(
+                job.input,
+                job.output,
+                job.blob,
+                progress=progress,
+                dedup_index=dedup_index,
+            )
+        if job.kind not in ("local_storage", "session_storage"):
+            raise ValueError(f"Unknown job kind: {job.kind}")
+
+        job.output.parent.mkdir(parents=True, exist_ok=True)
+        if job.kind == "local_storage":
+            records = iter_localstorage(job.input)
+        else:
+            records = iter_sessionstorage(job.input)
+        if progress:
+            progress.total_bytes = database_size(job.input)
+            progress.set_stage("read", job.kind)
+            records = progress.track(records, job.kind)
+        count = write_results_to_json(records, job.output)
+        if progress:
+            progress.finish()
+        return count
+
+
+def _job_worker(
+    job: Job,
+    connection: Connection,
+    progresspath: Optional[Path] = None,
+    dedup_index: Optional[Path] = None,
+) -> None:
+    try:
+        connection.send(("done", run_job(job, progresspath, dedup_index), None))
+    except Exception as e:
+        connection.send(("failed", 0, f"{type(e).__name__}: {e}"))
+    finally:
+        connection.close()
+
+
+def _journal_key(job: Job) -> tuple[str, str]:
+    return str(job.input), str(job.output)
+
+
+def read_journal(journal: Path) -> set[tuple[str, str]]:
+    # Jobs that have completed successfully in an earlier run
+    completed: set[tuple[str, str]] = set()
+    if not journal.exists():
+        return completed
+    with open(journal, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line may be cut off if the batch was killed
+                continue
+            if entry.get("status") == "done":
+                completed.add((entry["input"], entry["output"]))
+    return completed
+
+
+def run_batch(
+    jobs: Iterable[Job],
+    journal: Path,
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    on_result: Optional[Callable[[JobResult], Any]] = None,
+    on_progress: Optional[Callable[[Job, dict[str, Any]], Any]] = None,
+    dedup_index: Optional[Path] = None,
+) -> BatchSummary:
+    # Every job runs in a process of its own. A job that crashes or hangs can
+    # neither take down the batch nor leak memory into the next job.
+    # With on_progress set, the jobs report to progress files that are
+    # polled once a second. With dedup_index set, the IndexedDB jobs share a
+    # case-wide index and leave out records found by an earlier job.
+    workers = workers or os.cpu_count() or 1
+    completed = read_journal(journal)
+    summary = BatchSummary()
+    pending = []
+    for job in jobs:
+        if _journal_key(job) in completed:
+            summary.skipped += 1
+        else:
+            pending.append(job)
+    pending.reverse()
+
+    context = multiprocessing.get_context("spawn")
+    running: dict[Any, tuple[Job, Any, Connection, float, int, Optional[Path]]] = {}
+    start_time = time.monotonic()
+
+    with (
+        open(journal, "a", encoding="utf-8") as journal_file,
+        tempfile.TemporaryDirectory(prefix="forensicsim_progress_") as progress_dir,
+    ):
+
+        def finish(result: JobResult) -> None:
+            summary.results.append(result)
+            journal_file.write(result.to_json() + "\n")
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+            if on_result is not None:
+                on_result(result)
+
+        job_number = 0
+        while pending or running:
+            while pending and len(running) < workers:
+                job = pending.pop()
+                job_number += 1
+                progresspath = None
+                if on_progress is not None:
+                    progresspath = Path(progress_dir) / f"{job_number}.jsonl"
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(
+                    target=_job_worker,
+                    args=(job, sender, progresspath, dedup_index),
+                )
+                process.start()
+                sender.close()
+                running[process.sentinel] = (
+                    job,
+                    process,
+                    receiver,
+                    time.monotonic(),
+                    _input_size(job),
+                    progresspath,
+                )
+
+            ready = wait_for(list(running), timeout=1.0)
+            now = time.monotonic()
+            for sentinel in list(running):
+                job, process, receiver, started, input_bytes, progresspath = running[
+                    sentinel
+                ]
+                if sentinel in ready:
+                    status, records, error = "failed", 0, "Worker process died."
+                    if receiver.poll():
+                        with contextlib.suppress(EOFError):
+                            status, records, error = receiver.recv()
+                    process.join()
+                elif timeout is not None and now - started > timeout:
+                    process.terminate()
+                    process.join()
+                    status, records, error = "timeout", 0, f"Exceeded {timeout}s."
+                else:
+                    if on_progress is not None and progresspath is not None:
+                        event = read_last_event(progresspath)
+                        if event is not None:
+                            on_progress(job, event)
+                    continue
+                receiver.close()
+                del running[sentinel]
+                finish(
+                    JobResult(job, status, records, input_bytes, now - started, error)
+                )
+
+    summary.seconds = time.monotonic() - start_time
+    return summary
@@ -0,0 +1,244 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+from collections.abc import Iterable, Iterator
+from contextlib import ExitStack
+from dataclasses import dataclass
+from pathlib import Path
+from types import TracebackType
+from typing import Any, BinaryIO, Optional, TextIO
+
+from forensicsim.backend import open_output
+from forensicsim.compression import (
+    SUFFIXES,
+    binary_writer,
+    codec_for,
+    compressed_path,
+    open_text,
+    read_binary,
+    read_text,
+)
+
+# The sidecar index is a tab separated text file next to the output, so that
+# it can be read without this package, e.g. by the Autopsy module. The index
+# of a compressed output is compressed too, as out.jsonl.idx.gz for
+# out.jsonl.gz, and its offsets refer to the decompressed records.
+INDEX_SUFFIX = ".idx"
+INDEX_HEADER = "offset\tlength\trecord_type\torigin_file\n"
+
+
+@dataclass()
+class IndexEntry:
+    # Byte range of a record in the (decompressed) JSON Lines file, without
+    # the newline
+    offset: int
+    length: int
+    record_type: Optional[str]
+    origin_file: Optional[str]
+
+
+def index_path_for(path: Path) -> Path:
+    codec = codec_for(path)
+    if codec is None:
+        return path.with_name(path.name + INDEX_SUFFIX)
+    name = path.name[: -len(SUFFIXES[codec])] + INDEX_SUFFIX
+    return compressed_path(path.with_name(name), codec)
+
+
+def _open_index(path: Path) -> TextIO:
+    codec = codec_for(path)
+    index_path = index_path_for(path)
+    if codec is None:
+        return index_path.open("w", encoding="utf-8", newline="\n")
+    return open_text(index_path, codec)
+
+
+def dumps_record(record: Any) -> str:
+    line = json.dumps(record, default=str, ensure_ascii=False)
+    try:
+        line.encode("utf-8")
+    except UnicodeEncodeError:
+        # Lone surrogates from V8 strings are kept as escapes
+        line = json.dumps(record, default=str)
+    return line
+
+
+def _field(value: Any) -> str:
+    if value is None:
+        return ""
+    return str(value).replace("\t", " ").replace("\n", " ").replace("\r", " ")
+
+
+def _index_line(entry: IndexEntry) -> str:
+    return (
+        f"{entry.offset}\t{entry.length}\t{_field(entry.record_type)}"
+        f"\t{_field(entry.origin_file)}\n"
+    )
+
+
+def _entry(offset: int, length: int, record: Any) -> IndexEntry:
+    if not isinstance(record, dict):
+        return IndexEntry(offset, length, None, None)
+    return IndexEntry(
+        offset, length, record.get("record_type"), record.get("origin_file")
+    )
+
+
+def write_results_to_jsonl(
+    data: Iterable[Any],
+    outputpath: Path,
+    compress: Optional[str] = None,
+    threads: int = 0,
+) -> int:
+    # One compact record per line, and the byte range, record type and
+    # origin file of every record in the sidecar index. compress and threads
+    # are passed on to forensicsim.compression.BlockWriter.
+    count = 0
+    if str(outputpath) == "-":
+        # No index for a stream
+        with open_output(outputpath, compress, threads) as f:
+            for record in data:
+                f.write(dumps_record(record) + "\n")
+                count += 1
+        return count
+    # The index is named after the compressed output
+    outputpath = compressed_path(outputpath, compress)
+    with ExitStack() as stack:
+        out: BinaryIO = stack.enter_context(outputpath.open("wb"))
+        if compress is not None:
+            out = stack.enter_context(binary_writer(out, compress, threads))
+        index = stack.enter_context(_open_index(outputpath))
+        index.write(INDEX_HEADER)
+        offset = 0
+        for record in data:
+            line = dumps_record(record).encode("utf-8")
+            out.write(line + b"\n")
+            index.write(_index_line(_entry(offset, len(line), record)))
+            offset += len(line) + 1
+            count += 1
+    return count
+
+
+def build_jsonl_index(path: Path) -> int:
+    # Writes the sidecar index for a JSON Lines file that has none
+    count = 0
+    with read_binary(path) as f, _open_index(path) as index:
+        index.write(INDEX_HEADER)
+        offset = 0
+        for line in f:
+            data = line.rstrip(b"\r\n")
+            if data.strip():
+                entry = _entry(offset, len(data), json.loads(data))
+                index.write(_index_line(entry))
+                count += 1
+            offset += len(line)
+    return count
+
+
+def read_jsonl_index(path: Path) -> list[IndexEntry]:
+    index_path = index_path_for(path)
+    if not index_path.exists():
+        build_jsonl_index(path)
+    entries = []
+    with read_text(index_path) as f:
+        if f.readline() != INDEX_HEADER:
+            raise ValueError(f"Not a JSON Lines index: {index_path}")
+        for line in f:
+            offset, length, record_type, origin_file = line.rstrip("\n").split("\t")
+            entries.append(
+                IndexEntry(
+                    int(offset), int(length), record_type or None, origin_file or None
+                )
+            )
+    if codec_for(path) is not None:
+        # The decompressed size is not known without reading the records
+        return entries
+    size = path.stat().st_size
+    if entries and entries[-1].offset + entries[-1].length + 1 != size:
+        raise ValueError(f"Index is out of date, {path.name} has changed.")
+    return entries
+
+
+def read_records(path: Path, entries: Iterable[IndexEntry]) -> Iterator[Any]:
+    # Reads only the given records, e.g. a share of the entries per worker. A
+    # compressed output is decompressed again from the start for a record
+    # before the current one, so the entries are best given in index order.
+    with read_binary(path) as f:
+        for entry in entries:
+            f.seek(entry.offset)
+            yield json.loads(f.read(entry.length))
+
+
+class JsonlReader:
+    # Random access to the records of a JSON Lines output via its index
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.entries = read_jsonl_index(path)
+        self._file = read_binary(path)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, number: int) -> Any:
+        entry = self.entries[number]
+        self._file.seek(entry.offset)
+        return json.loads(self._file.read(entry.length))
+
+    def select(
+        self,
+        record_types: Optional[Iterable[str]] = None,
+        origin_files: Optional[Iterable[str]] = None,
+    ) -> list[IndexEntry]:
+        record_types = set(record_types) if record_types is not None else None
+        origin_files = set(origin_files) if origin_files is not None else None
+        return [
+            e
+            for e in self.entries
+            if (record_types is None or e.record_type in record_types)
+            and (origin_files is None or e.origin_file in origin_files)
+        ]
+
+    def records(
+        self,
+        record_types: Optional[Iterable[str]] = None,
+        origin_files: Optional[Iterable[str]] = None,
+    ) -> Iterator[Any]:
+        for entry in self.select(record_types, origin_files):
+            self._file.seek(entry.offset)
+            yield json.loads(self._file.read(entry.length))
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "JsonlReader":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
@@ -0,0 +1,512 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Minimal reader and writer for the on-disk formats of LevelDB, see
+# https://github.com/google/leveldb/blob/main/doc/table_format.md and
+# https://github.com/google/leveldb/blob/main/doc/log_format.md
+# ccl_chromium_reader does the actual parsing. This module only validates
+# tables and logs block by block, so damaged parts can be cut out first.
+
+import mmap
+import os
+import struct
+from collections.abc import Generator, Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+try:
+    # C implementation, required by --resilient. The table based fallback
+    # keeps the other readers working when the package is missing.
+    from crc32c import crc32c as _crc32c_update
+except ImportError:  # pragma: no cover
+    _crc32c_update = None
+# False if checksums are computed by the much slower pure Python fallback
+FAST_CRC32C = _crc32c_update is not None
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+TABLE_MAGIC = 0xDB4775248B80FB57
+FOOTER_SIZE = 48
+BLOCK_TRAILER_SIZE = 5
+
+NO_COMPRESSION = 0
+SNAPPY_COMPRESSION = 1
+
+LOG_BLOCK_SIZE = 32768
+LOG_HEADER_SIZE = 7
+LOG_FULL, LOG_FIRST, LOG_MIDDLE, LOG_LAST = 1, 2, 3, 4
+
+TYPE_DELETION = 0
+TYPE_VALUE = 1
+
+CRC_MASK_DELTA = 0xA282EAD8
+
+# Tags of the fields of a version edit in the MANIFEST file
+EDIT_COMPARATOR = 1
+EDIT_COMPACT_POINTER = 5
+EDIT_DELETED_FILE = 6
+EDIT_NEW_FILE = 7
+# Log number, next file number, last sequence and previous log number
+EDIT_NUMBERS = (2, 3, 4, 9)
+
+
+class CorruptionError(ValueError):
+    pass
+
+
+@contextmanager
+def map_file(path: Path) -> Generator[Buffer, None, None]:
+    # Files are memory mapped, so that only the blocks that are read get paged in
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+def _make_crc32c_tables() -> list[list[int]]:
+    # Slicing-by-8: tables[k][n] is the CRC of byte n followed by k zero bytes
+    table = []
+    for n in range(256):
+        crc = n
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    tables = [table]
+    for _ in range(7):
+        tables.append([(crc >> 8) ^ table[crc & 0xFF] for crc in tables[-1]])
+    return tables
+
+
+_CRC32C_TABLES = _make_crc32c_tables()
+
+
+def crc32c(data: Buffer, crc: int = 0) -> int:
+    if _crc32c_update is not None:
+        return _crc32c_update(bytes(data), crc)
+    t0, t1, t2, t3, t4, t5, t6, t7 = _CRC32C_TABLES
+    data = bytes(data)
+    aligned = len(data) - len(data) % 8
+    crc ^= 0xFFFFFFFF
+    for low, high in struct.iter_unpack("<II", data[:aligned]):
+        low ^= crc
+        crc = (
+            t7[low & 0xFF]
+            ^ t6[(low >> 8) & 0xFF]
+            ^ t5[(low >> 16) & 0xFF]
+            ^ t4[low >> 24]
+            ^ t3[high & 0xFF]
+            ^ t2[(high >> 8) & 0xFF]
+            ^ t1[(high >> 16) & 0xFF]
+            ^ t0[high >> 24]
+        )
+    for byte in data[aligned:]:
+        crc = t0[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
+
+def mask_crc(crc: int) -> int:
+    return (((crc >> 15) | (crc << 17)) + CRC_MASK_DELTA) & 0xFFFFFFFF
+
+
+def unmask_crc(masked: int) -> int:
+    rot = (masked - CRC_MASK_DELTA) & 0xFFFFFFFF
+    return ((rot >> 17) | (rot << 15)) & 0xFFFFFFFF
+
+
+def read_varint(data: Buffer, pos: int) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        if pos >= len(data) or shift > 63:
+            raise CorruptionError("Truncated varint")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def snappy_decompress(data: Buffer) -> bytes:
+    length, pos = read_varint(data, 0)
+    out = bytearray()
+    end = len(data)
+    while pos < end:
+        tag = data[pos]
+        pos += 1
+        kind = tag & 3
+        if kind == 0:
+            size = tag >> 2
+            if size >= 60:
+                extra = size - 59
+                size = int.from_bytes(data[pos : pos + extra], "little")
+                pos += extra
+            size += 1
+            if pos + size > end:
+                raise CorruptionError("Snappy literal exceeds input")
+            out += data[pos : pos + size]
+            pos += size
+            continue
+        if kind == 1:
+            size = ((tag >> 2) & 7) + 4
+            offset = ((tag >> 5) << 8) | data[pos]
+            pos += 1
+        elif kind == 2:
+            size = (tag >> 2) + 1
+            offset = int.from_bytes(data[pos : pos + 2], "little")
+            pos += 2
+        else:
+            size = (tag >> 2) + 1
+            offset = int.from_bytes(data[pos : pos + 4], "little")
+            pos += 4
+        if offset == 0 or offset > len(out) or pos > end:
+            raise CorruptionError("Snappy copy outside of output")
+        start = len(out) - offset
+        if offset >= size:
+            out += out[start : start + size]
+        else:
+            # Overlapping copy, i.e. a run of a repeating pattern
+            for i in range(size):
+                out.append(out[start + i])
+    if len(out) != length:
+        raise CorruptionError("Snappy output has the wrong length")
+    return bytes(out)
+
+
+@dataclass(frozen=True)
+class BlockHandle:
+    offset: int
+    size: int
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.size + BLOCK_TRAILER_SIZE
+
+
+def read_block_handle(data: Buffer, pos: int) -> tuple[BlockHandle, int]:
+    offset, pos = read_varint(data, pos)
+    size, pos = read_varint(data, pos)
+    return BlockHandle(offset, size), pos
+
+
+def read_block(
+    data: Buffer, handle: BlockHandle, verify: bool = True, decompress: bool = True
+) -> bytes:
+    # Returns the uncompressed contents of a block, checked against its CRC
+    if handle.end > len(data):
+        raise CorruptionError("Block exceeds file")
+    contents = data[handle.offset : handle.offset + handle.size]
+    compression = data[handle.offset + handle.size]
+    if verify:
+        (masked,) = struct.unpack_from("<I", data, handle.offset + handle.size + 1)
+        crc = crc32c(bytes([compression]), crc32c(contents))
+        if unmask_crc(masked) != crc:
+            raise CorruptionError("Block checksum mismatch")
+    if compression == NO_COMPRESSION or not decompress:
+        return bytes(contents)
+    if compression == SNAPPY_COMPRESSION:
+        return snappy_decompress(contents)
+    raise CorruptionError(f"Unknown block compression {compression}")
+
+
+def iter_block_entries(block: bytes) -> Iterator[tuple[bytes, bytes]]:
+    # Keys are prefix compressed against the previous key
+    if len(block) < 4:
+        raise CorruptionError("Block too short")
+    (restarts,) = struct.unpack_from("<I", block, len(block) - 4)
+    limit = len(block) - 4 - 4 * restarts
+    if restarts == 0 or limit < 0:
+        raise CorruptionError("Bad restart array")
+    pos = 0
+    key = b""
+    while pos < limit:
+        shared, pos = read_varint(block, pos)
+        non_shared, pos = read_varint(block, pos)
+        value_size, pos = read_varint(block, pos)
+        if shared > len(key) or pos + non_shared + value_size > limit:
+            raise CorruptionError("Bad block entry")
+        key = key[:shared] + block[pos : pos + non_shared]
+        pos += non_shared
+        yield key, block[pos : pos + value_size]
+        pos += value_size
+
+
+def read_footer(data: Buffer) -> tuple[BlockHandle, BlockHandle]:
+    if len(data) < FOOTER_SIZE:
+        raise CorruptionError("File too short for a table")
+    footer = data[len(data) - FOOTER_SIZE :]
+    (magic,) = struct.unpack_from("<Q", footer, FOOTER_SIZE - 8)
+    if magic != TABLE_MAGIC:
+        raise CorruptionError("Bad table magic")
+    metaindex, pos = read_block_handle(footer, 0)
+    index, _ = read_block_handle(footer, pos)
+    return metaindex, index
+
+
+@dataclass()
+class TableBlock:
+    handle: BlockHandle
+    contents: Optional[bytes] = None
+    error: Optional[str] = None
+
+
+def iter_table_index(
+    data: Buffer, verify: bool = True
+) -> Iterator[tuple[bytes, BlockHandle]]:
+    # (separator, handle) of every data block in file order. The separator is
+    # an internal key at least the last key of its block and less than the
+    # first key of the next one.
+    _, index_handle = read_footer(data)
+    index = read_block(data, index_handle, verify)
+    for separator, value in iter_block_entries(index):
+        handle, _ = read_block_handle(value, 0)
+        yield separator, handle
+
+
+def iter_table_blocks(
+    data: Buffer, verify: bool = True, decompress: bool = True
+) -> Iterator[TableBlock]:
+    # Data blocks of a table in file order. The footer and the index block
+    # have to be intact, as they are the only record of where blocks start.
+    # Without decompress, only the checksums are verified.
+    for _, handle in iter_table_index(data, verify):
+        try:
+            yield TableBlock(handle, read_block(data, handle, verify, decompress))
+        except CorruptionError as e:
+            yield TableBlock(handle, error=str(e))
+
+
+def split_internal_key(internal_key: bytes) -> tuple[bytes, int, int]:
+    # user key, sequence number, value type
+    if len(internal_key) < 8:
+        raise CorruptionError("Internal key too short")
+    (tag,) = struct.unpack_from("<Q", internal_key, len(internal_key) - 8)
+    return internal_key[:-8], tag >> 8, tag & 0xFF
+
+
+@dataclass()
+class LogRecord:
+    offset: int
+    # A write batch, see encode_batch
+    payload: bytes
+    # Offset after the last physical record, where reading can resume
+    end: int
+
+
+@dataclass()
+class LogGap:
+    start: int
+    end: int
+    reason: str
+
+
+def iter_log(data: Buffer, start: int = 0) -> Iterator[Union[LogRecord, LogGap]]:
+    # Physical records never cross a block boundary, so after a bad record the
+    # reader resumes at the start of the next 32 KiB block. start has to be
+    # the offset of a physical record.
+    pos = start
+    end = len(data)
+    fragments: list[bytes] = []
+    fragments_start = 0
+
+    def drop_fragments(reason: str) -> Iterator[LogGap]:
+        if fragments:
+            yield LogGap(fragments_start, pos, reason)
+            fragments.clear()
+
+    while pos < end:
+        block_end = min((pos // LOG_BLOCK_SIZE + 1) * LOG_BLOCK_SIZE, end)
+        if block_end - pos < LOG_HEADER_SIZE:
+            pos = block_end
+            continue
+        crc, length, record_type = struct.unpack_from("<IHB", data, pos)
+        if record_type == 0 and length == 0:
+            # Preallocated, zero filled space
+            pos = block_end
+            continue
+        record_end = pos + LOG_HEADER_SIZE + length
+        payload = data[pos + LOG_HEADER_SIZE : record_end]
+        if (
+            record_end > block_end
+            or record_type not in (LOG_FULL, LOG_FIRST, LOG_MIDDLE, LOG_LAST)
+            or unmask_crc(crc) != crc32c(payload, crc32c(bytes([record_type])))
+        ):
+            yield from drop_fragments("Incomplete record before damaged block")
+            yield LogGap(pos, block_end, "Bad log record")
+            pos = block_end
+            continue
+
+        if record_type == LOG_FULL:
+            yield from drop_fragments("Incomplete record")
+            yield LogRecord(pos, bytes(payload), record_end)
+        elif record_type == LOG_FIRST:
+            yield from drop_fragments("Incomplete record")
+            fragments_start = pos
+            fragments.append(bytes(payload))
+        elif not fragments:
+            yield LogGap(pos, record_end, "Fragment without start")
+        else:
+            fragments.append(bytes(payload))
+            if record_type == LOG_LAST:
+                yield LogRecord(fragments_start, b"".join(fragments), record_end)
+                fragments.clear()
+        pos = record_end
+    yield from drop_fragments("Truncated record")
+
+
+def iter_batch(payload: bytes) -> Iterator[tuple[int, int, bytes, Optional[bytes]]]:
+    # Records of a write batch as (sequence number, value type, key, value)
+    if len(payload) < 12:
+        raise CorruptionError("Write batch too short")
+    sequence, count = struct.unpack_from("<QI", payload, 0)
+    pos = 12
+    for i in range(count):
+        if pos >= len(payload):
+            raise CorruptionError("Write batch truncated")
+        value_type = payload[pos]
+        key_size, pos = read_varint(payload, pos + 1)
+        key = payload[pos : pos + key_size]
+        pos += key_size
+        value = None
+        if value_type == TYPE_VALUE:
+            value_size, pos = read_varint(payload, pos)
+            value = payload[pos : pos + value_size]
+            pos += value_size
+        elif value_type != TYPE_DELETION:
+            raise CorruptionError(f"Unknown value type {value_type}")
+        if pos > len(payload):
+            raise CorruptionError("Write batch truncated")
+        yield sequence + i, value_type, key, value
+
+
+def encode_batch(
+    sequence: int, records: Iterable[tuple[int, bytes, Optional[bytes]]]
+) -> bytes:
+    # Write batch with records of (value type, user key, value)
+    body = bytearray()
+    count = 0
+    for value_type, key, value in records:
+        body.append(value_type)
+        body += encode_varint(len(key)) + key
+        if value_type == TYPE_VALUE:
+            value = value or b""
+            body += encode_varint(len(value)) + value
+        count += 1
+    return struct.pack("<QI", sequence, count) + bytes(body)
+
+
+def _skip_length_prefixed(data: bytes, pos: int) -> int:
+    size, pos = read_varint(data, pos)
+    if pos + size > len(data):
+        raise CorruptionError("Version edit truncated")
+    return pos + size
+
+
+def iter_edit_new_files(edit: bytes) -> Iterator[tuple[int, int]]:
+    # (level, file number) of the tables added by a version edit, a record of
+    # the MANIFEST file
+    pos = 0
+    while pos < len(edit):
+        tag, pos = read_varint(edit, pos)
+        if tag == EDIT_COMPARATOR:
+            pos = _skip_length_prefixed(edit, pos)
+        elif tag in EDIT_NUMBERS:
+            _, pos = read_varint(edit, pos)
+        elif tag == EDIT_COMPACT_POINTER:
+            _, pos = read_varint(edit, pos)
+            pos = _skip_length_prefixed(edit, pos)
+        elif tag == EDIT_DELETED_FILE:
+            _, pos = read_varint(edit, pos)
+            _, pos = read_varint(edit, pos)
+        elif tag == EDIT_NEW_FILE:
+            level, pos = read_varint(edit, pos)
+            number, pos = read_varint(edit, pos)
+            _, pos = read_varint(edit, pos)
+            pos = _skip_length_prefixed(edit, pos)
+            pos = _skip_length_prefixed(edit, pos)
+            yield level, number
+        else:
+            raise CorruptionError(f"Unknown version edit tag {tag}")
+
+
+def encode_deleted_files(files: Iterable[tuple[int, int]]) -> bytes:
+    # Version edit that removes the tables of (level, file number)
+    edit = bytearray()
+    for level, number in files:
+        edit += encode_varint(EDIT_DELETED_FILE)
+        edit += encode_varint(level) + encode_varint(number)
+    return bytes(edit)
+
+
+class LogWriter:
+    # Splits payloads into physical records that fit the 32 KiB blocks
+    def __init__(self, f: BinaryIO) -> None:
+        self.f = f
+        self.block_offset = 0
+
+    def add(self, payload: bytes) -> None:
+        pos = 0
+        first = True
+        while True:
+            left_in_block = LOG_BLOCK_SIZE - self.block_offset
+            if left_in_block < LOG_HEADER_SIZE:
+                self.f.write(b"\x00" * left_in_block)
+                self.block_offset = 0
+                left_in_block = LOG_BLOCK_SIZE
+            fragment = payload[pos : pos + left_in_block - LOG_HEADER_SIZE]
+            pos += len(fragment)
+            last = pos >= len(payload)
+            if first and last:
+                record_type = LOG_FULL
+            elif first:
+                record_type = LOG_FIRST
+            elif last:
+                record_type = LOG_LAST
+            else:
+                record_type = LOG_MIDDLE
+            crc = mask_crc(crc32c(fragment, crc32c(bytes([record_type]))))
+            self.f.write(struct.pack("<IHB", crc, len(fragment), record_type))
+            self.f.write(fragment)
+            self.block_offset += LOG_HEADER_SIZE + len(fragment)
+            first = False
+            if last:
+                break
+
+
+def write_log(f: BinaryIO, payloads: Iterable[bytes]) -> None:
+    writer = LogWriter(f)
+    for payload in payloads:
+        writer.add(payload)
@@ -1,7 +1,11 @@
 import json
+import sys
 import warnings
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import ExitStack
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import partial
 from json import JSONDecodeError
 from pathlib import Path
 from typing import Any, Optional, Union
@@ -14,7 +18,13 @@ from dataclasses_json import (
     config,
 )
 
-from forensicsim.backend import parse_db, write_results_to_json
+from forensicsim.backend import iter_db, setup_logs, write_results_to_json
+from forensicsim.blobs import BlobStore
+from forensicsim.dedup import DedupIndex
+from forensicsim.hashing import EvidenceHasher, FileHash, evidence_files
+from forensicsim.index import filtered_copy, indexed_copy
+from forensicsim.progress import ProgressReporter, database_size
+from forensicsim.spill import SpillStore
 
 # Suppress Beautiful Soup warnings
 warnings.filterwarnings("ignore", category=MarkupResemblesLocatorWarning)
@@ -40,8 +50,8 @@ def decode_dict(properties: Union[bytes, str, dict]) -> dict[str, Any]:
                     properties[key] = json.loads(value, strict=False)
             return properties
     except JSONDecodeError as e:
-        print(e)
-        print("Couldn't decode dictionary ", properties)
+        print(e, file=sys.stderr)
+        print("Couldn't decode dictionary ", properties, file=sys.stderr)
         return {}
 
     return json.loads(properties, strict=False)
@@ -75,6 +85,11 @@ class Meeting(DataClassJsonMixin):
     )
     type: Optional[str] = None
     version: Optional[float] = None
+    # Resolved from the contacts by iter_parsed_records
+    organizer_id: Optional[str] = None
+    organizer_display_name: Optional[str] = None
+    organizer_email: Optional[str] = None
+    organizer_user_principal_name: Optional[str] = None
 
     record_type: Optional[str] = field(
         default="meeting", metadata=config(field_name="record_type")
@@ -113,6 +128,10 @@ class Message(DataClassJsonMixin):
         metadata=config(decoder=decode_timestamp, encoder=encode_timestamp),
     )
     creator: Optional[str] = None
+    # Resolved from the contacts by iter_parsed_records
+    creator_display_name: Optional[str] = None
+    creator_email: Optional[str] = None
+    creator_user_principal_name: Optional[str] = None
     is_from_me: Optional[bool] = None
     message_kind: Optional[str] = None
     messagetype: Optional[str] = None
@@ -187,9 +206,105 @@ class Contact(DataClassJsonMixin):
         return self.mri < other.mri
 
 
-def _parse_people(people: list[dict], version: str) -> set[Contact]:
-    parsed_people = set()
+@dataclass()
+class RecordFilter:
+    # Restricts messages and meetings to conversations and to a time range.
+    # Bounds are naive datetimes in UTC, like Message.created_time. Records
+    # without a time can not be placed in the range, they are kept and
+    # counted in untimed.
+    conversations: Optional[frozenset[str]] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    untimed: int = 0
+
+    def match_conversation(self, conversation_id: Optional[str]) -> bool:
+        return self.conversations is None or conversation_id in self.conversations
+
+    def match_time(self, md: dict[str, Any]) -> bool:
+        if self.since is None and self.until is None:
+            return True
+        return self._in_range(message_time(md))
+
+    def match_meeting_time(self, value: dict[str, Any]) -> bool:
+        # A meeting matches if it overlaps the range
+        if self.since is None and self.until is None:
+            return True
+        start, end = meeting_times(value)
+        if start is None:
+            return self._in_range(None)
+        if self.until is not None and start > self.until:
+            return False
+        return self.since is None or (end or start) >= self.since
+
+    def _in_range(self, timestamp: Optional[datetime]) -> bool:
+        if timestamp is None:
+            self.untimed += 1
+            return True
+        if self.since is not None and timestamp < self.since:
+            return False
+        return self.until is None or timestamp <= self.until
+
+    def match_key(self, store: str, key: Any) -> bool:
+        # Applied to the IndexedDB key before the value is decoded. Keys of
+        # replychains and conversations start with the conversation id.
+        if self.conversations is None or store not in ("replychains", "conversations"):
+            return True
+        first = key[0] if isinstance(key, list) and key else key
+        if not isinstance(first, str):
+            return True
+        return first.startswith(tuple(self.conversations))
+
+
+def _parse_time(value: Any) -> Optional[datetime]:
+    # ISO 8601 time as a naive datetime in UTC
+    try:
+        timestamp = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def message_time(md: dict[str, Any]) -> Optional[datetime]:
+    # v2 has clientArrivalTime in milliseconds, v1 an ISO 8601 originalarrivaltime
+    value = (
+        md.get("clientArrivalTime")
+        or md.get("originalarrivaltime")
+        or md.get("originalArrivalTime")
+    )
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) or str(value).isdigit():
+        try:
+            return decode_timestamp(str(int(value)))
+        except (ValueError, OverflowError, OSError):
+            return None
+    return _parse_time(value)
+
+
+def meeting_times(
+    value: dict[str, Any],
+) -> tuple[Optional[datetime], Optional[datetime]]:
+    # startTime and endTime of threadProperties.meeting, an ISO 8601 string
+    # in UTC that is stored as JSON text
+    meeting = value.get("threadProperties", {}).get("meeting")
+    if isinstance(meeting, str):
+        try:
+            meeting = json.loads(meeting, strict=False)
+        except JSONDecodeError:
+            return None, None
+    if not isinstance(meeting, dict):
+        return None, None
+    start = meeting.get("startTime")
+    end = meeting.get("endTime")
+    return (
+        _parse_time(start) if start else None,
+        _parse_time(end) if end else None,
+    )
+
 
+def _parse_people(people: Iterable[dict], version: str) -> Iterator[Contact]:
     for p in people:
         # Skip empty records
         if p["value"] is None:
@@ -209,15 +324,15 @@ def _parse_people(people: list[dict], version: str) -> set[Contact]:
             p |= {"mri": p.get("mri")}
             p |= {"user_principal_name": p.get("userPrincipalName")}
         else:
-            print("Teams Version is unknown. Can not extract records of type people.")
-
-        parsed_people.add(Contact.from_dict(p))
-    return parsed_people
+            print(
+                "Teams Version is unknown. Can not extract records of type people.",
+                file=sys.stderr,
+            )
 
+        yield Contact.from_dict(p)
 
-def _parse_buddies(buddies: list[dict], version: str) -> set[Contact]:
-    parsed_buddies = set()
 
+def _parse_buddies(buddies: Iterable[dict], version: str) -> Iterator[Contact]:
     for b in buddies:
         # Skip empty records
         if b["value"] is None:
@@ -227,41 +342,65 @@ def _parse_buddies(buddies: list[dict], version: str) -> set[Contact]:
             buddies_of_b = b.get("value", {}).get("buddies", [])
             for b_of_b in buddies_of_b:
                 b_of_b |= {"origin_file": b.get("origin_file")}
-                parsed_buddies.add(Contact.from_dict(b_of_b))
+                yield Contact.from_dict(b_of_b)
         else:
-            print("Teams Version is unknown. Can not extract records of type buddies.")
-    return parsed_buddies
+            print(
+                "Teams Version is unknown. Can not extract records of type buddies.",
+                file=sys.stderr,
+            )
 
 
 # Conversations can contain multiple artefacts
 # -> If type:Meeting then its a meeting
-def _parse_conversations(conversations: list[dict], version: str) -> set[Meeting]:
-    cleaned_conversations = set()
+def _parse_conversations(
+    conversations: Iterable[dict],
+    version: str,
+    record_filter: Optional[RecordFilter] = None,
+) -> Iterator[Meeting]:
     for c in conversations:
         # Skip empty records
         if c["value"] is None:
             continue
+        if record_filter and not record_filter.match_conversation(
+            c.get("value", {}).get("id")
+        ):
+            continue
         # Fetch relevant data
         if version == "v1" or version == "v2":
             if c.get("value", {}).get("type", "") == "Meeting" and "meeting" in c.get(
                 "value", {}
             ).get("threadProperties", {}):
                 c_value = c.get("value", {})
+                if record_filter and not record_filter.match_meeting_time(c_value):
+                    continue
                 c |= c_value
                 c |= {"thread_properties": c_value.get("threadProperties", {})}
                 c |= {"cached_deduplication_key": c.get("id")}
-                cleaned_conversations.add(Meeting.from_dict(c))
+                yield Meeting.from_dict(c)
         else:
-            print("Teams Version is unknown. Can not extract records of type meeting.")
-    return cleaned_conversations
+            print(
+                "Teams Version is unknown. Can not extract records of type meeting.",
+                file=sys.stderr,
+            )
 
 
-def _parse_reply_chains(reply_chains: list[dict], version: str) -> set[Message]:
-    cleaned_reply_chains = set()
+def _parse_reply_chains(
+    reply_chains: Iterable[dict],
+    version: str,
+    record_filter: Optional[RecordFilter] = None,
+) -> Iterator[Message]:
     for rc in reply_chains:
         # Skip empty records
         if rc["value"] is None:
             continue
+        # Skip whole reply chains of other conversations
+        chain_conversation = rc.get("value", {}).get("conversationId")
+        if (
+            record_filter
+            and chain_conversation is not None
+            and not record_filter.match_conversation(chain_conversation)
+        ):
+            continue
 
         # Fetch relevant data
         rc |= rc.get("value", {})
@@ -274,12 +413,19 @@ def _parse_reply_chains(reply_chains: list[dict], version: str) -> set[Message]:
             message_dict = rc.get("value", {}).get("messageMap", {})
         else:
             print(
-                "Teams Version is unknown. Can not extract records of type reply_chains."
+                "Teams Version is unknown. Can not extract records of type reply_chains.",
+                file=sys.stderr,
             )
             continue
 
         for k in message_dict:
             md = message_dict[k]
+            # Filter before the message is converted and its HTML is stripped
+            if record_filter and not (
+                record_filter.match_conversation(md.get("conversationId"))
+                and record_filter.match_time(md)
+            ):
+                continue
             if (
                 md.get("messagetype", "") == "RichText/Html"
                 or md.get("messagetype", "") == "Text"
@@ -317,12 +463,10 @@ def _parse_reply_chains(reply_chains: list[dict], version: str) -> set[Message]:
                 rc |= {"version": md.get("version")}
                 rc |= {"properties": md.get("properties")}
 
-                cleaned_reply_chains.add(Message.from_dict(rc))
+                yield Message.from_dict(rc)
 
-    return cleaned_reply_chains
 
-
-def identify_teams_version(reply_chains: list[dict]) -> str:
+def identify_teams_version(reply_chains: Iterable[dict]) -> str:
     # Identify version based on reply chain structure
     fingerprint_teams_version = ""
     for rc in reply_chains:
@@ -338,31 +482,154 @@ def identify_teams_version(reply_chains: list[dict]) -> str:
     return fingerprint_teams_version
 
 
-def parse_records(records: list[dict]) -> list[dict]:
-    people, buddies, reply_chains, conversations = [], [], [], []
-
-    for r in records:
-        store = r.get("store", "other")
-        if store == "people":
-            people.append(r)
-        elif store == "buddylist":
-            buddies.append(r)
-        elif store == "replychains":
-            reply_chains.append(r)
-        elif store == "conversations":
-            conversations.append(r)
-
-    # identify version
-    version = identify_teams_version(reply_chains)
-
-    # sort within groups i.e., Contacts, Meetings, Conversations
-    parsed_records = (
-        sorted(_parse_people(people, version))
-        + sorted(_parse_buddies(buddies, version))
-        + sorted(_parse_reply_chains(reply_chains, version))
-        + sorted(_parse_conversations(conversations, version))
+# (display name, email, user principal name) by lower case MRI
+ContactIndex = dict[str, tuple[Optional[str], Optional[str], Optional[str]]]
+
+
+def _index_contact(contacts: ContactIndex, contact: Contact) -> None:
+    # people and buddylist may both hold a contact, the first value of each
+    # field wins
+    if not contact.mri:
+        return
+    known = contacts.get(contact.mri.lower(), (None, None, None))
+    contacts[contact.mri.lower()] = (
+        known[0] or contact.display_name,
+        known[1] or contact.email,
+        known[2] or contact.user_principal_name,
     )
-    return [r.to_dict() for r in parsed_records]
+
+
+def _meeting_organizer(meeting: Meeting) -> Optional[str]:
+    details = meeting.thread_properties.get("meeting")
+    if isinstance(details, str):
+        try:
+            details = json.loads(details, strict=False)
+        except JSONDecodeError:
+            return None
+    if not isinstance(details, dict):
+        return None
+    return details.get("organizerId")
+
+
+def _resolve_emotion_users(properties: dict[str, Any], contacts: ContactIndex) -> None:
+    # The reactions to a message are kept in its properties, as
+    # {"key": "like", "users": [{"mri": ..., "time": ...}, ...]} per emotion
+    for emotion in properties.get("emotions") or ():
+        if not isinstance(emotion, dict):
+            continue
+        for user in emotion.get("users") or ():
+            if not isinstance(user, dict) or not isinstance(user.get("mri"), str):
+                continue
+            info = contacts.get(user["mri"].lower())
+            if info is None:
+                continue
+            for name, value in zip(("displayName", "email", "userPrincipalName"), info):
+                if value is not None:
+                    user.setdefault(name, value)
+
+
+def _resolve_contacts(record: Union[Message, Meeting], contacts: ContactIndex) -> None:
+    if isinstance(record, Message):
+        if record.creator:
+            info = contacts.get(record.creator.lower())
+            if info is not None:
+                (
+                    record.creator_display_name,
+                    record.creator_email,
+                    record.creator_user_principal_name,
+                ) = info
+        _resolve_emotion_users(record.properties, contacts)
+        return
+    record.organizer_id = _meeting_organizer(record)
+    if record.organizer_id:
+        info = contacts.get(record.organizer_id.lower())
+        if info is not None:
+            (
+                record.organizer_display_name,
+                record.organizer_email,
+                record.organizer_user_principal_name,
+            ) = info
+
+
+def _contact_key(contact: Contact) -> Optional[str]:
+    return contact.mri
+
+
+def _deduplication_key(record: Union[Message, Meeting]) -> Optional[str]:
+    return record.cached_deduplication_key
+
+
+def iter_parsed_records(
+    records: Iterable[dict],
+    max_memory: Optional[int] = None,
+    spill_dir: Optional[Path] = None,
+    progress: Optional[ProgressReporter] = None,
+    record_filter: Optional[RecordFilter] = None,
+    contacts: Optional[ContactIndex] = None,
+    version: Optional[str] = None,
+) -> Iterator[dict]:
+    # With max_memory set, the partitions and the deduplicated sets move to a
+    # temporary SQLite file in spill_dir once they exceed the budget.
+    # Contacts come first, so that messages and meetings are resolved
+    # against them as they are written. A contacts index passed in is kept
+    # up to date, so that it can be reused for later records.
+    if contacts is None:
+        contacts = {}
+    with SpillStore(max_memory, spill_dir) as store:
+        people, buddies = store.list(), store.list()
+        reply_chains, conversations = store.list(), store.list()
+
+        for r in records:
+            store_name = r.get("store", "other")
+            if store_name == "people":
+                people.append(r)
+            elif store_name == "buddylist":
+                buddies.append(r)
+            elif store_name == "replychains":
+                reply_chains.append(r)
+            elif store_name == "conversations":
+                conversations.append(r)
+
+        # identify version, unless known from earlier records
+        if version is None:
+            version = identify_teams_version(reply_chains)
+
+        # sort within groups i.e., Contacts, Meetings, Conversations
+        for store_name, parse, partition, key in (
+            ("people", _parse_people, people, _contact_key),
+            ("buddylist", _parse_buddies, buddies, _contact_key),
+            (
+                "replychains",
+                partial(_parse_reply_chains, record_filter=record_filter),
+                reply_chains,
+                _deduplication_key,
+            ),
+            (
+                "conversations",
+                partial(_parse_conversations, record_filter=record_filter),
+                conversations,
+                _deduplication_key,
+            ),
+        ):
+            if progress:
+                progress.set_stage("parse", store_name)
+            parsed = store.set(key)
+            for record in parse(partition, version):
+                parsed.add(record)
+            # The partition is not needed anymore, its budget goes to the
+            # following ones
+            partition.close()
+            for record in parsed.sorted():
+                if isinstance(record, Contact):
+                    _index_contact(contacts, record)
+                else:
+                    _resolve_contacts(record, contacts)
+                yield record.to_dict()
+            parsed.close()
+
+
+def parse_records(records: list[dict]) -> list[dict]:
+    return list(iter_parsed_records(records))
 
 
 def process_db(
@@ -370,10 +637,27 @@ def process_db(
     output_path: Path,
     blob_path: Optional[Path] = None,
     filter_db_results: Optional[bool] = True,
-    raw_dump: bool = False  # Pass raw_dump argument
-) -> None:
+    raw_dump: bool = False,  # Pass raw_dump argument
+    max_memory: Optional[int] = None,
+    progress: Optional[ProgressReporter] = None,
+    dump_failures: bool = False,
+    resilient: bool = False,
+    conversations: Optional[Iterable[str]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    dedup_index: Optional[Path] = None,
+    source: Optional[str] = None,
+    write_results: Callable[[Iterable[dict], Path], int] = write_results_to_json,
+    blob_store: Optional[Path] = None,
+    compress: Optional[str] = None,
+    hash_inputs: bool = False,
+    md5: bool = False,
+    hash_cache: Optional[Path] = None,
+    index_path: Optional[Path] = None,
+    evidence: Optional[list[FileHash]] = None,
+) -> int:
     # Set up logs
-    logs = setup_logs(output_path.parent)
+    logs = setup_logs(output_path.parent, compress)
 
     # Validate paths
     if not input_path.parts[-1].endswith(".leveldb"):
@@ -381,20 +665,94 @@ def process_db(
     if blob_path is not None and not blob_path.parts[-1].endswith(".blob"):
         raise ValueError(f"Expected a .blob folder. Path: {blob_path}")
 
-    # Parse raw or processed data
-    extracted_values = parse_db(
-        input_path, blob_path, filter_db_results, raw_dump, log_paths=logs
-    )
-
-    # If raw_dump is enabled, skip structured output
-    if raw_dump:
-        return
-
-    # Parse and write structured data
-    parsed_records = parse_records(extracted_values)
-    write_results_to_json(parsed_records, output_path)
+    if progress:
+        progress.total_bytes = database_size(input_path)
+
+    record_filter = None
+    if conversations is not None or since is not None or until is not None:
+        record_filter = RecordFilter(
+            frozenset(conversations) if conversations is not None else None,
+            since,
+            until,
+        )
+
+    with ExitStack() as stack:
+        # The input files are hashed in the background while they are
+        # decoded, hashes.json is written next to the output. Databases read
+        # from a tar stream or an image pass the hashes of that evidence
+        # instead of their scratch copies.
+        hasher = None
+        if hash_inputs:
+            hasher = stack.enter_context(
+                EvidenceHasher(
+                    evidence_files(input_path, blob_path) if evidence is None else [],
+                    md5,
+                    hash_cache or output_path.parent / "hash_cache.sqlite",
+                    known=evidence or (),
+                )
+            )
+        db_kwargs: dict[str, Any] = {
+            "log_paths": logs,
+            "progress": progress,
+            "dump_failures": dump_failures,
+            "resilient": resilient,
+            "blob_store": BlobStore(blob_store) if blob_store is not None else None,
+        }
+        # Records of other conversations are dropped by their key, before
+        # ccl decodes any value. With the index of build_index.py, only the
+        # blocks that hold the remaining records are read.
+        if record_filter and record_filter.conversations is not None:
+            if progress:
+                progress.set_stage("filter")
+            if index_path is not None:
+                subset = indexed_copy(input_path, index_path, record_filter.match_key)
+            else:
+                subset = filtered_copy(input_path, record_filter.match_key)
+            stack.enter_context(subset)
+            extracted_values = subset.records(blob_path, raw_dump, **db_kwargs)
+        else:
+            # Parse raw or processed data
+            extracted_values = iter_db(input_path, blob_path, raw_dump, **db_kwargs)
+
+        # If raw_dump is enabled, skip structured output
+        if raw_dump:
+            count = sum(1 for _ in extracted_values)
+            if hasher:
+                hasher.write(output_path.parent / "hashes.json")
+            if progress:
+                progress.finish()
+            return count
+
+        # Parse and write structured data, record by record
+        parsed_records = iter_parsed_records(
+            extracted_values,
+            max_memory,
+            output_path.parent,
+            progress,
+            record_filter,
+        )
+        # Records found in an earlier source of the case are left out
+        dedup = None
+        if dedup_index is not None:
+            dedup = stack.enter_context(DedupIndex(dedup_index))
+            parsed_records = dedup.unseen(
+                parsed_records, source or str(input_path.resolve())
+            )
+        count = write_results(parsed_records, output_path)
+        if hasher:
+            hasher.write(output_path.parent / "hashes.json")
+    if progress:
+        progress.finish()
 
     # Log summary
     with open(logs["debug_log"], "a") as debug_log:
-        debug_log.write(f"[INFO] Processed {len(parsed_records)} records successfully.\n")
-
+        debug_log.write(f"[INFO] Processed {count} records successfully.\n")
+        if dedup is not None:
+            debug_log.write(
+                f"[INFO] Skipped {dedup.skipped} records already found in other sources.\n"
+            )
+        if record_filter and record_filter.untimed:
+            debug_log.write(
+                f"[INFO] Kept {record_filter.untimed} messages and meetings without a time, --since and --until do not apply to them.\n"
+            )
+    return count
@@ -0,0 +1,183 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, TextIO
+
+from forensicsim.backend import (
+    iter_db,
+    iter_localstorage,
+    iter_sessionstorage,
+    setup_logs,
+    write_results_to_json,
+)
+from forensicsim.compression import open_text
+from forensicsim.parser import iter_parsed_records
+
+INDEXEDDB_SUFFIX = ".indexeddb.leveldb"
+BLOB_SUFFIX = ".indexeddb.blob"
+
+STORE_KINDS = ["indexeddb", "local_storage", "session_storage"]
+
+
+@dataclass()
+class ProfileStore:
+    kind: str
+    path: Path
+    blob: Optional[Path] = None
+
+
+def classify_store_dir(path: Path) -> Optional[str]:
+    # Chromium and Electron keep every store in a folder with a fixed name,
+    # e.g. for classic Teams below %AppData%\Microsoft\Teams and for new Teams
+    # below ...\MSTeams\EBWebView\WV2Profile_tfw.
+    if path.name.endswith(INDEXEDDB_SUFFIX):
+        return "indexeddb"
+    if path.name == "leveldb" and path.parent.name == "Local Storage":
+        return "local_storage"
+    if path.name == "Session Storage":
+        return "session_storage"
+    return None
+
+
+def blob_dir_for(indexeddb: Path) -> Optional[Path]:
+    blob = indexeddb.with_name(indexeddb.name[: -len(".leveldb")] + ".blob")
+    return blob if blob.is_dir() else None
+
+
+def find_profile_stores(profile: Path) -> list[ProfileStore]:
+    stores = []
+    for root, dirs, _ in os.walk(profile):
+        root_path = Path(root)
+        kind = classify_store_dir(root_path)
+        if kind is not None:
+            blob = blob_dir_for(root_path) if kind == "indexeddb" else None
+            stores.append(ProfileStore(kind, root_path, blob))
+            # Stores never contain other stores
+            dirs.clear()
+        elif root_path.name.endswith(BLOB_SUFFIX):
+            dirs.clear()
+    return sorted(stores, key=lambda s: (STORE_KINDS.index(s.kind), str(s.path)))
+
+
+def _extract_store(
+    store: ProfileStore,
+    part_path: Path,
+    log_dir: Path,
+    compress: Optional[str] = None,
+    max_memory: Optional[int] = None,
+) -> None:
+    # Every worker has its own budget of max_memory and spills next to its part
+    if store.kind == "indexeddb":
+        logs = setup_logs(log_dir, compress)
+        records = iter_parsed_records(
+            iter_db(store.path, store.blob, log_paths=logs),
+            max_memory,
+            part_path.parent,
+        )
+        write_results_to_json(records, part_path)
+    elif store.kind == "local_storage":
+        write_results_to_json(iter_localstorage(store.path), part_path)
+    else:
+        write_results_to_json(iter_sessionstorage(store.path), part_path)
+
+
+def _write_section(
+    f: TextIO, store: ProfileStore, part_path: Path, error: Optional[str]
+) -> None:
+    header = {"type": store.kind, "source": str(store.path)}
+    if store.blob is not None:
+        header["blob"] = str(store.blob)
+    if error is not None:
+        header["error"] = error
+
+    f.write("\n        {")
+    for key, value in header.items():
+        f.write(f"\n            {json.dumps(key)}: ")
+        f.write(json.dumps(value, ensure_ascii=False) + ",")
+    f.write('\n            "records": ')
+    if error is not None:
+        f.write("[]")
+    else:
+        # Re-indent the part, json.dumps never emits raw newlines in strings
+        with open(part_path, encoding="utf-8") as part:
+            f.writelines(
+                line if i == 0 else "            " + line for i, line in enumerate(part)
+            )
+    f.write("\n        }")
+
+
+def extract_profile(
+    profile: Path,
+    outputpath: Path,
+    workers: Optional[int] = None,
+    compress: Optional[str] = None,
+    compress_threads: int = 0,
+    max_memory: Optional[int] = None,
+) -> list[ProfileStore]:
+    # The parts are written uncompressed, the combined output and the logs
+    # are compressed
+    stores = find_profile_stores(profile)
+    outputpath.parent.mkdir(parents=True, exist_ok=True)
+    log_root = outputpath.with_name(outputpath.name + ".logs")
+
+    with tempfile.TemporaryDirectory(dir=outputpath.parent) as scratch:
+        part_paths = [Path(scratch) / f"{i}.json" for i in range(len(stores))]
+
+        # Every store is extracted by its own worker, so the total runtime is
+        # roughly that of the slowest store.
+        errors: list[Optional[str]] = [None] * len(stores)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    _extract_store,
+                    store,
+                    part_path,
+                    log_root / f"{i}_{store.path.name}",
+                    compress,
+                    max_memory,
+                )
+                for i, (store, part_path) in enumerate(zip(stores, part_paths))
+            ]
+            for i, future in enumerate(futures):
+                exception = future.exception()
+                if exception is not None:
+                    errors[i] = f"{type(exception).__name__}: {exception}"
+
+        with open_text(outputpath, compress, compress_threads) as f:
+            f.write("{\n")
+            f.write(f'    "profile": {json.dumps(str(profile), ensure_ascii=False)},\n')
+            f.write('    "sections": [')
+            for i, (store, part_path) in enumerate(zip(stores, part_paths)):
+                if i:
+                    f.write(",")
+                _write_section(f, store, part_path, errors[i])
+            f.write("\n    ]\n}" if stores else "]\n}")
+
+    return stores
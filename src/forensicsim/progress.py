@@ -0,0 +1,170 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import os
+import sys
+import time
+from collections.abc import Generator, Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Optional, TextIO, TypeVar
+
+T = TypeVar("T")
+
+# Seconds between two progress events
+PROGRESS_INTERVAL = 1.0
+# Records between two looks at the clock, keeps the per record cost at an
+# integer increment
+CHECK_EVERY = 256
+
+LEVELDB_DATA_SUFFIXES = (".ldb", ".log")
+
+
+def database_size(path: Path) -> int:
+    # Bytes of table and log files, i.e. what the reader has to get through
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            if name.endswith(LEVELDB_DATA_SUFFIXES):
+                try:
+                    size += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    continue
+    return size
+
+
+class ProgressReporter:
+    # Writes one JSON object per line, e.g.
+    # {"event": "progress", "stage": "read", "store": "replychains",
+    #  "records": {"people": 120, "replychains": 5000}, "bytes_done": ...}
+    def __init__(
+        self,
+        stream: TextIO,
+        total_bytes: int = 0,
+        interval: float = PROGRESS_INTERVAL,
+    ) -> None:
+        self.stream = stream
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.stage = "start"
+        self.store: Optional[str] = None
+        self.records: dict[str, int] = {}
+        self.total_records = 0
+        self.bytes_done = 0
+        self._offsets: dict[str, int] = {}
+        self._unchecked = 0
+        self._start = time.monotonic()
+        self._last_event = self._start
+
+    def set_stage(self, stage: str, store: Optional[str] = None) -> None:
+        self.stage = stage
+        self.store = store
+        self.emit()
+
+    def record(
+        self, store: str, origin_file: Any = None, offset: Optional[int] = None
+    ) -> None:
+        self.records[store] = self.records.get(store, 0) + 1
+        self.total_records += 1
+        if origin_file is not None and offset is not None:
+            # Tables are read front to back, so the highest offset seen in a
+            # file is how far into the file the reader got
+            origin_file = str(origin_file)
+            previous = self._offsets.get(origin_file, 0)
+            if offset > previous:
+                self._offsets[origin_file] = offset
+                self.bytes_done += offset - previous
+        self._unchecked += 1
+        if self._unchecked >= CHECK_EVERY:
+            self._unchecked = 0
+            if time.monotonic() - self._last_event >= self.interval:
+                self.emit()
+
+    def track(self, records: Iterable[T], store: str) -> Iterator[T]:
+        for record in records:
+            self.record(store)
+            yield record
+
+    def emit(self, event: str = "progress") -> None:
+        now = time.monotonic()
+        elapsed = now - self._start
+        bytes_done = min(self.bytes_done, self.total_bytes) if self.total_bytes else 0
+        eta = None
+        if event == "progress" and self.total_bytes and bytes_done:
+            eta = round(elapsed * (self.total_bytes - bytes_done) / bytes_done, 1)
+        self.stream.write(
+            json.dumps({
+                "event": event,
+                "stage": self.stage,
+                "store": self.store,
+                "records": self.records,
+                "total_records": self.total_records,
+                "bytes_done": bytes_done,
+                "bytes_total": self.total_bytes,
+                "elapsed": round(elapsed, 1),
+                "records_per_second": round(self.total_records / max(elapsed, 1e-9)),
+                "eta": eta,
+            })
+            + "\n"
+        )
+        self.stream.flush()
+        self._last_event = now
+
+    def finish(self) -> None:
+        self.stage = "done"
+        self.store = None
+        self.bytes_done = self.total_bytes
+        self.emit("done")
+
+
+@contextmanager
+def open_progress(
+    progresspath: Optional[Path],
+) -> Generator[Optional[ProgressReporter], None, None]:
+    # None disables reporting, "-" reports to stderr
+    if progresspath is None:
+        yield None
+    elif str(progresspath) == "-":
+        yield ProgressReporter(sys.stderr)
+    else:
+        with open(progresspath, "w", encoding="utf-8") as f:
+            yield ProgressReporter(f)
+
+
+def read_last_event(progresspath: Path) -> Optional[dict[str, Any]]:
+    # Last complete event of a progress file that is still being written
+    try:
+        with open(progresspath, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - 8192, 0))
+            lines = f.read().split(b"\n")
+    except OSError:
+        return None
+    for line in reversed(lines[:-1]):
+        try:
+            return json.loads(line)
+        except ValueError:
+            continue
+    return None
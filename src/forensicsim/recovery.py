@@ -0,0 +1,267 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import shutil
+import tempfile
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+from forensicsim.leveldb import (
+    TYPE_VALUE,
+    Buffer,
+    CorruptionError,
+    LogGap,
+    LogRecord,
+    encode_batch,
+    encode_deleted_files,
+    iter_block_entries,
+    iter_edit_new_files,
+    iter_log,
+    iter_table_blocks,
+    map_file,
+    split_internal_key,
+    write_log,
+)
+
+TABLE_SUFFIXES = (".ldb", ".sst")
+LOG_SUFFIX = ".log"
+MANIFEST_PREFIX = "MANIFEST-"
+# Never taken over into the scratch copy
+SKIPPED_FILES = frozenset(["LOCK"])
+
+
+@dataclass()
+class SkippedRange:
+    start: int
+    end: int
+    reason: str
+
+
+@dataclass()
+class FileReport:
+    name: str
+    size: int
+    skipped: list[SkippedRange] = field(default_factory=list)
+    # Set if the file could not be read at all
+    error: Optional[str] = None
+
+    @property
+    def damaged(self) -> bool:
+        return bool(self.skipped) or self.error is not None
+
+    @property
+    def skipped_bytes(self) -> int:
+        if self.error is not None:
+            return self.size
+        return sum(r.end - r.start for r in self.skipped)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "size": self.size,
+            "skipped_bytes": self.skipped_bytes,
+            "error": self.error,
+            "skipped": [
+                {"start": r.start, "end": r.end, "reason": r.reason}
+                for r in self.skipped
+            ],
+        }
+
+
+def _table_batches(data: Buffer, report: FileReport) -> Iterator[bytes]:
+    # Every entry of the intact blocks becomes a batch of its own, which keeps
+    # its original sequence number. The checksums were verified by
+    # _check_table, whose damaged blocks are in report already.
+    damaged = {r.start for r in report.skipped}
+    for block in iter_table_blocks(data, verify=False):
+        if block.handle.offset in damaged:
+            continue
+        if block.contents is None:
+            report.skipped.append(
+                SkippedRange(block.handle.offset, block.handle.end, block.error or "")
+            )
+            continue
+        try:
+            entries = list(iter_block_entries(block.contents))
+        except CorruptionError as e:
+            report.skipped.append(
+                SkippedRange(block.handle.offset, block.handle.end, str(e))
+            )
+            continue
+        for internal_key, value in entries:
+            key, sequence, value_type = split_internal_key(internal_key)
+            yield encode_batch(
+                sequence,
+                [(value_type, key, value if value_type == TYPE_VALUE else None)],
+            )
+
+
+def _log_batches(data: Buffer, report: FileReport) -> Iterator[bytes]:
+    for item in iter_log(data):
+        if isinstance(item, LogGap):
+            report.skipped.append(SkippedRange(item.start, item.end, item.reason))
+        else:
+            yield item.payload
+
+
+def _check_table(data: Buffer, report: FileReport) -> None:
+    # Checksums only, blocks are decoded when the table has to be rebuilt
+    for block in iter_table_blocks(data, decompress=False):
+        if block.contents is None:
+            report.skipped.append(
+                SkippedRange(block.handle.offset, block.handle.end, block.error or "")
+            )
+
+
+def _check_file(path: Path) -> FileReport:
+    report = FileReport(path.name, path.stat().st_size)
+    try:
+        with map_file(path) as data:
+            if path.suffix in TABLE_SUFFIXES:
+                _check_table(data, report)
+            else:
+                for _ in _log_batches(data, report):
+                    pass
+    except (CorruptionError, OSError) as e:
+        report.error = str(e)
+    return report
+
+
+def _rebuild_file(path: Path, target: Path, report: FileReport) -> FileReport:
+    # Writes the intact records of a damaged file to a log file. The gaps of
+    # a log are found again while it is read.
+    if path.suffix not in TABLE_SUFFIXES:
+        report = FileReport(path.name, report.size)
+    with map_file(path) as data, open(target, "wb") as f:
+        try:
+            if path.suffix in TABLE_SUFFIXES:
+                write_log(f, _table_batches(data, report))
+            else:
+                write_log(f, _log_batches(data, report))
+        except CorruptionError as e:
+            report.error = str(e)
+    return report
+
+
+def _drop_tables(manifest: Path, numbers: set[int]) -> None:
+    # Appends a version edit that removes the given tables, whose records are
+    # in log files of the same number now
+    with map_file(manifest) as data:
+        edits = [item.payload for item in iter_log(data) if isinstance(item, LogRecord)]
+    try:
+        dropped = sorted({
+            (level, number)
+            for edit in edits
+            for level, number in iter_edit_new_files(edit)
+            if number in numbers
+        })
+    except CorruptionError:
+        return
+    if dropped:
+        # Never write through a link into the original database
+        manifest.unlink()
+        with open(manifest, "wb") as f:
+            write_log(f, [*edits, encode_deleted_files(dropped)])
+
+
+def _link_or_copy(source: Path, target: Path) -> None:
+    try:
+        os.symlink(source.resolve(), target)
+    except OSError:
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+
+
+class RecoveredDatabase:
+    # Scratch copy of a LevelDB without its damaged blocks. Intact files are
+    # linked into the copy, damaged ones are replaced by a log file with the
+    # same file number that holds the records of their intact blocks. The
+    # replaced tables are removed from the copied MANIFEST.
+    def __init__(self, path: Path, scratch_dir: Optional[Path] = None) -> None:
+        self.original = path
+        self.files: list[FileReport] = []
+        self._origins: dict[str, Path] = {}
+        self._tempdir = tempfile.TemporaryDirectory(
+            prefix="forensicsim_recovery_", dir=scratch_dir
+        )
+        self.path = Path(self._tempdir.name) / path.name
+        self.path.mkdir()
+
+        rebuilt_tables: set[int] = set()
+        for source in sorted(path.iterdir()):
+            if not source.is_file() or source.name in SKIPPED_FILES:
+                continue
+            if source.suffix not in (*TABLE_SUFFIXES, LOG_SUFFIX):
+                shutil.copy2(source, self.path / source.name)
+                continue
+            report = _check_file(source)
+            if not report.damaged:
+                self.files.append(report)
+                _link_or_copy(source, self.path / source.name)
+                self._origins[source.name] = source
+                continue
+            target = self.path / (source.stem + LOG_SUFFIX)
+            if source.suffix in TABLE_SUFFIXES and source.stem.isdigit():
+                rebuilt_tables.add(int(source.stem))
+            if report.error is None:
+                report = _rebuild_file(source, target, report)
+            else:
+                # Nothing of the file can be located, e.g. a table without
+                # its footer or index
+                target.touch()
+            self.files.append(report)
+            self._origins[target.name] = source
+        if rebuilt_tables:
+            for manifest in self.path.glob(MANIFEST_PREFIX + "*"):
+                _drop_tables(manifest, rebuilt_tables)
+
+    @property
+    def damaged(self) -> bool:
+        return any(f.damaged for f in self.files)
+
+    @property
+    def skipped_bytes(self) -> int:
+        return sum(f.skipped_bytes for f in self.files)
+
+    def origin(self, origin_file: Any) -> Any:
+        # Maps a file of the scratch copy back to the file it was read from
+        if origin_file is None:
+            return None
+        return self._origins.get(Path(str(origin_file)).name, origin_file)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "path": str(self.original),
+            "damaged": self.damaged,
+            "skipped_bytes": self.skipped_bytes,
+            "files": [f.to_dict() for f in self.files if f.damaged],
+        }
+
+    def close(self) -> None:
+        self._tempdir.cleanup()
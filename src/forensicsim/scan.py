@@ -0,0 +1,153 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import hashlib
+import os
+import re
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Optional
+
+from forensicsim.jobs import Job
+from forensicsim.profile import INDEXEDDB_SUFFIX, blob_dir_for
+
+# https_teams.microsoft.com_0.indexeddb.leveldb is for business and educational
+# accounts, https_teams.live.com_0.indexeddb.leveldb for private ones. Both are
+# used by classic Teams and by new Teams below EBWebView\WV2Profile_tf*.
+TEAMS_HOSTS = ("teams.microsoft.com", "teams.live.com")
+
+# Folders that never hold a Teams profile, compared in lower case. Only the
+# names in PRUNED_DIRS are distinctive enough to be pruned at any depth.
+PRUNED_DIRS = frozenset([
+    "$recycle.bin",
+    "$windows.~bt",
+    "$windows.~ws",
+    "system volume information",
+    "node_modules",
+])
+# Pruned next to Users at the root of a Windows volume
+VOLUME_MARKERS = frozenset(["users", "windows"])
+VOLUME_PRUNED_DIRS = frozenset([
+    "windows",
+    "program files",
+    "program files (x86)",
+])
+# Pruned next to the IndexedDB or Local Storage of a Chromium profile
+PROFILE_MARKERS = frozenset(["indexeddb", "local storage"])
+PROFILE_PRUNED_DIRS = frozenset([
+    "cache",
+    "code cache",
+    "gpucache",
+    "dawncache",
+    "grshadercache",
+    "shadercache",
+    "service worker",
+    "blob_storage",
+    "crashpad",
+    "logs",
+])
+
+
+def _is_teams_path(path: Path) -> bool:
+    return any("teams" in part.lower() for part in path.parts)
+
+
+def _is_dir(entry: os.DirEntry) -> bool:
+    # Do not follow symlinks or junctions (e.g. "Application Data"), they
+    # would make the walk visit profiles twice or loop forever.
+    try:
+        if entry.is_symlink() or getattr(entry, "is_junction", lambda: False)():
+            return False
+        return entry.is_dir(follow_symlinks=False)
+    except OSError:
+        return False
+
+
+def _scan_dir(path: Path) -> tuple[list[Path], list[tuple[str, Path]]]:
+    subdirs: list[Path] = []
+    found: list[tuple[str, Path]] = []
+    try:
+        with os.scandir(path) as entries:
+            dirs = [entry for entry in entries if _is_dir(entry)]
+    except OSError:
+        return subdirs, found
+    names = {entry.name.lower() for entry in dirs}
+    pruned = PRUNED_DIRS
+    if names >= VOLUME_MARKERS:
+        pruned = pruned | VOLUME_PRUNED_DIRS
+    if names & PROFILE_MARKERS:
+        pruned = pruned | PROFILE_PRUNED_DIRS
+    for entry in dirs:
+        entry_path = Path(entry.path)
+        name = entry.name.lower()
+        if name.endswith(INDEXEDDB_SUFFIX):
+            if any(host in name for host in TEAMS_HOSTS):
+                found.append(("indexeddb", entry_path))
+        elif name == "local storage":
+            leveldb = entry_path / "leveldb"
+            if leveldb.is_dir() and _is_teams_path(entry_path):
+                found.append(("local_storage", leveldb))
+        elif name not in pruned and not name.endswith(".blob"):
+            subdirs.append(entry_path)
+    return subdirs, found
+
+
+def scan_evidence(
+    root: Path, workers: Optional[int] = None
+) -> Iterator[tuple[str, Path]]:
+    # Breadth-first walk where every directory listing is a task of its own.
+    # os.scandir releases the GIL, so slow mounts and network shares are
+    # listed in parallel.
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending: set[Future] = {executor.submit(_scan_dir, root)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                subdirs, found = future.result()
+                yield from found
+                pending.update(executor.submit(_scan_dir, d) for d in subdirs)
+
+
+def job_output_dir(root: Path, path: Path, destination: Path) -> Path:
+    # Readable but unique folder name per database, e.g.
+    # Users_john_AppData_Roaming_Microsoft_Teams_IndexedDB_https_..._3f2a9c1e
+    try:
+        relative = path.relative_to(root)
+    except ValueError:
+        relative = path
+    slug = re.sub(r"[^A-Za-z0-9.]+", "_", str(relative))[-120:].strip("_.")
+    digest = hashlib.sha1(str(path).encode("utf-8")).hexdigest()[:8]
+    return destination / f"{slug}_{digest}"
+
+
+def scan_jobs(
+    root: Path, destination: Path, workers: Optional[int] = None
+) -> Iterator[Job]:
+    for kind, path in scan_evidence(root, workers):
+        output_dir = job_output_dir(root, path, destination)
+        if kind == "indexeddb":
+            yield Job(kind, path, output_dir / "teams.json", blob_dir_for(path))
+        else:
+            yield Job(kind, path, output_dir / f"{kind}.json")
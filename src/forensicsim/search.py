@@ -0,0 +1,351 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import multiprocessing
+import os
+import re
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from operator import itemgetter
+from pathlib import Path
+from typing import Any, Optional
+
+from forensicsim.idb import OBJECT_STORE_DATA_INDEX_ID, decode_object_store_name
+from forensicsim.index import data_files, index_row, is_table_file, iter_file_records
+from forensicsim.leveldb import TYPE_VALUE, CorruptionError, map_file
+
+try:
+    # Optional C implementation of Aho-Corasick, faster than the regex fallback
+    import ahocorasick
+except ImportError:  # pragma: no cover
+    ahocorasick = None
+
+# Strings are stored as one-byte (Latin-1) or two-byte (UTF-16) strings by
+# V8 and Local Storage, and as UTF-8 in JSON and HTML values
+ENCODINGS = ("utf-8", "latin-1", "utf-16-le")
+
+# Local Storage keys are "_" <origin> "\x00" <string>, strings start with
+# a byte for their encoding
+LOCAL_STORAGE_PREFIX = b"_"
+LOCAL_STORAGE_ENCODINGS = {0: "utf-16-le", 1: "latin-1"}
+
+_END = -1
+
+
+def _needles(terms: Iterable[str], ignore_case: bool) -> dict[bytes, tuple[str, str]]:
+    # Byte patterns of the terms in every encoding they can be stored in
+    needles: dict[bytes, tuple[str, str]] = {}
+    for term in terms:
+        text = term.lower() if ignore_case else term
+        for encoding in ENCODINGS:
+            try:
+                needle = text.encode(encoding)
+            except UnicodeEncodeError:
+                continue
+            if needle:
+                needles.setdefault(needle, (term, encoding))
+    return needles
+
+
+def _trie(needles: Iterable[bytes]) -> dict[int, Any]:
+    root: dict[int, Any] = {}
+    for needle in needles:
+        node = root
+        for byte in needle:
+            node = node.setdefault(byte, {})
+        node[_END] = needle
+    return root
+
+
+def _trie_pattern(node: dict[int, Any]) -> bytes:
+    # A regex in the shape of the trie, so that the regex engine follows a
+    # single branch per byte instead of trying every term
+    branches = [
+        re.escape(bytes([byte])) + _trie_pattern(child)
+        for byte, child in sorted(node.items())
+        if byte != _END
+    ]
+    if not branches:
+        return b""
+    pattern = branches[0] if len(branches) == 1 else b"(?:" + b"|".join(branches) + b")"
+    if _END in node:
+        pattern = b"(?:" + pattern + b")?"
+    return pattern
+
+
+class Matcher:
+    # Finds which of many terms, and which regexes, occur in a value. Case is
+    # ignored for ASCII letters only.
+    def __init__(
+        self,
+        terms: Iterable[str],
+        regexes: Iterable[str] = (),
+        ignore_case: bool = False,
+    ) -> None:
+        self.ignore_case = ignore_case
+        self.needles = _needles(terms, ignore_case)
+        flags = re.IGNORECASE if ignore_case else 0
+        self.regexes = [
+            (regex, re.compile(regex.encode("utf-8"), flags)) for regex in regexes
+        ]
+        self._automaton: Any = None
+        self._trie: dict[int, Any] = {}
+        self._pattern: Optional[re.Pattern[bytes]] = None
+        if not self.needles:
+            return
+        if ahocorasick is not None:
+            # pyahocorasick works on str, Latin-1 maps every byte to a char
+            self._automaton = ahocorasick.Automaton()
+            for needle in self.needles:
+                text = needle.decode("latin-1")
+                self._automaton.add_word(text, needle)
+            self._automaton.make_automaton()
+        else:
+            self._trie = _trie(self.needles)
+            self._pattern = re.compile(b"(?=(" + _trie_pattern(self._trie) + b"))")
+
+    def _prefixes(self, match: bytes) -> Iterator[bytes]:
+        # The regex only reports the longest needle at a position, the
+        # shorter ones are its prefixes that end in the trie
+        node = self._trie
+        for byte in match:
+            node = node[byte]
+            if _END in node:
+                yield node[_END]
+
+    def _found_needles(self, data: bytes) -> set[bytes]:
+        if self._automaton is not None:
+            return {
+                needle for _, needle in self._automaton.iter(data.decode("latin-1"))
+            }
+        found: set[bytes] = set()
+        if self._pattern is not None:
+            for match in self._pattern.finditer(data):
+                found.update(self._prefixes(match.group(1)))
+        return found
+
+    def find(self, value: bytes) -> list[dict[str, Any]]:
+        # Every term and regex at most once per value
+        data = value.lower() if self.ignore_case else value
+        hits = [
+            {"term": self.needles[n][0], "encoding": self.needles[n][1]}
+            for n in self._found_needles(data)
+        ]
+        for regex, pattern in self.regexes:
+            match = pattern.search(value)
+            if match is not None:
+                hits.append({
+                    "term": regex,
+                    "encoding": "regex",
+                    "match": match.group(0).decode("utf-8", "replace"),
+                })
+        hits.sort(key=itemgetter("term", "encoding"))
+        return hits
+
+
+@dataclass()
+class FileResult:
+    hits: list[dict[str, Any]] = field(default_factory=list)
+    # (database id, object store id) -> name, from the IndexedDB metadata
+    stores: dict[tuple[int, int], str] = field(default_factory=dict)
+    records: int = 0
+    size: int = 0
+    error: Optional[str] = None
+
+
+def _local_storage_key(key: bytes) -> Optional[tuple[str, str]]:
+    # (origin, key) of a Local Storage entry, None for the metadata
+    if not key.startswith(LOCAL_STORAGE_PREFIX) or b"\x00" not in key:
+        return None
+    origin, _, name = key[1:].partition(b"\x00")
+    encoding = LOCAL_STORAGE_ENCODINGS.get(name[0]) if name else None
+    if encoding is None:
+        return None
+    return (
+        origin.decode("latin-1"),
+        name[1:].decode(encoding, "replace"),
+    )
+
+
+def _search_leveldb_file(
+    matcher: Matcher, path: Path, database: str, result: FileResult
+) -> None:
+    # Checksums are not verified, a damaged block is searched as it is. The
+    # CRC would cost more than the search, above all without crc32c.
+    with map_file(path) as data:
+        for offset, _, sequence, value_type, key, value in iter_file_records(
+            data, is_table_file(path), verify=False
+        ):
+            if value_type != TYPE_VALUE or not value:
+                continue
+            if database == "indexeddb":
+                row = index_row(key, value)
+                if row is None:
+                    continue
+                database_id, object_store_id, index_id, key_str = row
+                if object_store_id == 0:
+                    try:
+                        db, store, name = decode_object_store_name(key, value)
+                    except ValueError:
+                        continue
+                    result.stores[db, store] = name
+                    continue
+                if index_id != OBJECT_STORE_DATA_INDEX_ID:
+                    continue
+                location: dict[str, Any] = {
+                    "store": (database_id, object_store_id),
+                    "key": key_str,
+                }
+            else:
+                local_key = _local_storage_key(key)
+                if local_key is None:
+                    continue
+                location = {"store": local_key[0], "key": local_key[1]}
+            result.records += 1
+            for hit in matcher.find(value):
+                result.hits.append({
+                    "database": database,
+                    **location,
+                    "origin_file": path.name,
+                    "offset": offset,
+                    "sequence": sequence,
+                    **hit,
+                })
+
+
+def _search_blob_file(
+    matcher: Matcher, path: Path, root: Path, result: FileResult
+) -> None:
+    with map_file(path) as data:
+        value = bytes(data)
+    result.records += 1
+    for hit in matcher.find(value):
+        result.hits.append({
+            "database": "blob",
+            "store": None,
+            "key": path.relative_to(root).as_posix(),
+            "origin_file": path.name,
+            "offset": 0,
+            "sequence": None,
+            **hit,
+        })
+
+
+# Set in every worker process by _init_worker
+_matcher: Optional[Matcher] = None
+
+
+def _init_worker(matcher: Matcher) -> None:
+    global _matcher
+    _matcher = matcher
+
+
+def _search_file(task: tuple[str, Path, Path]) -> FileResult:
+    database, path, root = task
+    assert _matcher is not None
+    result = FileResult()
+    try:
+        result.size = path.stat().st_size
+        if database == "blob":
+            _search_blob_file(_matcher, path, root, result)
+        else:
+            _search_leveldb_file(_matcher, path, database, result)
+    except (CorruptionError, OSError) as e:
+        # Hits up to the damage are kept
+        result.error = f"{path.name}: {e}"
+    return result
+
+
+def _tasks(
+    leveldb: Optional[Path],
+    blobpath: Optional[Path],
+    localstorage: Optional[Path],
+) -> list[tuple[str, Path, Path]]:
+    tasks = []
+    if leveldb is not None:
+        tasks += [("indexeddb", p, leveldb) for p in data_files(leveldb)]
+    if localstorage is not None:
+        tasks += [("localstorage", p, localstorage) for p in data_files(localstorage)]
+    if blobpath is not None:
+        for root, _, files in os.walk(blobpath):
+            tasks += [("blob", Path(root) / name, blobpath) for name in sorted(files)]
+    # Large files first, so that they do not end up last on a single worker
+    return sorted(tasks, key=lambda t: -t[1].stat().st_size)
+
+
+@dataclass()
+class SearchSummary:
+    records: int = 0
+    bytes: int = 0
+    hits: int = 0
+    terms: set[str] = field(default_factory=set)
+    errors: list[str] = field(default_factory=list)
+
+
+def search(
+    matcher: Matcher,
+    leveldb: Optional[Path] = None,
+    blobpath: Optional[Path] = None,
+    localstorage: Optional[Path] = None,
+    workers: Optional[int] = None,
+    summary: Optional[SearchSummary] = None,
+) -> Iterator[dict[str, Any]]:
+    # Searches the raw values without decoding them. The files are spread
+    # over worker processes; stale versions of records that are still in the
+    # files are searched as well.
+    summary = summary if summary is not None else SearchSummary()
+    tasks = _tasks(leveldb, blobpath, localstorage)
+    results: list[FileResult] = []
+    workers = min(workers or os.cpu_count() or 1, max(len(tasks), 1))
+    if workers == 1:
+        _init_worker(matcher)
+        results = [_search_file(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(matcher,),
+        ) as executor:
+            results = list(executor.map(_search_file, tasks))
+
+    # Object store names may be in any file of the database
+    stores: dict[tuple[int, int], str] = {}
+    for result in results:
+        stores.update(result.stores)
+    for result in results:
+        summary.records += result.records
+        summary.bytes += result.size
+        if result.error is not None:
+            summary.errors.append(result.error)
+        for hit in result.hits:
+            if hit["database"] == "indexeddb":
+                database_id, object_store_id = hit["store"]
+                hit["store"] = stores.get(
+                    (database_id, object_store_id), str(object_store_id)
+                )
+            summary.hits += 1
+            summary.terms.add(hit["term"])
+            yield hit
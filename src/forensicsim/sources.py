@@ -0,0 +1,246 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import io
+import re
+import shutil
+import tarfile
+import tempfile
+from collections.abc import Generator, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Any, BinaryIO, Optional
+
+from forensicsim.hashing import FileHash, StreamHash, file_mtime
+
+# Only these files are read by the LevelDB reader, everything else
+# (LOCK, LOG, LOG.old, ...) can be dropped while streaming.
+LEVELDB_FILE_PATTERN = re.compile(r"^(?:\d+\.(?:ldb|sst|log)|MANIFEST-\d+|CURRENT)$")
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass()
+class SourceDatabase:
+    leveldb: Path
+    blob: Optional[Path] = None
+    # Hashes of the tar stream or image slices the files were read from
+    evidence: Optional[list[FileHash]] = None
+
+
+class _HashingReader(io.RawIOBase):
+    # File object for tarfile that hashes everything read through it
+    def __init__(self, raw: BinaryIO, digest: Optional[StreamHash]) -> None:
+        super().__init__()
+        self.raw = raw
+        self.digest = digest
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        data = self.raw.read(len(buffer))
+        buffer[: len(data)] = data
+        if self.digest is not None:
+            self.digest.update(data)
+        return len(data)
+
+
+def _classify(name: str) -> Optional[tuple[str, PurePosixPath]]:
+    # Map a member name of a tar stream or manifest to ("leveldb", file name)
+    # or ("blob", path relative to the .blob folder).
+    parts = [p for p in PurePosixPath(name.replace("\\", "/")).parts if p != "/"]
+    if not parts or ".." in parts:
+        return None
+    for i, part in enumerate(parts[:-1]):
+        if part.endswith(".blob"):
+            return "blob", PurePosixPath(*parts[i + 1 :])
+    if LEVELDB_FILE_PATTERN.match(parts[-1]):
+        return "leveldb", PurePosixPath(parts[-1])
+    return None
+
+
+def _database_name(name: str, default: str) -> str:
+    # Keep the original folder name, so that the .leveldb suffix check
+    # in process_db and the origin of the records stay meaningful.
+    for part in PurePosixPath(name.replace("\\", "/")).parts:
+        if part.endswith(".leveldb"):
+            return part
+    return default
+
+
+def _new_source(scratch: str, name: str) -> SourceDatabase:
+    source = SourceDatabase(Path(scratch) / name, Path(scratch) / "source.blob")
+    source.leveldb.mkdir()
+    return source
+
+
+def _target(source: SourceDatabase, kind: str, relative: PurePosixPath) -> Path:
+    if kind == "leveldb":
+        return source.leveldb / relative
+    assert source.blob is not None
+    return source.blob / relative
+
+
+def _check_target(targets: dict[Path, str], target: Path, name: str) -> None:
+    # The LevelDB files of all folders end up in one folder, two databases in
+    # one source would overwrite each other's files
+    other = targets.setdefault(target, name)
+    if other != name:
+        raise ValueError(
+            f"{name} and {other} are both read as {target.name}, the source"
+            " must hold a single LevelDB."
+        )
+
+
+def _finish(source: SourceDatabase) -> SourceDatabase:
+    if source.blob is not None and not source.blob.exists():
+        source.blob = None
+    return source
+
+
+@contextmanager
+def open_tar_source(
+    stream: BinaryIO,
+    default_name: str = "stdin.leveldb",
+    hash_evidence: bool = False,
+    md5: bool = False,
+) -> Generator[SourceDatabase, None, None]:
+    # Read a LevelDB (and optionally its .blob folder) from a tar stream, e.g.
+    # stdin. The stream is consumed sequentially in a single pass, so it may
+    # come straight from a pipe. ccl opens the files by path and needs all of
+    # them before the first record, so the stream is written to a scratch
+    # folder in full before it is parsed. With hash_evidence, the stream
+    # itself is hashed while it is read.
+    digest = StreamHash(md5) if hash_evidence else None
+    reader = _HashingReader(stream, digest)
+    targets: dict[Path, str] = {}
+    with (
+        tempfile.TemporaryDirectory(prefix="forensicsim-") as scratch,
+        tarfile.open(fileobj=reader, mode="r|*") as tar,
+    ):
+        source: Optional[SourceDatabase] = None
+        for member in tar:
+            if not member.isfile():
+                continue
+            classified = _classify(member.name)
+            if classified is None:
+                continue
+            member_file = tar.extractfile(member)
+            if member_file is None:
+                continue
+            # The database name is only known once the first member is read.
+            if source is None:
+                source = _new_source(scratch, _database_name(member.name, default_name))
+            target = _target(source, *classified)
+            _check_target(targets, target, member.name)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with member_file, open(target, "wb") as f:
+                shutil.copyfileobj(member_file, f, CHUNK_SIZE)
+        if source is None:
+            raise ValueError("The tar stream does not contain a LevelDB.")
+        if digest is not None:
+            # The end of archive blocks and any padding belong to the stream
+            while reader.read(CHUNK_SIZE):
+                pass
+            source.evidence = [digest.result(getattr(stream, "name", "-"))]
+        yield _finish(source)
+
+
+def read_manifest(manifest: Path) -> Iterator[tuple[str, int, int]]:
+    # One slice per line: <name> <offset> <length>. Fragmented files are
+    # described by several lines with the same name, in file order.
+    with open(manifest, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                name, offset, length = line.rsplit(maxsplit=2)
+                yield name, int(offset, 0), int(length, 0)
+            except ValueError:
+                raise ValueError(
+                    f"Invalid manifest entry in line {line_no}: {line}"
+                ) from None
+
+
+@contextmanager
+def open_slice_source(
+    manifest: Path,
+    image: Path,
+    default_name: str = "image.leveldb",
+    hash_evidence: bool = False,
+    md5: bool = False,
+) -> Generator[SourceDatabase, None, None]:
+    # Read the files of a LevelDB as (offset, length) slices of a raw image.
+    # Like a tar stream, the slices are written to a scratch folder before
+    # they are parsed. With hash_evidence, every slice is hashed as it is
+    # read from the image.
+    slices = list(read_manifest(manifest))
+    name = default_name
+    for slice_name, _, _ in slices:
+        name = _database_name(slice_name, default_name)
+        if name != default_name:
+            break
+
+    with (
+        tempfile.TemporaryDirectory(prefix="forensicsim-") as scratch,
+        open(image, "rb") as raw,
+    ):
+        source = _new_source(scratch, name)
+        if hash_evidence:
+            source.evidence = []
+            image_path = str(image.resolve())
+            image_mtime = file_mtime(image.stat())
+        targets: dict[Path, str] = {}
+        for slice_name, offset, length in slices:
+            classified = _classify(slice_name)
+            if classified is None:
+                continue
+            target = _target(source, *classified)
+            # Fragments of a file are listed under the same name
+            _check_target(targets, target, slice_name)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            digest = StreamHash(md5) if hash_evidence else None
+            raw.seek(offset)
+            with open(target, "ab") as f:
+                remaining = length
+                while remaining > 0:
+                    chunk = raw.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise ValueError(
+                            f"Slice {slice_name} at {offset} exceeds the image."
+                        )
+                    f.write(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+                    remaining -= len(chunk)
+            if source.evidence is not None and digest is not None:
+                source.evidence.append(
+                    digest.result(
+                        image_path, mtime=image_mtime, name=slice_name, offset=offset
+                    )
+                )
+        yield _finish(source)
@@ -0,0 +1,291 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import os
+import pickle
+import re
+import sqlite3
+import tempfile
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Optional
+
+import click
+
+SIZE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$", re.IGNORECASE)
+SIZE_UNITS = {"": 1, "K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
+
+# Rows are written to SQLite in batches of this size
+BATCH_SIZE = 1000
+
+
+def parse_size(value: str) -> int:
+    # "512M", "4G", "1.5GiB" or a plain number of bytes
+    match = SIZE_PATTERN.match(value)
+    if match is None:
+        raise ValueError(f"Invalid size: {value}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def parse_max_memory(
+    ctx: click.Context, param: click.Parameter, value: Optional[str]
+) -> Optional[int]:
+    # click callback of the --max-memory options of the tools
+    if value is None:
+        return None
+    try:
+        return parse_size(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e)) from e
+
+
+def _dumps(obj: Any) -> bytes:
+    try:
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        # Values that can not be pickled end up as strings in the output anyway
+        return pickle.dumps(
+            json.loads(json.dumps(obj, default=str)),
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+
+
+def _sort_key(key: Optional[str]) -> bytes:
+    # UTF-8 byte order equals Python's code point order, surrogatepass keeps
+    # lone surrogates from the V8 strings encodable.
+    return b"" if key is None else key.encode("utf-8", "surrogatepass")
+
+
+class SpillStore:
+    # Owner of the memory budget and of the SQLite file that collections
+    # spill to. Without a budget, collections never spill and keep plain
+    # Python objects, i.e. they behave exactly like list and set.
+    def __init__(
+        self, max_memory: Optional[int] = None, directory: Optional[Path] = None
+    ) -> None:
+        self.max_memory = max_memory
+        self.directory = directory
+        self.used = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        self._path: Optional[str] = None
+        self._tables = 0
+
+    @property
+    def bounded(self) -> bool:
+        return self.max_memory is not None
+
+    def charge(self, size: int) -> bool:
+        # Returns True once the budget is exceeded
+        self.used += size
+        return self.max_memory is not None and self.used > self.max_memory
+
+    def release(self, size: int) -> None:
+        self.used -= size
+
+    def drop_table(self, table: str) -> None:
+        if self._connection is not None:
+            self._connection.execute(f"DROP TABLE IF EXISTS {table}")
+
+    def new_table(self, columns: str) -> tuple[sqlite3.Connection, str]:
+        if self._connection is None:
+            fd, self._path = tempfile.mkstemp(
+                suffix=".spill.sqlite", dir=self.directory
+            )
+            os.close(fd)
+            self._connection = sqlite3.connect(self._path)
+            self._connection.execute("PRAGMA journal_mode = OFF")
+            self._connection.execute("PRAGMA synchronous = OFF")
+        self._tables += 1
+        table = f"spill_{self._tables}"
+        self._connection.execute(f"CREATE TABLE {table} ({columns})")
+        return self._connection, table
+
+    def list(self) -> "SpillList":
+        return SpillList(self)
+
+    def set(self, key: Callable[[Any], Optional[str]]) -> "SpillSet":
+        return SpillSet(self, key)
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        if self._path is not None:
+            os.remove(self._path)
+            self._path = None
+
+    def __enter__(self) -> "SpillStore":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+class SpillList:
+    # Append-only list that moves its items to disk once the budget is used up
+    def __init__(self, store: SpillStore) -> None:
+        self._store = store
+        self._items: list[Any] = []
+        self._size = 0
+        self._length = 0
+        self._table: Optional[tuple[sqlite3.Connection, str]] = None
+
+    def append(self, item: Any) -> None:
+        self._length += 1
+        if not self._store.bounded:
+            self._items.append(item)
+            return
+        blob = _dumps(item)
+        self._items.append(blob)
+        if self._table is None:
+            self._size += len(blob)
+            if self._store.charge(len(blob)):
+                self._spill()
+        elif len(self._items) >= BATCH_SIZE:
+            self._flush()
+
+    def _spill(self) -> None:
+        self._table = self._store.new_table("item BLOB")
+        self._flush()
+        self._store.release(self._size)
+        self._size = 0
+
+    def _flush(self) -> None:
+        if self._table is None or not self._items:
+            return
+        connection, table = self._table
+        connection.executemany(
+            f"INSERT INTO {table} (item) VALUES (?)", ((b,) for b in self._items)
+        )
+        self._items = []
+
+    def __len__(self) -> int:
+        return self._length
+
+    def close(self) -> None:
+        # Empties the list and returns its share of the budget
+        self._store.release(self._size)
+        self._size = 0
+        self._length = 0
+        self._items = []
+        if self._table is not None:
+            self._store.drop_table(self._table[1])
+            self._table = None
+
+    def __iter__(self) -> Iterator[Any]:
+        if not self._store.bounded:
+            yield from self._items
+            return
+        if self._table is None:
+            yield from (pickle.loads(b) for b in self._items)
+            return
+        self._flush()
+        connection, table = self._table
+        for (blob,) in connection.execute(f"SELECT item FROM {table} ORDER BY rowid"):
+            yield pickle.loads(blob)
+
+
+class SpillSet:
+    # Set of records that are equal if their key is equal. Like set.add, the
+    # first record with a key is kept. sorted() returns the records in the
+    # order of their keys, as sorted() does for the parser's dataclasses.
+    def __init__(self, store: SpillStore, key: Callable[[Any], Optional[str]]):
+        self._store = store
+        self._key = key
+        self._items: dict[Any, Any] = {}
+        self._size = 0
+        self._table: Optional[tuple[sqlite3.Connection, str]] = None
+        self._pending: list[tuple[bytes, bytes]] = []
+
+    def add(self, item: Any) -> None:
+        if not self._store.bounded:
+            self._items.setdefault(self._key(item), item)
+            return
+        key = _sort_key(self._key(item))
+        if self._table is not None:
+            self._pending.append((key, _dumps(item)))
+            if len(self._pending) >= BATCH_SIZE:
+                self._flush()
+            return
+        if key in self._items:
+            return
+        blob = _dumps(item)
+        self._items[key] = blob
+        self._size += len(key) + len(blob)
+        if self._store.charge(len(key) + len(blob)):
+            self._spill()
+
+    def _spill(self) -> None:
+        self._table = self._store.new_table("key BLOB PRIMARY KEY, item BLOB")
+        self._pending = list(self._items.items())
+        self._items = {}
+        self._flush()
+        self._store.release(self._size)
+        self._size = 0
+
+    def _flush(self) -> None:
+        if self._table is None or not self._pending:
+            return
+        connection, table = self._table
+        connection.executemany(
+            f"INSERT OR IGNORE INTO {table} (key, item) VALUES (?, ?)", self._pending
+        )
+        self._pending = []
+
+    def close(self) -> None:
+        # Empties the set and returns its share of the budget
+        self._store.release(self._size)
+        self._size = 0
+        self._items = {}
+        self._pending = []
+        if self._table is not None:
+            self._store.drop_table(self._table[1])
+            self._table = None
+
+    def __len__(self) -> int:
+        if self._table is None:
+            return len(self._items)
+        self._flush()
+        connection, table = self._table
+        return connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def sorted(self) -> Iterator[Any]:
+        if not self._store.bounded:
+            yield from sorted(self._items.values())
+            return
+        if self._table is None:
+            for key in sorted(self._items):
+                yield pickle.loads(self._items[key])
+            return
+        self._flush()
+        connection, table = self._table
+        for (blob,) in connection.execute(f"SELECT item FROM {table} ORDER BY key"):
+            yield pickle.loads(blob)
@@ -0,0 +1,318 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import math
+from array import array
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Optional
+
+from forensicsim.conversations import record_time
+
+np: Any
+try:
+    # Optional, vectorizes the histograms over millions of messages
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+EPOCH = datetime(1970, 1, 1)
+PERCENTILES = (50, 90, 99)
+# Number of busiest hours and days in the report
+PEAKS = 10
+
+
+def _epoch_seconds(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        timestamp = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    offset = timestamp.utcoffset()
+    if offset is not None:
+        timestamp = timestamp.replace(tzinfo=None) - offset
+    return int((timestamp - EPOCH).total_seconds())
+
+
+def _iso(seconds: Optional[int]) -> Optional[str]:
+    if seconds is None:
+        return None
+    return (EPOCH + timedelta(seconds=int(seconds))).isoformat()
+
+
+def _call_duration(properties: Any) -> Optional[float]:
+    call_log = properties.get("call-log") if isinstance(properties, dict) else None
+    if isinstance(call_log, str):
+        try:
+            call_log = json.loads(call_log, strict=False)
+        except json.JSONDecodeError:
+            return None
+    if not isinstance(call_log, dict):
+        return None
+    start = _epoch_seconds(call_log.get("connectTime") or call_log.get("startTime"))
+    end = _epoch_seconds(call_log.get("endTime"))
+    if start is None or end is None or end < start:
+        return None
+    return float(end - start)
+
+
+def _percentiles(values: array) -> dict[str, Optional[float]]:
+    # Linear interpolation between the closest ranks, as numpy.percentile
+    if np is not None:
+        data = np.frombuffer(values, dtype=np.float64)
+        if not data.size:
+            return {str(q): None for q in PERCENTILES}
+        return {
+            str(q): float(v)
+            for q, v in zip(PERCENTILES, np.percentile(data, PERCENTILES))
+        }
+    ordered = sorted(values)
+    result: dict[str, Optional[float]] = {}
+    for q in PERCENTILES:
+        if not ordered:
+            result[str(q)] = None
+            continue
+        position = (len(ordered) - 1) * q / 100
+        low = math.floor(position)
+        high = min(low + 1, len(ordered) - 1)
+        result[str(q)] = ordered[low] + (ordered[high] - ordered[low]) * (
+            position - low
+        )
+    return result
+
+
+def _groups(codes: array, times: array, size: int) -> list[dict[str, Any]]:
+    # Messages, first and last time, active days and messages by hour of the
+    # day for every code
+    if np is not None and size:
+        c = np.frombuffer(codes, dtype=np.int64)
+        t = np.frombuffer(times, dtype=np.int64)
+        counts = np.bincount(c, minlength=size)
+        first = np.full(size, np.iinfo(np.int64).max)
+        last = np.full(size, np.iinfo(np.int64).min)
+        np.minimum.at(first, c, t)
+        np.maximum.at(last, c, t)
+        by_hour = np.bincount(c * 24 + (t // 3600) % 24, minlength=size * 24)
+        by_hour = by_hour.reshape(size, 24)
+        pairs = np.unique(np.stack([c, t // 86400]), axis=1)
+        active_days = np.bincount(pairs[0], minlength=size)
+        return [
+            {
+                "messages": int(counts[i]),
+                "first_time": _iso(first[i]) if counts[i] else None,
+                "last_time": _iso(last[i]) if counts[i] else None,
+                "active_days": int(active_days[i]),
+                "by_hour": by_hour[i].tolist(),
+            }
+            for i in range(size)
+        ]
+    groups: list[dict[str, Any]] = [
+        {
+            "messages": 0,
+            "first_time": None,
+            "last_time": None,
+            "active_days": set(),
+            "by_hour": [0] * 24,
+        }
+        for _ in range(size)
+    ]
+    first_seconds: list[Optional[int]] = [None] * size
+    last_seconds: list[Optional[int]] = [None] * size
+    for code, seconds in zip(codes, times):
+        group = groups[code]
+        group["messages"] += 1
+        group["active_days"].add(seconds // 86400)
+        group["by_hour"][(seconds // 3600) % 24] += 1
+        if first_seconds[code] is None or seconds < first_seconds[code]:
+            first_seconds[code] = seconds
+        if last_seconds[code] is None or seconds > last_seconds[code]:
+            last_seconds[code] = seconds
+    for code, group in enumerate(groups):
+        group["active_days"] = len(group["active_days"])
+        group["first_time"] = _iso(first_seconds[code])
+        group["last_time"] = _iso(last_seconds[code])
+    return groups
+
+
+def _counts(times: array, width: int) -> Counter:
+    # Messages per bucket of width seconds
+    if np is not None:
+        buckets, counts = np.unique(
+            np.frombuffer(times, dtype=np.int64) // width, return_counts=True
+        )
+        return Counter(dict(zip(buckets.tolist(), counts.tolist())))
+    return Counter(t // width for t in times)
+
+
+def _distinct(codes: array, others: array, size: int) -> list[int]:
+    # Number of distinct other codes per code, e.g. senders per conversation
+    if np is not None and size:
+        pairs = np.unique(
+            np.stack([
+                np.frombuffer(codes, dtype=np.int64),
+                np.frombuffer(others, dtype=np.int64),
+            ]),
+            axis=1,
+        )
+        return np.bincount(pairs[0], minlength=size).tolist()
+    distinct = [0] * size
+    for code, _ in set(zip(codes, others)):
+        distinct[code] += 1
+    return distinct
+
+
+class ActivityStats:
+    # Collects the time, sender and conversation of every message as integer
+    # coded arrays while the records are written
+    def __init__(self) -> None:
+        self.record_types: Counter = Counter()
+        self.senders: dict[str, int] = {}
+        self.conversations: dict[str, int] = {}
+        self.times = array("q")
+        self.sender_codes = array("q")
+        self.conversation_codes = array("q")
+        self.call_durations = array("d")
+        self.untimed = 0
+
+    @staticmethod
+    def _code(table: dict[str, int], value: Optional[str]) -> int:
+        return table.setdefault(value or "", len(table))
+
+    def add(self, record: dict[str, Any]) -> None:
+        record_type = record.get("record_type")
+        self.record_types[record_type] += 1
+        if record_type == "call":
+            duration = _call_duration(record.get("properties"))
+            if duration is not None:
+                self.call_durations.append(duration)
+            return
+        if record_type != "message":
+            return
+        seconds = _epoch_seconds(record_time(record))
+        if seconds is None:
+            self.untimed += 1
+            return
+        self.times.append(seconds)
+        self.sender_codes.append(self._code(self.senders, record.get("creator")))
+        self.conversation_codes.append(
+            self._code(self.conversations, record.get("conversationId"))
+        )
+
+    def track(self, records: Iterable[dict]) -> Iterator[dict]:
+        for record in records:
+            self.add(record)
+            yield record
+
+    def _peaks(self, buckets: Counter, width: int) -> list[dict[str, Any]]:
+        return [
+            {"start": _iso(bucket * width), "messages": count}
+            for bucket, count in sorted(buckets.items(), key=lambda b: (-b[1], b[0]))[
+                :PEAKS
+            ]
+        ]
+
+    def report(self) -> dict[str, Any]:
+        by_hour_bucket = _counts(self.times, 3600)
+        by_day = _counts(self.times, 86400)
+        by_hour = [0] * 24
+        by_weekday = [0] * 7
+        for hour, count in by_hour_bucket.items():
+            by_hour[hour % 24] += count
+        for day, count in by_day.items():
+            # 1970-01-01 was a Thursday, Monday is 0
+            by_weekday[(day + 3) % 7] += count
+
+        senders = _groups(self.sender_codes, self.times, len(self.senders))
+        conversations = _groups(
+            self.conversation_codes, self.times, len(self.conversations)
+        )
+        participants = _distinct(
+            self.conversation_codes, self.sender_codes, len(self.conversations)
+        )
+
+        durations = self.call_durations
+        return {
+            "backend": "numpy" if np is not None else "array",
+            "records": dict(self.record_types),
+            "messages": {
+                "count": len(self.times) + self.untimed,
+                "without_time": self.untimed,
+                "first_time": _iso(min(self.times)) if self.times else None,
+                "last_time": _iso(max(self.times)) if self.times else None,
+                "by_hour": by_hour,
+                "by_weekday": by_weekday,
+                "by_day": {
+                    (EPOCH + timedelta(days=day)).date().isoformat(): count
+                    for day, count in sorted(by_day.items())
+                },
+                "peak_hours": self._peaks(by_hour_bucket, 3600),
+                "peak_days": self._peaks(by_day, 86400),
+            },
+            "senders": sorted(
+                (
+                    {"mri": mri or None, **senders[code]}
+                    for mri, code in self.senders.items()
+                ),
+                key=lambda s: -s["messages"],
+            ),
+            "conversations": sorted(
+                (
+                    {
+                        "conversation_id": conversation or None,
+                        "senders": participants[code],
+                        **conversations[code],
+                    }
+                    for conversation, code in self.conversations.items()
+                ),
+                key=lambda c: -c["messages"],
+            ),
+            "calls": {
+                "count": self.record_types["call"],
+                "with_duration": len(durations),
+                "total_seconds": float(sum(durations)),
+                "max_seconds": max(durations) if durations else None,
+                "percentiles_seconds": _percentiles(durations),
+            },
+        }
+
+    def write(self, path: Path) -> None:
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=4, ensure_ascii=False)
+
+
+def with_stats(
+    write_results: Callable[[Iterable[dict], Path], int], stats_path: Path
+) -> Callable[[Iterable[dict], Path], int]:
+    # Wraps a writer of process_db, like forensicsim.graph.with_graph
+    def write(data: Iterable[dict], outputpath: Path) -> int:
+        stats = ActivityStats()
+        count = write_results(stats.track(data), outputpath)
+        stats.write(stats_path)
+        return count
+
+    return write
@@ -0,0 +1,208 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from collections.abc import Iterable, Iterator
+from contextlib import suppress
+from operator import itemgetter
+from pathlib import Path
+from typing import Optional, TextIO
+
+from forensicsim.backend import iter_db
+from forensicsim.dedup import record_digest, record_key
+from forensicsim.idb import decode_key_prefix
+from forensicsim.index import (
+    SubsetDatabase,
+    data_files,
+    is_table_file,
+    iter_file_records,
+)
+from forensicsim.jsonl import dumps_record
+from forensicsim.leveldb import (
+    TYPE_VALUE,
+    Buffer,
+    CorruptionError,
+    LogRecord,
+    iter_batch,
+    iter_log,
+    map_file,
+)
+from forensicsim.parser import (
+    ContactIndex,
+    identify_teams_version,
+    iter_parsed_records,
+)
+
+# (source file, sequence number, value type, key, value)
+RawRecord = tuple[Path, int, int, bytes, Optional[bytes]]
+
+
+class Watcher:
+    # Follows a LevelDB that is still being written to. After the full parse,
+    # every poll reads the batches appended to the log files since the last
+    # poll and the table files that appeared since, e.g. by a compaction.
+    # Only records with a sequence number above the highest one read so far
+    # are decoded, and only parsed records that are new or changed are
+    # returned.
+    def __init__(
+        self,
+        leveldb: Path,
+        blobpath: Optional[Path] = None,
+        max_memory: Optional[int] = None,
+        spill_dir: Optional[Path] = None,
+    ) -> None:
+        if not leveldb.name.endswith(".leveldb"):
+            raise ValueError(f"Expected a leveldb folder. Path: {leveldb}")
+        self.leveldb = leveldb
+        self.blobpath = blobpath
+        self.max_memory = max_memory
+        self.spill_dir = spill_dir
+        self.sequence = 0
+        self.log_offsets: dict[str, int] = {}
+        self.tables: set[str] = set()
+        # Newest metadata record by key. ccl needs the database and object
+        # store names to decode the records of a poll.
+        self.metadata: dict[bytes, RawRecord] = {}
+        self.digests: dict[str, str] = {}
+        self.contacts: ContactIndex = {}
+        # Teams version of the reply chains, also needed to parse polls
+        # without any reply chain
+        self.version: Optional[str] = None
+
+    def _tail(self, name: str, data: Buffer) -> Iterator[tuple]:
+        start = self.log_offsets.get(name, 0)
+        if start > len(data):
+            # The file was replaced by a shorter one
+            start = 0
+        for item in iter_log(data, start):
+            if not isinstance(item, LogRecord):
+                continue
+            with suppress(CorruptionError):
+                yield from iter_batch(item.payload)
+            # A record still being written is read again by the next poll
+            self.log_offsets[name] = item.end
+
+    def _scan(self) -> list[RawRecord]:
+        records: list[RawRecord] = []
+        highest = self.sequence
+        files = data_files(self.leveldb)
+        for path in files:
+            table = is_table_file(path)
+            if table and path.name in self.tables:
+                continue
+            try:
+                with map_file(path) as data:
+                    if table:
+                        entries: Iterable[tuple] = (
+                            entry[2:] for entry in iter_file_records(data, True)
+                        )
+                    else:
+                        entries = self._tail(path.name, data)
+                    for sequence, value_type, key, value in entries:
+                        highest = max(highest, sequence)
+                        record = (path, sequence, value_type, key, value)
+                        try:
+                            is_metadata = decode_key_prefix(key).is_metadata
+                        except CorruptionError:
+                            continue
+                        if is_metadata:
+                            known = self.metadata.get(key)
+                            if known is None or known[1] < sequence:
+                                self.metadata[key] = record
+                        elif sequence > self.sequence:
+                            records.append(record)
+            except (OSError, CorruptionError):
+                # Removed after a compaction, or a table that is still being
+                # written and is read again by the next poll
+                continue
+            if table:
+                self.tables.add(path.name)
+        names = {path.name for path in files}
+        self.tables &= names
+        self.log_offsets = {
+            name: offset for name, offset in self.log_offsets.items() if name in names
+        }
+        self.sequence = highest
+        return records
+
+    def _identify(self, records: Iterable[dict]) -> Iterator[dict]:
+        for record in records:
+            if self.version is None and record.get("store") == "replychains":
+                self.version = identify_teams_version([dict(record)])
+            yield record
+
+    def _changes(self, records: Iterable[dict]) -> Iterator[dict]:
+        # Without a version from earlier records, the parser identifies it
+        for record in iter_parsed_records(
+            self._identify(records),
+            self.max_memory,
+            self.spill_dir,
+            contacts=self.contacts,
+            version=self.version,
+        ):
+            digest = record_digest(record)
+            key = record_key(record, digest)
+            previous = self.digests.get(key)
+            if previous == digest:
+                continue
+            self.digests[key] = digest
+            yield {
+                "change": "added" if previous is None else "modified",
+                "key": key,
+                "record": record,
+            }
+
+    def initial(self) -> Iterator[dict]:
+        # The files are scanned before the full parse, so that batches
+        # written during the parse are read again by the first poll. Their
+        # records are left out there if they did not change.
+        self._scan()
+        yield from self._changes(iter_db(self.leveldb, self.blobpath))
+
+    def poll(self) -> Iterator[dict]:
+        # Only the newest version of every key is decoded. Deleted records
+        # are not reported.
+        latest: dict[bytes, RawRecord] = {}
+        for record in self._scan():
+            known = latest.get(record[3])
+            if known is None or known[1] < record[1]:
+                latest[record[3]] = record
+        values = [record for record in latest.values() if record[2] == TYPE_VALUE]
+        if not values:
+            return
+        with SubsetDatabase(self.leveldb) as subset:
+            for record in self.metadata.values():
+                subset.add(*record)
+            for record in sorted(values, key=itemgetter(1)):
+                subset.add(*record)
+            yield from self._changes(subset.records(self.blobpath))
+
+
+def write_changes(changes: Iterable[dict], f: TextIO) -> int:
+    # One change per line, flushed at once for whoever follows the sink
+    count = 0
+    for change in changes:
+        f.write(dumps_record(change) + "\n")
+        count += 1
+    f.flush()
+    return count
@@ -36,11 +36,13 @@ import calendar
 import inspect
 import json
 import os
+from collections import OrderedDict
 from datetime import datetime
 
 from java.io import File
 from java.lang import ProcessBuilder
 from java.util import ArrayList
+from java.util.concurrent import TimeUnit
 from java.util.logging import Level
 from org.sleuthkit.autopsy.casemodule import Case
 from org.sleuthkit.autopsy.casemodule import NoCurrentCaseException
@@ -88,6 +90,99 @@ DIRECTORIES = [
 ]
 
 
+# Seconds between two looks at the progress file of the parser
+PROGRESS_POLL_INTERVAL = 1
+# Work units of the progress bar while the parser runs
+PROGRESS_UNITS = 1000
+
+
+def read_last_progress_event(path):
+    # The parser appends one JSON object per line, the last line may be incomplete
+    try:
+        with open(path, "rb") as progress_file:
+            progress_file.seek(0, os.SEEK_END)
+            progress_file.seek(max(progress_file.tell() - 8192, 0))
+            lines = progress_file.read().split(b"\n")
+    except (IOError, OSError):
+        return None
+    for line in reversed(lines[:-1]):
+        try:
+            return json.loads(line)
+        except ValueError:
+            continue
+    return None
+
+
+def read_jsonl_index(path):
+    # Byte ranges of the records in the JSON Lines output, grouped by the
+    # LevelDB file they were read from
+    entries_by_file = OrderedDict()
+    with open(path, "r") as index_file:
+        index_file.readline()
+        for line in index_file:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) != 4:
+                continue
+            entries_by_file.setdefault(fields[3], []).append(
+                (int(fields[0]), int(fields[1]))
+            )
+    return entries_by_file
+
+
+def read_jsonl_records(path, entries):
+    records = []
+    with open(path, "rb") as jsonl_file:
+        for offset, length in entries:
+            jsonl_file.seek(offset)
+            records.append(json.loads(jsonl_file.read(length)))
+    return records
+
+
+# Process terminator that is polled by ExecUtil while the parser runs. Besides
+# checking for a cancelled job, it forwards the parser's progress events to the
+# progress bar.
+class ParserProgressTerminator(DataSourceIngestModuleProcessTerminator):
+    def __init__(self, context, progress_bar, progress_path, name):
+        DataSourceIngestModuleProcessTerminator.__init__(self, context)
+        self.progress_bar = progress_bar
+        self.progress_path = progress_path
+        self.name = name
+        self.determinate = False
+
+    def shouldTerminateProcess(self):
+        self.update_progress()
+        return DataSourceIngestModuleProcessTerminator.shouldTerminateProcess(self)
+
+    def update_progress(self):
+        event = read_last_progress_event(self.progress_path)
+        if event is None:
+            return
+        message = "{}: {} {} ({} records".format(
+            self.name,
+            event.get("stage"),
+            event.get("store") or "",
+            event.get("total_records", 0),
+        )
+        if event.get("eta") is not None:
+            message += ", about {} s left".format(int(event["eta"]))
+        message += ")"
+
+        bytes_total = event.get("bytes_total") or 0
+        if not bytes_total:
+            self.progress_bar.progress(message)
+            return
+        if not self.determinate:
+            self.progress_bar.switchToDeterminate(PROGRESS_UNITS)
+            self.determinate = True
+        done = min(event.get("bytes_done", 0), bytes_total)
+        self.progress_bar.progress(message, int(PROGRESS_UNITS * done / bytes_total))
+
+    def finish(self):
+        # Importing the records afterwards has no progress of its own
+        if self.determinate:
+            self.progress_bar.switchToIndeterminate()
+
+
 # Factory that defines the name and details of the module and allows Autopsy
 # to create instances of the modules that will do the analysis.
 class ForensicIMIngestModuleFactory(IngestModuleFactoryAdapter):
@@ -220,11 +315,63 @@ class ForensicIMIngestModule(DataSourceIngestModule):
                 "Could not create directory: {}.".format(temp_path_to_content)
             )
 
-        # At first extract the desired artefacts to our newly created temp directory
-        self._extract(content, temp_path_to_content)
+        # Files that lie in a raw image are read by the parser straight from
+        # the image, only otherwise they are extracted to the temp directory
+        path_to_manifest = os.path.join(temp_path_to_content, "slices.txt")
+        path_to_image = self._write_slice_manifest(content, path_to_manifest)
+        if path_to_image is None:
+            self._extract(content, temp_path_to_content)
+
+        # Finally we can parse the artefacts
+        self._analyze(
+            content, temp_path_to_content, progress_bar, path_to_manifest, path_to_image
+        )
 
-        # Finally we can parse the extracted artefacts
-        self._analyze(content, temp_path_to_content, progress_bar)
+    def _write_slice_manifest(self, content, path):
+        # Writes the byte ranges of the database files within the raw image
+        # as a manifest for --manifest. Returns the path of the image, or None
+        # if the files cannot be read from the image as they are, e.g. from
+        # an E01 or split image or a compressed file.
+        try:
+            image = content.getImage()
+            if image is None or image.getType() != TskData.TSK_IMG_TYPE_ENUM.TSK_IMG_TYPE_RAW:
+                return None
+            image_paths = image.getPaths()
+            if len(image_paths) != 1 or not os.path.isfile(image_paths[0]):
+                return None
+            lines = []
+            for child in content.getChildren():
+                if not child.isFile() or child.isMetaFlagSet(
+                    TskData.TSK_FS_META_FLAG_ENUM.UNALLOC
+                ) or child.isDirNameFlagSet(TskData.TSK_FS_NAME_FLAG_ENUM.UNALLOC):
+                    continue
+                if child.isMetaFlagSet(TskData.TSK_FS_META_FLAG_ENUM.COMP):
+                    return None
+                # The last range is padded to whole blocks
+                remaining = child.getSize()
+                ranges = sorted(child.getRanges(), key=lambda r: r.getSequence())
+                for file_range in ranges:
+                    length = min(file_range.getByteLen(), remaining)
+                    if length <= 0:
+                        break
+                    lines.append(
+                        "{}/{} {} {}\n".format(
+                            content.getName(),
+                            child.getName(),
+                            file_range.getByteStart(),
+                            length,
+                        )
+                    )
+                    remaining -= length
+                # Files stored within the MFT have no ranges
+                if remaining:
+                    return None
+        except TskCoreException:
+            return None
+        with open(path, "w") as manifest_file:
+            manifest_file.writelines(lines)
+        self.log(Level.INFO, "Reading {} from image {}.".format(path, image_paths[0]))
+        return image_paths[0]
 
     def _extract(self, content, path):
         # This functions extracts the artefacts from the datasource
@@ -252,9 +399,13 @@ class ForensicIMIngestModule(DataSourceIngestModule):
                 "Could not extract files to directory: {}.".format(path)
             )
 
-    def _analyze(self, content, path, progress_bar):
+    def _analyze(
+        self, content, path, progress_bar, path_to_manifest=None, path_to_image=None
+    ):
         # Piece together our command for running parse.exe with the appropriate parameters
-        path_to_teams_json = os.path.join(path, "teams.json")
+        path_to_teams_json = os.path.join(path, "teams.jsonl")
+        path_to_teams_index = path_to_teams_json + ".idx"
+        path_to_progress = os.path.join(path, "progress.jsonl")
         self.log(
             Level.INFO,
             "Executing {} with input path {} and output file {}.".format(
@@ -263,52 +414,58 @@ class ForensicIMIngestModule(DataSourceIngestModule):
         )
         cmd = ArrayList()
         cmd.add(self.path_to_executable)
-        cmd.add("--filepath")
-        cmd.add(path)
+        if path_to_image is not None:
+            cmd.add("--manifest")
+            cmd.add(path_to_manifest)
+            cmd.add("--image")
+            cmd.add(path_to_image)
+        else:
+            cmd.add("--filepath")
+            cmd.add(path)
         cmd.add("--outputpath")
         cmd.add(path_to_teams_json)
+        cmd.add("--format")
+        cmd.add("jsonl")
+        cmd.add("--progress")
+        cmd.add(path_to_progress)
         process_builder = ProcessBuilder(cmd)
-        ExecUtil.execute(
-            process_builder, DataSourceIngestModuleProcessTerminator(self.context)
+        terminator = ParserProgressTerminator(
+            self.context, progress_bar, path_to_progress, content.getName()
         )
+        try:
+            ExecUtil.execute(
+                process_builder, PROGRESS_POLL_INTERVAL, TimeUnit.SECONDS, terminator
+            )
+        finally:
+            terminator.finish()
 
-        if not os.path.exists(path_to_teams_json):
+        if not os.path.exists(path_to_teams_json) or not os.path.exists(
+            path_to_teams_index
+        ):
             raise IngestModuleException("Unable to find extracted data.")
 
-        imported_records = []
-        with open(path_to_teams_json, "rb") as json_file:
-            imported_records = json.load(json_file)
-
-        if imported_records is not None:
-            self._process_imported_records(imported_records, content, progress_bar)
-        else:
-            raise IngestModuleException("Extracted data is None.")
+        # The index lists the records per source file, so that only the
+        # records of one file are loaded at a time
+        entries_by_file = read_jsonl_index(path_to_teams_index)
+        self._process_imported_records(
+            path_to_teams_json, entries_by_file, content, progress_bar
+        )
 
-    def _process_imported_records(self, imported_records, content, progress_bar):
+    def _process_imported_records(
+        self, path_to_teams_json, entries_by_file, content, progress_bar
+    ):
         # Lets attribute the messages to their respective source files
-        database_sub_files = [
-            i
-            for n, i in enumerate(imported_records)
-            if "origin_file" in i and i.get("origin_file")
-            not in [y.get("origin_file") for y in imported_records[n + 1 :]]
-        ]
         try:
-            for file in database_sub_files:
+            for origin_file, entries in entries_by_file.items():
                 # Skip empty files as these are invalid records
-                if file["origin_file"] is None:
+                if not origin_file:
                     continue
 
                 user_account_instance = None
-                teams_leveldb_file_path = self.get_level_db_file(
-                    content, file["origin_file"]
-                )
+                teams_leveldb_file_path = self.get_level_db_file(content, origin_file)
 
                 # Get only the records per file
-                records = [
-                    d
-                    for d in imported_records
-                    if 'origin_file' in d and d["origin_file"] == file["origin_file"]
-                ]
+                records = read_jsonl_records(path_to_teams_json, entries)
                 try:
                     user_account_instance = self.get_user_account(records)
                 except:
@@ -779,7 +936,8 @@ class ForensicIMIngestModule(DataSourceIngestModule):
         return attribute
 
     def process(self, data_source, progress_bar):
-        # we don't know how long it takes
+        # we don't know how long it takes, the parser's progress events switch
+        # to a determinate progress bar once it is running
         progress_bar.switchToIndeterminate()
 
         # Locate the leveldb database. The full path on Windows systems is something like
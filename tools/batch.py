@@ -0,0 +1,125 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from pathlib import Path
+from typing import Any, Optional
+
+import click
+
+from forensicsim.consts import XTRACT_HEADER
+from forensicsim.jobs import Job, JobResult, read_jobs, run_batch
+
+
+def print_result(result: JobResult) -> None:
+    line = f"[{result.status}] {result.job.input} ({result.records} records, {result.seconds:.1f}s)"
+    if result.error:
+        line += f": {result.error}"
+    click.echo(line)
+
+
+def print_progress(job: Job, event: dict[str, Any]) -> None:
+    line = f"[{event['stage']}] {job.input} ({event['total_records']} records"
+    if event["bytes_total"]:
+        line += f", {100 * event['bytes_done'] / event['bytes_total']:.0f}%"
+    if event["eta"] is not None:
+        line += f", ETA {event['eta']:.0f}s"
+    click.echo(line + ")", err=True)
+
+
+@click.command()
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.Path(
+        exists=True, readable=True, writable=False, dir_okay=False, path_type=Path
+    ),
+    required=True,
+    help="Job list as written by scan.py, or one tab separated input/output pair per line.",
+)
+@click.option(
+    "--journal",
+    type=click.Path(writable=True, dir_okay=False, path_type=Path),
+    default=None,
+    help="Journal of completed jobs. Defaults to <jobs>.journal.",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of jobs processed concurrently. Defaults to the number of CPUs.",
+)
+@click.option(
+    "-t",
+    "--timeout",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="Abort a job after this many seconds.",
+)
+@click.option(
+    "--progress",
+    is_flag=True,
+    default=False,
+    help="Print the progress of running jobs to stderr.",
+)
+@click.option(
+    "--dedup-index",
+    type=click.Path(writable=True, dir_okay=False, path_type=Path),
+    default=None,
+    help="Case-wide index of extracted records. Records already extracted by another job are left out.",
+)
+def process_cmd(
+    jobs: Path,
+    journal: Optional[Path],
+    workers: Optional[int],
+    timeout: Optional[float],
+    progress: bool,
+    dedup_index: Optional[Path],
+) -> None:
+    click.echo(XTRACT_HEADER)
+    journal = journal or jobs.with_name(jobs.name + ".journal")
+    summary = run_batch(
+        read_jobs(jobs),
+        journal,
+        workers,
+        timeout,
+        print_result,
+        print_progress if progress else None,
+        dedup_index,
+    )
+
+    seconds = max(summary.seconds, 1e-9)
+    click.echo(
+        f"{summary.count('done')} done, {summary.count('failed')} failed, "
+        f"{summary.count('timeout')} timed out, {summary.skipped} already done."
+    )
+    click.echo(
+        f"{summary.records} records from {summary.input_bytes / 2**20:.1f} MiB "
+        f"in {summary.seconds:.1f}s ({summary.records / seconds:.0f} records/s, "
+        f"{summary.input_bytes / 2**20 / seconds:.2f} MiB/s)."
+    )
+
+
+if __name__ == "__main__":
+    process_cmd()
@@ -0,0 +1,61 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import time
+from pathlib import Path
+
+import click
+
+from forensicsim.consts import UTIL_HEADER
+from forensicsim.index import build_index
+
+
+@click.command()
+@click.option(
+    "-f",
+    "--filepath",
+    type=click.Path(
+        exists=True, readable=True, writable=False, dir_okay=True, path_type=Path
+    ),
+    required=True,
+    help="File path to the .leveldb folder of the IndexedDB.",
+)
+@click.option(
+    "-o",
+    "--outputpath",
+    type=click.Path(writable=True, dir_okay=False, path_type=Path),
+    required=True,
+    help="File path to the index, e.g. teams.fsindex.",
+)
+def process_cmd(filepath: Path, outputpath: Path) -> None:
+    click.echo(UTIL_HEADER)
+    start_time = time.monotonic()
+    count = build_index(filepath, outputpath)
+    click.echo(
+        f"Indexed {count} records in {time.monotonic() - start_time:.1f}s to {outputpath}."
+    )
+
+
+if __name__ == "__main__":
+    process_cmd()
@@ -0,0 +1,68 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from pathlib import Path
+
+import click
+
+from forensicsim.backend import write_results_to_json
+from forensicsim.consts import UTIL_HEADER
+from forensicsim.dedup import DedupIndex
+
+
+@click.command()
+@click.option(
+    "-i",
+    "--index",
+    type=click.Path(
+        exists=True, readable=True, writable=False, dir_okay=False, path_type=Path
+    ),
+    required=True,
+    help="File path to the index given as --dedup-index to main.py or batch.py.",
+)
+@click.option(
+    "-o",
+    "--outputpath",
+    type=click.Path(writable=True, allow_dash=True, path_type=Path),
+    required=True,
+    help="File path to the list of records and their sources. Use - to write to stdout.",
+)
+@click.option(
+    "--shared",
+    is_flag=True,
+    default=False,
+    help="Only list records that were found in more than one source.",
+)
+def process_cmd(index: Path, outputpath: Path, shared: bool) -> None:
+    click.echo(UTIL_HEADER, err=True)
+    with DedupIndex(index) as dedup:
+        sightings = dedup.sightings()
+        if shared:
+            sightings = (s for s in sightings if len(s["sources"]) > 1)
+        count = write_results_to_json(sightings, outputpath)
+    click.echo(f"Listed {count} records.", err=True)
+
+
+if __name__ == "__main__":
+    process_cmd()
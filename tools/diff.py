@@ -0,0 +1,121 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from collections import Counter
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Optional
+
+import click
+
+from forensicsim.backend import write_results_to_json
+from forensicsim.compression import CODECS, compressed_path, parse_codec
+from forensicsim.consts import UTIL_HEADER
+from forensicsim.diff import diff_records, iter_snapshot
+from forensicsim.spill import parse_max_memory
+
+SNAPSHOT = click.Path(
+    exists=True, readable=True, writable=False, dir_okay=True, path_type=Path
+)
+
+
+def counted(changes: Iterator[dict], counts: Counter) -> Iterator[dict]:
+    for change in changes:
+        counts[change["change"]] += 1
+        yield change
+
+
+@click.command()
+@click.option(
+    "--old",
+    type=SNAPSHOT,
+    required=True,
+    help="Earlier acquisition: a .leveldb folder of the IndexedDB or the output of main.py.",
+)
+@click.option(
+    "--new",
+    type=SNAPSHOT,
+    required=True,
+    help="Later acquisition: a .leveldb folder of the IndexedDB or the output of main.py.",
+)
+@click.option(
+    "-o",
+    "--outputpath",
+    type=click.Path(writable=True, allow_dash=True, path_type=Path),
+    required=True,
+    help="File path to the changed records. Use - to write to stdout.",
+)
+@click.option(
+    "--max-memory",
+    callback=parse_max_memory,
+    required=False,
+    help="Memory limit for parsing a .leveldb folder, as for main.py, e.g. 4G.",
+)
+@click.option(
+    "--compress",
+    type=click.Choice(CODECS),
+    callback=parse_codec,
+    required=False,
+    help="Compress the changed records. The suffix .gz or .zst is added to their file name. zstd falls back to gzip without zstandard.",
+)
+@click.option(
+    "--compress-threads",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Compress blocks of the output in this many threads in parallel. 0 compresses while writing.",
+)
+def process_cmd(
+    old: Path,
+    new: Path,
+    outputpath: Path,
+    max_memory: Optional[int],
+    compress: Optional[str],
+    compress_threads: int,
+) -> None:
+    click.echo(UTIL_HEADER, err=True)
+    spool_dir = None if outputpath == Path("-") else outputpath.parent
+    if spool_dir is not None:
+        outputpath = compressed_path(outputpath, compress)
+    counts: Counter = Counter()
+    try:
+        changes = diff_records(
+            iter_snapshot(old, max_memory, spool_dir),
+            iter_snapshot(new, max_memory, spool_dir),
+            spool_dir,
+        )
+        write_results_to_json(
+            counted(changes, counts), outputpath, compress, compress_threads
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e)) from e
+    click.echo(
+        f"{counts['added']} added, {counts['modified']} modified, "
+        f"{counts['removed']} removed.",
+        err=True,
+    )
+
+
+if __name__ == "__main__":
+    process_cmd()
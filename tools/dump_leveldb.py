@@ -6,11 +6,12 @@ import traceback
 import click
 import logging
 from forensicsim.backend import parse_db, write_results_to_json
+from forensicsim.compression import CODECS, compressed_path, open_text, parse_codec
 from forensicsim.consts import DUMP_HEADER
 
 RAW_DUMP_ENABLED = False
 
-def setup_logs(output_dir):
+def setup_logs(output_dir, compress=None):
     os.makedirs(output_dir, exist_ok=True)
     
     debug_log = Path(output_dir) / "debug.log"
@@ -32,6 +33,7 @@ def setup_logs(output_dir):
         "debug_log": debug_log,
         "error_log": error_log,
         "error_logger": error_logger,
+        "unrecognized_log": compressed_path(Path(output_dir) / "unrecognized.json", compress),
     }
 
 
@@ -40,11 +42,13 @@ def process_level_db(
     output_path: Path,
     blob_path: Optional[Path] = None,
     raw_dump: bool = False,
+    compress: Optional[str] = None,
+    compress_threads: int = 0,
 ) -> None:
     global RAW_DUMP_ENABLED #use the global variable
     RAW_DUMP_ENABLED = raw_dump
     
-    logs = setup_logs(output_path.parent)
+    logs = setup_logs(output_path.parent, compress)
     error_logger = logs["error_logger"]
 
     start_time = time.time()
@@ -64,7 +68,7 @@ def process_level_db(
         # Open raw_log only if RAW_DUMP_ENABLED is True
         raw_log = None
         if RAW_DUMP_ENABLED:
-            raw_log = open(Path(output_path.parent) / "raw_data.json", "w")
+            raw_log = open_text(compressed_path(Path(output_path.parent) / "raw_data.json", compress), compress, compress_threads)
             
         # Parse database
         extracted_values = parse_db(
@@ -84,7 +88,7 @@ def process_level_db(
 
         else:
             # Write structured JSON if not raw_dump
-            write_results_to_json(extracted_values, output_path)
+            write_results_to_json(extracted_values, compressed_path(output_path, compress), compress, compress_threads)
             logging.info(f"Processed data written to {output_path}.")
             
     except Exception as e:
@@ -127,12 +131,27 @@ def process_level_db(
     default=False,
     help="Dump raw records without processing into structured JSON.",
 )
+@click.option(
+    "--compress",
+    type=click.Choice(CODECS),
+    callback=parse_codec,
+    required=False,
+    help="Compress the output and raw_data.json. The suffix .gz or .zst is added to their names. zstd falls back to gzip without zstandard.",
+)
+@click.option(
+    "--compress-threads",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Compress blocks of the output and raw_data.json in this many threads in parallel. 0 compresses while writing.",
+)
 
 def process_cmd(
-    filepath: Path, outputpath: Path, blobpath: Optional[Path] = None, raw_dump: bool = False
+    filepath: Path, outputpath: Path, blobpath: Optional[Path] = None, raw_dump: bool = False,
+    compress: Optional[str] = None, compress_threads: int = 0,
 ) -> None:
     click.echo(DUMP_HEADER)
-    process_level_db(filepath, outputpath, blobpath, raw_dump)
+    process_level_db(filepath, outputpath, blobpath, raw_dump, compress, compress_threads)
 
 
 if __name__ == "__main__":
@@ -23,16 +23,33 @@ SOFTWARE.
 """
 
 from pathlib import Path
+from typing import Optional
 
 import click
 
-from forensicsim.backend import parse_localstorage, write_results_to_json
+from forensicsim.backend import iter_localstorage, write_results_to_json
+from forensicsim.compression import CODECS, compressed_path, parse_codec
 from forensicsim.consts import DUMP_HEADER
 
 
-def process_db(filepath: Path, output_path: Path):
-    extracted_values = parse_localstorage(filepath)
-    write_results_to_json(extracted_values, output_path)
+def process_db(
+    filepath: Path,
+    output_path: Path,
+    storage_keys: Optional[tuple[str, ...]] = None,
+    host_prefixes: Optional[tuple[str, ...]] = None,
+    max_value_size: Optional[int] = None,
+    compress: Optional[str] = None,
+    compress_threads: int = 0,
+):
+    extracted_values = iter_localstorage(
+        filepath, storage_keys, host_prefixes, max_value_size
+    )
+    write_results_to_json(
+        extracted_values,
+        compressed_path(output_path, compress),
+        compress,
+        compress_threads,
+    )
 
 
 @click.command()
@@ -52,9 +69,56 @@ def process_db(filepath: Path, output_path: Path):
     required=True,
     help="File path to the processed output.",
 )
-def process_cmd(filepath: Path, outputpath: Path):
+@click.option(
+    "-k",
+    "--storage-key",
+    multiple=True,
+    help="Only dump records of this storage key, e.g. https://teams.microsoft.com. Can be repeated.",
+)
+@click.option(
+    "--host",
+    multiple=True,
+    help="Only dump records of storage keys whose host starts with this prefix. Can be repeated.",
+)
+@click.option(
+    "--max-value-size",
+    type=click.IntRange(min=0),
+    default=None,
+    help="Skip values longer than this number of characters.",
+)
+@click.option(
+    "--compress",
+    type=click.Choice(CODECS),
+    callback=parse_codec,
+    required=False,
+    help="Compress the output. The suffix .gz or .zst is added to its name. zstd falls back to gzip without zstandard.",
+)
+@click.option(
+    "--compress-threads",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Compress blocks of the output in this many threads in parallel. 0 compresses while writing.",
+)
+def process_cmd(
+    filepath: Path,
+    outputpath: Path,
+    storage_key: tuple[str, ...],
+    host: tuple[str, ...],
+    max_value_size: Optional[int],
+    compress: Optional[str],
+    compress_threads: int,
+):
     click.echo(DUMP_HEADER)
-    process_db(filepath, outputpath)
+    process_db(
+        filepath,
+        outputpath,
+        storage_key or None,
+        host or None,
+        max_value_size,
+        compress,
+        compress_threads,
+    )
 
 
 if __name__ == "__main__":
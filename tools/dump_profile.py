@@ -0,0 +1,102 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from pathlib import Path
+from typing import Optional
+
+import click
+
+from forensicsim.compression import CODECS, compressed_path, parse_codec
+from forensicsim.consts import XTRACT_HEADER
+from forensicsim.profile import extract_profile
+from forensicsim.spill import parse_max_memory
+
+
+@click.command()
+@click.option(
+    "-f",
+    "--filepath",
+    type=click.Path(
+        exists=True, readable=True, writable=False, dir_okay=True, path_type=Path
+    ),
+    required=True,
+    help="File path to the Teams or Electron user data folder, e.g. %AppData%\\Microsoft\\Teams.",
+)
+@click.option(
+    "-o",
+    "--outputpath",
+    type=click.Path(writable=True, path_type=Path),
+    required=True,
+    help="File path to the processed output.",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of stores extracted concurrently.",
+)
+@click.option(
+    "--compress",
+    type=click.Choice(CODECS),
+    callback=parse_codec,
+    required=False,
+    help="Compress the output. The suffix .gz or .zst is added to its name. zstd falls back to gzip without zstandard.",
+)
+@click.option(
+    "--compress-threads",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Compress blocks of the output in this many threads in parallel. 0 compresses while writing.",
+)
+@click.option(
+    "--max-memory",
+    callback=parse_max_memory,
+    required=False,
+    help="Move intermediate results of every store to a temporary file next to the output once they exceed this size, e.g. 4G.",
+)
+def process_cmd(
+    filepath: Path,
+    outputpath: Path,
+    workers: Optional[int],
+    compress: Optional[str],
+    compress_threads: int,
+    max_memory: Optional[int],
+) -> None:
+    click.echo(XTRACT_HEADER)
+    stores = extract_profile(
+        filepath,
+        compressed_path(outputpath, compress),
+        workers,
+        compress,
+        compress_threads,
+        max_memory,
+    )
+    for store in stores:
+        click.echo(f"{store.kind}: {store.path}")
+
+
+if __name__ == "__main__":
+    process_cmd()
@@ -23,16 +23,27 @@ SOFTWARE.
 """
 
 from pathlib import Path
+from typing import Optional
 
 import click
 
-from forensicsim.backend import parse_sessionstorage, write_results_to_json
+from forensicsim.backend import iter_sessionstorage, write_results_to_json
+from forensicsim.compression import CODECS, compressed_path, parse_codec
 from forensicsim.consts import DUMP_HEADER
 
 
-def process_db(input_path: Path, output_path: Path):
-    extracted_values = parse_sessionstorage(input_path)
-    write_results_to_json(extracted_values, output_path)
+def process_db(
+    input_path: Path,
+    output_path: Path,
+    host_prefixes: Optional[tuple[str, ...]] = None,
+    workers: Optional[int] = None,
+    compress: Optional[str] = None,
+    compress_threads: int = 0,
+):
+    extracted_values = iter_sessionstorage(input_path, host_prefixes, workers)
+    if str(output_path) != "-":
+        output_path = compressed_path(output_path, compress)
+    write_results_to_json(extracted_values, output_path, compress, compress_threads)
 
 
 @click.command()
@@ -48,13 +59,40 @@ def process_db(input_path: Path, output_path: Path):
 @click.option(
     "-o",
     "--outputpath",
-    type=click.Path(writable=True, path_type=Path),
+    type=click.Path(writable=True, allow_dash=True, path_type=Path),
     required=True,
-    help="File path to the processed output.",
+    help="File path to the processed output. Use - to write to stdout.",
 )
-def process_cmd(filepath, outputpath):
-    click.echo(DUMP_HEADER)
-    process_db(filepath, outputpath)
+@click.option(
+    "--host",
+    multiple=True,
+    help="Only dump hosts starting with this prefix. Can be repeated.",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of hosts processed concurrently.",
+)
+@click.option(
+    "--compress",
+    type=click.Choice(CODECS),
+    callback=parse_codec,
+    required=False,
+    help="Compress the output. The suffix .gz or .zst is added to its name. zstd falls back to gzip without zstandard.",
+)
+@click.option(
+    "--compress-threads",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Compress blocks of the output in this many threads in parallel. 0 compresses while writing.",
+)
+def process_cmd(filepath, outputpath, host, workers, compress, compress_threads):
+    # Keep stdout free for the records
+    click.echo(DUMP_HEADER, err=True)
+    process_db(filepath, outputpath, host or None, workers, compress, compress_threads)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,114 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from pathlib import Path
+from typing import Optional
+
+import click
+
+from forensicsim.backend import write_results_to_json
+from forensicsim.consts import UTIL_HEADER
+from forensicsim.index import lookup
+
+
+@click.command()
+@click.option(
+    "-f",
+    "--filepath",
+    type=click.Path(
+        exists=True, readable=True, writable=False, dir_okay=True, path_type=Path
+    ),
+    required=True,
+    help="File path to the .leveldb folder of the IndexedDB.",
+)
+@click.option(
+    "-i",
+    "--index",
+    type=click.Path(
+        exists=True, readable=True, writable=False, dir_okay=False, path_type=Path
+    ),
+    required=True,
+    help="File path to the index written by build_index.py.",
+)
+@click.option(
+    "-o",
+    "--outputpath",
+    type=click.Path(writable=True, allow_dash=True, path_type=Path),
+    required=True,
+    help="File path to the matching records. Use - to write to stdout.",
+)
+@click.option(
+    "-b",
+    "--blobpath",
+    type=click.Path(
+        exists=True, readable=True, writable=False, dir_okay=True, path_type=Path
+    ),
+    required=False,
+    help="File path to the .blob folder of the IndexedDB.",
+)
+@click.option(
+    "-k",
+    "--key",
+    "keys",
+    multiple=True,
+    help="IndexedDB key to look up, e.g. an MRI or a conversation id. Can be given multiple times.",
+)
+@click.option(
+    "-p",
+    "--prefix",
+    "prefixes",
+    multiple=True,
+    help="Look up all keys starting with this prefix. Can be given multiple times.",
+)
+@click.option(
+    "-s",
+    "--store",
+    "stores",
+    multiple=True,
+    help="Only look up keys in this object store, e.g. replychains. Can be given multiple times.",
+)
+def process_cmd(
+    filepath: Path,
+    index: Path,
+    outputpath: Path,
+    blobpath: Optional[Path],
+    keys: tuple[str, ...],
+    prefixes: tuple[str, ...],
+    stores: tuple[str, ...],
+) -> None:
+    click.echo(UTIL_HEADER, err=True)
+    if not keys and not prefixes and not stores:
+        raise click.UsageError(
+            "At least one of --key, --prefix or --store is required."
+        )
+    try:
+        records = lookup(filepath, index, keys, prefixes, stores or None, blobpath)
+        count = write_results_to_json(records, outputpath)
+    except ValueError as e:
+        raise click.ClickException(str(e)) from e
+    click.echo(f"Found {count} records.", err=True)
+
+
+if __name__ == "__main__":
+    process_cmd()
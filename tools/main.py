@@ -22,12 +22,27 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+from contextlib import nullcontext
+from datetime import datetime
+from functools import partial
 from pathlib import Path
+from typing import Optional
 
 import click
 
+from forensicsim.backend import write_results_to_json
+from forensicsim.columnar import FORMATS, write_results_to_columns
+from forensicsim.compression import CODECS, compressed_path, parse_codec
 from forensicsim.consts import XTRACT_HEADER
+from forensicsim.conversations import write_results_to_conversations
+from forensicsim.graph import with_graph
+from forensicsim.jsonl import write_results_to_jsonl
+from forensicsim.leveldb import FAST_CRC32C
 from forensicsim.parser import process_db
+from forensicsim.progress import open_progress
+from forensicsim.sources import SourceDatabase, open_slice_source, open_tar_source
+from forensicsim.spill import parse_max_memory
+from forensicsim.stats import with_stats
 
 
 @click.command()
@@ -35,10 +50,15 @@ from forensicsim.parser import process_db
     "-f",
     "--filepath",
     type=click.Path(
-        exists=True, readable=True, writable=False, dir_okay=True, path_type=Path
+        exists=True,
+        readable=True,
+        writable=False,
+        dir_okay=True,
+        allow_dash=True,
+        path_type=Path,
     ),
-    required=True,
-    help="File path to the .leveldb folder of the IndexedDB.",
+    required=False,
+    help="File path to the .leveldb folder of the IndexedDB. Use - to read a tar stream of the folder from stdin.",
 )
 @click.option(
     "-o",
@@ -56,9 +76,254 @@ from forensicsim.parser import process_db
     required=False,
     help="File path to the .blob folder of the IndexedDB.",
 )
-def process_cmd(filepath: Path, outputpath: Path, blobpath: Path) -> None:
-    click.echo(XTRACT_HEADER)
-    process_db(filepath, outputpath, blobpath, filter_db_results=True)
+@click.option(
+    "-m",
+    "--manifest",
+    type=click.Path(
+        exists=True, readable=True, writable=False, dir_okay=False, path_type=Path
+    ),
+    required=False,
+    help="File with one <name> <offset> <length> slice per line, pointing into --image.",
+)
+@click.option(
+    "-i",
+    "--image",
+    type=click.Path(
+        exists=True, readable=True, writable=False, dir_okay=False, path_type=Path
+    ),
+    required=False,
+    help="File path to the raw image the slices of --manifest are read from.",
+)
+@click.option(
+    "--max-memory",
+    callback=parse_max_memory,
+    required=False,
+    help="Move intermediate results to a temporary file next to the output once they exceed this size, e.g. 4G.",
+)
+@click.option(
+    "--progress",
+    type=click.Path(writable=True, dir_okay=False, allow_dash=True, path_type=Path),
+    required=False,
+    help="Write progress events as JSON lines to this file. Use - for stderr.",
+)
+@click.option(
+    "--dump-failures",
+    is_flag=True,
+    default=False,
+    help="Write every record that failed to process to failures.jsonl next to the output.",
+)
+@click.option(
+    "--resilient",
+    is_flag=True,
+    default=False,
+    help="Skip damaged blocks of the LevelDB and report them in recovery.json next to the output.",
+)
+@click.option(
+    "-c",
+    "--conversation",
+    "conversations",
+    multiple=True,
+    help="Only extract messages and meetings of this conversation id. Can be given multiple times.",
+)
+@click.option(
+    "--since",
+    type=click.DateTime(),
+    required=False,
+    help="Only extract messages that arrived and meetings that end at or after this time (UTC).",
+)
+@click.option(
+    "--until",
+    type=click.DateTime(),
+    required=False,
+    help="Only extract messages that arrived and meetings that start at or before this time (UTC).",
+)
+@click.option(
+    "--index",
+    "index_path",
+    type=click.Path(
+        exists=True, readable=True, writable=False, dir_okay=False, path_type=Path
+    ),
+    required=False,
+    help="Index written by build_index.py. With --conversation, only the blocks that hold the selected conversations are read.",
+)
+@click.option(
+    "--dedup-index",
+    type=click.Path(writable=True, dir_okay=False, path_type=Path),
+    required=False,
+    help="Case-wide index of extracted records. Records already extracted from another source are left out.",
+)
+@click.option(
+    "--source",
+    "source_name",
+    required=False,
+    help="Name of the source in --dedup-index, e.g. the shadow copy. Defaults to the input path.",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(["json", "jsonl", "conversations", *FORMATS]),
+    default="json",
+    show_default=True,
+    help="jsonl writes one record per line and an index of the records to <outputpath>.idx. conversations writes a file per conversation and a manifest.json into the folder --outputpath. parquet, arrow and columns write one file or folder per record type into the folder --outputpath. parquet and arrow require pyarrow.",
+)
+@click.option(
+    "--graph",
+    type=click.Path(writable=True, dir_okay=False, path_type=Path),
+    required=False,
+    help="Write who talks to whom as edges to this file, as CSV if it ends with .csv and as JSON otherwise.",
+)
+@click.option(
+    "--stats",
+    type=click.Path(writable=True, dir_okay=False, path_type=Path),
+    required=False,
+    help="Write an activity report to this JSON file: messages per hour, day, sender and conversation, peaks and call durations.",
+)
+@click.option(
+    "--blob-store",
+    type=click.Path(writable=True, file_okay=False, path_type=Path),
+    required=False,
+    help="Copy the blobs referenced by records of --blobpath into this folder, once per SHA-256. The records refer to them by hash.",
+)
+@click.option(
+    "--compress",
+    type=click.Choice(CODECS),
+    callback=parse_codec,
+    required=False,
+    help="Compress the output, its index for --format jsonl, raw_data.json, failures.jsonl and unrecognized.json. The suffix .gz or .zst is added to their names. zstd requires zstandard and falls back to gzip without it.",
+)
+@click.option(
+    "--compress-threads",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Compress blocks of the output in this many threads in parallel. 0 compresses while writing.",
+)
+@click.option(
+    "--hash",
+    "hash_inputs",
+    is_flag=True,
+    default=False,
+    help="Write the SHA-256 of every input file to hashes.json next to the output, computed while the files are decoded.",
+)
+@click.option(
+    "--md5",
+    is_flag=True,
+    default=False,
+    help="Add the MD5 of every input file to hashes.json. Requires --hash.",
+)
+@click.option(
+    "--hash-cache",
+    type=click.Path(writable=True, dir_okay=False, path_type=Path),
+    required=False,
+    help="Hashes of unchanged files are taken from this cache. Defaults to hash_cache.sqlite next to the output.",
+)
+def process_cmd(
+    filepath: Optional[Path],
+    outputpath: Path,
+    blobpath: Optional[Path],
+    manifest: Optional[Path],
+    image: Optional[Path],
+    max_memory: Optional[int],
+    progress: Optional[Path],
+    dump_failures: bool,
+    resilient: bool,
+    conversations: tuple[str, ...],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    index_path: Optional[Path],
+    dedup_index: Optional[Path],
+    source_name: Optional[str],
+    output_format: str,
+    graph: Optional[Path],
+    stats: Optional[Path],
+    blob_store: Optional[Path],
+    compress: Optional[str],
+    compress_threads: int,
+    hash_inputs: bool,
+    md5: bool,
+    hash_cache: Optional[Path],
+) -> None:
+    click.echo(XTRACT_HEADER, err=True)
+    if manifest is None and filepath is None:
+        raise click.UsageError("Either --filepath or --manifest is required.")
+    if manifest is not None and image is None:
+        raise click.UsageError("--manifest requires --image.")
+    if source_name is None and dedup_index is not None:
+        if manifest is not None:
+            source_name = str(manifest.resolve())
+        elif filepath == Path("-"):
+            raise click.UsageError(
+                "Reading from stdin with --dedup-index requires --source."
+            )
+
+    if index_path is not None and (manifest is not None or filepath == Path("-")):
+        raise click.UsageError("--index requires --filepath to a folder.")
+    if (md5 or hash_cache is not None) and not hash_inputs:
+        raise click.UsageError("--md5 and --hash-cache require --hash.")
+    if resilient and not FAST_CRC32C:
+        raise click.UsageError(
+            "--resilient requires the crc32c package, pip install crc32c."
+        )
+    if compress is not None:
+        if output_format not in ("json", "jsonl"):
+            raise click.UsageError("--compress requires --format json or jsonl.")
+        if outputpath != Path("-"):
+            outputpath = compressed_path(outputpath, compress)
+
+    write_results = partial(
+        write_results_to_json, compress=compress, threads=compress_threads
+    )
+    if output_format == "jsonl":
+        write_results = partial(
+            write_results_to_jsonl, compress=compress, threads=compress_threads
+        )
+    elif output_format == "conversations":
+        write_results = write_results_to_conversations
+    elif output_format != "json":
+        write_results = partial(write_results_to_columns, fmt=output_format)
+    if graph is not None:
+        write_results = with_graph(write_results, graph)
+    if stats is not None:
+        write_results = with_stats(write_results, stats)
+
+    if manifest is not None:
+        opened = open_slice_source(
+            manifest, image, hash_evidence=hash_inputs, md5=md5
+        )
+    elif filepath == Path("-"):
+        opened = open_tar_source(
+            click.get_binary_stream("stdin"), hash_evidence=hash_inputs, md5=md5
+        )
+    else:
+        opened = nullcontext(SourceDatabase(filepath))
+
+    with open_progress(progress) as reporter:
+        if reporter:
+            reporter.set_stage("open")
+        with opened as source:
+            process_db(
+                source.leveldb,
+                outputpath,
+                source.blob or blobpath,
+                filter_db_results=True,
+                max_memory=max_memory,
+                progress=reporter,
+                dump_failures=dump_failures,
+                resilient=resilient,
+                conversations=conversations or None,
+                since=since,
+                until=until,
+                dedup_index=dedup_index,
+                source=source_name,
+                write_results=write_results,
+                blob_store=blob_store,
+                compress=compress,
+                hash_inputs=hash_inputs,
+                md5=md5,
+                hash_cache=hash_cache,
+                index_path=index_path,
+                evidence=source.evidence,
+            )
 
 
 if __name__ == "__main__":
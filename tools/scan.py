@@ -0,0 +1,76 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from pathlib import Path
+from typing import Optional
+
+import click
+
+from forensicsim.consts import UTIL_HEADER
+from forensicsim.jobs import write_jobs
+from forensicsim.scan import scan_jobs
+
+
+@click.command()
+@click.option(
+    "-f",
+    "--filepath",
+    type=click.Path(
+        exists=True, readable=True, writable=False, dir_okay=True, path_type=Path
+    ),
+    required=True,
+    help="Root of the mounted evidence to search for Teams databases.",
+)
+@click.option(
+    "-o",
+    "--outputpath",
+    type=click.Path(writable=True, allow_dash=True, path_type=Path),
+    required=True,
+    help="File path to the job list. Use - to write to stdout.",
+)
+@click.option(
+    "-d",
+    "--destination",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=Path("output"),
+    show_default=True,
+    help="Folder that the extracted databases are written to by batch.py.",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of directories listed concurrently.",
+)
+def process_cmd(
+    filepath: Path, outputpath: Path, destination: Path, workers: Optional[int]
+) -> None:
+    click.echo(UTIL_HEADER, err=True)
+    count = write_jobs(scan_jobs(filepath, destination, workers), outputpath)
+    click.echo(f"Found {count} databases.", err=True)
+
+
+if __name__ == "__main__":
+    process_cmd()
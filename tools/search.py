@@ -0,0 +1,153 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from pathlib import Path
+from typing import Optional
+
+import click
+
+from forensicsim.backend import write_results_to_json
+from forensicsim.consts import UTIL_HEADER
+from forensicsim.search import Matcher, SearchSummary, search
+
+FOLDER = click.Path(
+    exists=True, readable=True, writable=False, dir_okay=True, path_type=Path
+)
+
+
+def read_terms(path: Path) -> list[str]:
+    # One term per line, empty lines and lines starting with # are skipped
+    with open(path, encoding="utf-8-sig") as f:
+        return [t for t in (line.rstrip("\r\n") for line in f) if t and t[0] != "#"]
+
+
+@click.command()
+@click.option(
+    "-f",
+    "--filepath",
+    type=FOLDER,
+    required=False,
+    help="File path to the .leveldb folder of the IndexedDB.",
+)
+@click.option(
+    "-b",
+    "--blobpath",
+    type=FOLDER,
+    required=False,
+    help="File path to the .blob folder of the IndexedDB.",
+)
+@click.option(
+    "-l",
+    "--localstorage",
+    type=FOLDER,
+    required=False,
+    help="File path to the leveldb folder of the Local Storage.",
+)
+@click.option(
+    "-o",
+    "--outputpath",
+    type=click.Path(writable=True, allow_dash=True, path_type=Path),
+    required=True,
+    help="File path to the hits. Use - to write to stdout.",
+)
+@click.option(
+    "-e",
+    "--term",
+    "terms",
+    multiple=True,
+    help="Term to search for. Can be given multiple times.",
+)
+@click.option(
+    "-t",
+    "--terms-file",
+    type=click.Path(
+        exists=True, readable=True, writable=False, dir_okay=False, path_type=Path
+    ),
+    required=False,
+    help="File with one term to search for per line.",
+)
+@click.option(
+    "-r",
+    "--regex",
+    "regexes",
+    multiple=True,
+    help="Regular expression to search for, e.g. an IBAN pattern. Can be given multiple times.",
+)
+@click.option(
+    "-i",
+    "--ignore-case",
+    is_flag=True,
+    default=False,
+    help="Ignore the case of ASCII letters.",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of files searched concurrently. Defaults to the number of CPUs.",
+)
+def process_cmd(
+    filepath: Optional[Path],
+    blobpath: Optional[Path],
+    localstorage: Optional[Path],
+    outputpath: Path,
+    terms: tuple[str, ...],
+    terms_file: Optional[Path],
+    regexes: tuple[str, ...],
+    ignore_case: bool,
+    workers: Optional[int],
+) -> None:
+    click.echo(UTIL_HEADER, err=True)
+    if filepath is None and blobpath is None and localstorage is None:
+        raise click.UsageError(
+            "At least one of --filepath, --blobpath or --localstorage is required."
+        )
+    all_terms = list(terms) + (read_terms(terms_file) if terms_file else [])
+    if not all_terms and not regexes:
+        raise click.UsageError(
+            "At least one of --term, --terms-file or --regex is required."
+        )
+
+    matcher = Matcher(all_terms, regexes, ignore_case)
+    summary = SearchSummary()
+    write_results_to_json(
+        search(matcher, filepath, blobpath, localstorage, workers, summary),
+        outputpath,
+    )
+    for error in summary.errors:
+        click.echo(f"Stopped reading {error}", err=True)
+    click.echo(
+        f"{summary.hits} hits for {len(summary.terms)} of "
+        f"{len(all_terms) + len(regexes)} terms in {summary.records} records "
+        f"({summary.bytes / 2**20:.1f} MiB).",
+        err=True,
+    )
+    # Like grep, the exit code tells whether anything was found
+    if not summary.hits:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    process_cmd()
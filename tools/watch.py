@@ -0,0 +1,138 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import time
+from pathlib import Path
+from typing import Optional
+
+import click
+
+from forensicsim.backend import open_output
+from forensicsim.compression import CODECS, compressed_path, parse_codec
+from forensicsim.consts import UTIL_HEADER
+from forensicsim.spill import parse_max_memory
+from forensicsim.watch import Watcher, write_changes
+
+
+@click.command()
+@click.option(
+    "-f",
+    "--filepath",
+    type=click.Path(
+        exists=True,
+        readable=True,
+        writable=False,
+        dir_okay=True,
+        file_okay=False,
+        path_type=Path,
+    ),
+    required=True,
+    help="File path to the .leveldb folder of the IndexedDB.",
+)
+@click.option(
+    "-b",
+    "--blobpath",
+    type=click.Path(
+        exists=True, readable=True, writable=False, dir_okay=True, path_type=Path
+    ),
+    required=False,
+    help="File path to the .blob folder of the IndexedDB.",
+)
+@click.option(
+    "-o",
+    "--outputpath",
+    type=click.Path(writable=True, allow_dash=True, path_type=Path),
+    required=True,
+    help="File path to the new and changed records, one per line. Use - to write to stdout.",
+)
+@click.option(
+    "--interval",
+    type=click.FloatRange(min=0.1),
+    default=2.0,
+    show_default=True,
+    help="Seconds between two reads of the log files.",
+)
+@click.option(
+    "--polls",
+    type=click.IntRange(min=0),
+    required=False,
+    help="Stop after this many reads of the log files. Runs until interrupted otherwise.",
+)
+@click.option(
+    "--max-memory",
+    callback=parse_max_memory,
+    required=False,
+    help="Memory limit for the full parse, as for main.py, e.g. 4G.",
+)
+@click.option(
+    "--compress",
+    type=click.Choice(CODECS),
+    callback=parse_codec,
+    required=False,
+    help="Compress the records. Every read of the log files ends a block, so the output stays readable while it is watched. The suffix .gz or .zst is added to the file name. zstd falls back to gzip without zstandard.",
+)
+@click.option(
+    "--compress-threads",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Compress blocks of the output in this many threads in parallel. 0 compresses while writing.",
+)
+def process_cmd(
+    filepath: Path,
+    blobpath: Optional[Path],
+    outputpath: Path,
+    interval: float,
+    polls: Optional[int],
+    max_memory: Optional[int],
+    compress: Optional[str],
+    compress_threads: int,
+) -> None:
+    click.echo(UTIL_HEADER, err=True)
+    spill_dir = None if outputpath == Path("-") else outputpath.parent
+    if spill_dir is not None:
+        outputpath = compressed_path(outputpath, compress)
+    try:
+        watcher = Watcher(filepath, blobpath, max_memory, spill_dir)
+    except ValueError as e:
+        raise click.ClickException(str(e)) from e
+
+    with open_output(outputpath, compress, compress_threads) as f:
+        count = write_changes(watcher.initial(), f)
+        click.echo(f"{count} records after the full parse, watching.", err=True)
+        done = 0
+        try:
+            while polls is None or done < polls:
+                time.sleep(interval)
+                count = write_changes(watcher.poll(), f)
+                done += 1
+                if count:
+                    click.echo(f"{count} new or changed records.", err=True)
+        except KeyboardInterrupt:
+            pass
+    click.echo(f"Stopped after {done} reads of the log files.", err=True)
+
+
+if __name__ == "__main__":
+    process_cmd()